@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Benchmark the line diff engines of devcontainer-diff.py on synthetic inputs.
+
+Generates large inputs shaped like the files that make difflib slow
+(generated devcontainer.json variants, long Dockerfiles full of repeated
+continuation lines) next to easy ones (unique lines with scattered edits,
+a moved block) and two unrelated files that share only blank lines, then
+times devcontainer_diffengine.unified_diff() for each engine. Every diff
+is applied back to its source and must reproduce the target, otherwise the
+run fails. "changes" counts the -/+ lines a diff needs: fewer is a tighter
+diff.
+
+    python3 scripts/benchmark-diff.py [--scale 1] [--json]
+    python3 scripts/benchmark-diff.py --engines histogram,myers --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import devcontainer_diffengine as engines
+
+HUNK_RE = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def devcontainer_json(rng: random.Random, scale: int) -> tuple[list, list]:
+    """Feature blocks differing only in a name: nearly every line repeats."""
+    source = ["{\n", '  "features": [\n']
+    for _ in range(2000 * scale):
+        source += [
+            "    {\n",
+            f'      "id": "feature-{rng.randrange(50)}",\n',
+            '      "enabled": true,\n',
+            '      "options": {},\n',
+            "    },\n",
+        ]
+    source += ["  ]\n", "}\n"]
+    target = list(source)
+    for _ in range(40 * scale):
+        target[rng.randrange(2, len(target) - 2)] = '      "enabled": false,\n'
+        target.insert(rng.randrange(2, len(target) - 2), "    },\n")
+    return source, target
+
+
+def dockerfile(rng: random.Random, scale: int) -> tuple[list, list]:
+    """RUN blocks of repeated continuation lines around a few unique ones."""
+    source = ["FROM debian:bookworm-slim\n"]
+    for index in range(1500 * scale):
+        source += [
+            "RUN set -eux; \\\n",
+            "    apt-get update; \\\n",
+            f"    apt-get install -y --no-install-recommends pkg{index}; \\\n",
+            "    rm -rf /var/lib/apt/lists/*\n",
+            "\n",
+        ]
+    target = list(source)
+    for _ in range(30 * scale):
+        index = rng.randrange(1, len(target))
+        target[index:index] = ["RUN set -eux; \\\n", "    apt-get update; \\\n"]
+        del target[rng.randrange(1, len(target))]
+    return source, target
+
+
+def unique_lines(rng: random.Random, scale: int) -> tuple[list, list]:
+    """Distinct lines with 0.5% replaced: easy for every engine."""
+    source = [f"line {index} {rng.random():.12f}\n" for index in range(40000 * scale)]
+    target = list(source)
+    for _ in range(len(target) // 200):
+        target[rng.randrange(len(target))] = f"edited {rng.random()}\n"
+    return source, target
+
+
+def moved_block(rng: random.Random, scale: int) -> tuple[list, list]:
+    """A 500-line block moved from the start to the end."""
+    source = [
+        f"entry {index:06d} {rng.random():.6f}\n" for index in range(20000 * scale)
+    ]
+    target = source[500:] + source[:500]
+    return source, target
+
+
+def common_lines(rng: random.Random, scale: int) -> tuple[list, list]:
+    """Two unrelated files sharing only their blank lines: no anchor at all."""
+    source, target = [], []
+    for index in range(8000 * scale):
+        blank = index % 4 == 3
+        source.append("\n" if blank else f"source {index} {rng.random():.12f}\n")
+        target.append("\n" if blank else f"target {index} {rng.random():.12f}\n")
+    return source, target
+
+
+CASES: dict[str, Callable[[random.Random, int], tuple[list, list]]] = {
+    "devcontainer-json": devcontainer_json,
+    "dockerfile": dockerfile,
+    "unique-lines": unique_lines,
+    "moved-block": moved_block,
+    "common-lines": common_lines,
+}
+
+
+def apply_diff(source: list[str], diff: list[str]) -> list[str]:
+    """Apply unified diff lines to source, as patch would."""
+    result: list[str] = []
+    position = 0
+    # diff[:2] are the ---/+++ file headers.
+    for line in diff[2:]:
+        match = HUNK_RE.match(line)
+        if match:
+            start = int(match.group(1))
+            length = 1 if match.group(2) is None else int(match.group(2))
+            start = start - 1 if length else start
+            result.extend(source[position:start])
+            position = start
+        elif line.startswith(" "):
+            result.append(source[position])
+            position += 1
+        elif line.startswith("-"):
+            position += 1
+        else:
+            result.append(line[1:])
+    result.extend(source[position:])
+    return result
+
+
+def best_of(repeat: int, run: Callable[[], list[str]]) -> tuple[float, list[str]]:
+    best = float("inf")
+    result: list[str] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Input size multiplier.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--engines",
+        default=None,
+        help="Comma-separated engines to time (default: all).",
+    )
+    parser.add_argument(
+        "--cases",
+        default=None,
+        help=f"Comma-separated inputs (default: all of {', '.join(CASES)}).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print JSON.")
+    args = parser.parse_args()
+
+    names = args.engines.split(",") if args.engines else list(engines.ENGINES)
+    unknown = sorted(set(names) - set(engines.ENGINES))
+    if unknown:
+        parser.error(f"unsupported engines: {', '.join(unknown)}")
+    cases = args.cases.split(",") if args.cases else list(CASES)
+    unknown = sorted(set(cases) - set(CASES))
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    rows = []
+    for case in cases:
+        source, target = CASES[case](random.Random(args.seed), args.scale)
+        baseline = None
+        for name in names:
+            seconds, diff = best_of(
+                args.repeat,
+                lambda n=name, a=source, b=target: list(
+                    engines.unified_diff(a, b, "a", "b", engine=n)
+                ),
+            )
+            if apply_diff(source, diff) != target:
+                print(f"{name} diff does not apply on {case}", file=sys.stderr)
+                return 1
+            if name == "difflib":
+                baseline = seconds
+            rows.append(
+                {
+                    "case": case,
+                    "engine": name,
+                    "lines": len(source) + len(target),
+                    "seconds": seconds,
+                    "changes": sum(1 for line in diff[2:] if line[0] in "-+"),
+                }
+            )
+        for row in rows:
+            if row["case"] == case:
+                row["speedup"] = (
+                    round(baseline / row["seconds"], 2) if baseline else None
+                )
+                row["seconds"] = round(row["seconds"], 4)
+
+    if args.json:
+        print(json.dumps({"scale": args.scale, "results": rows}, indent=2))
+        return 0
+    print(
+        f"{'case':<18} {'engine':<10} {'lines':>7} {'seconds':>9} "
+        f"{'changes':>8} {'vs difflib':>10}"
+    )
+    for row in rows:
+        speedup = f"{row['speedup']:.2f}x" if row["speedup"] else "-"
+        print(
+            f"{row['case']:<18} {row['engine']:<10} {row['lines']:>7} "
+            f"{row['seconds']:>9.4f} {row['changes']:>8} {speedup:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Benchmark template signature hashing on a synthetic tree.
+
+Builds a throwaway tree shaped like a vendored stack (thousands of small
+files plus a few large assets), then times compute_signature() from
+devcontainer-metadata.py for each per-file digest algorithm at increasing
+--jobs, against the original single-threaded 8 KiB-read SHA-1
+implementation. Every run must match a reference signature for its
+algorithm. Timings are best-of --repeat with a warm page cache, so they
+measure hashing, not the disk.
+
+    python3 scripts/benchmark-hashing.py [--files 3000] [--json]
+    python3 scripts/benchmark-hashing.py --algorithms sha256,blake2b
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent
+
+
+def load_metadata_module():
+    path = SCRIPTS / "devcontainer-metadata.py"
+    spec = importlib.util.spec_from_file_location("devcontainer_metadata", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_signature(template_root: Path, algorithm: str = "sha1") -> str:
+    """The signature as computed before parallel hashing, for reference."""
+    checksums = []
+    for file_path in sorted(template_root.rglob("*")):
+        if file_path.is_file():
+            h = hashlib.new(algorithm)
+            with file_path.open("rb") as f:
+                for chunk in iter(lambda f=f: f.read(8192), b""):
+                    h.update(chunk)
+            checksums.append(h.hexdigest())
+    return hashlib.sha256("".join(checksums).encode()).hexdigest()
+
+
+def build_tree(root: Path, files: int, large: int, large_size: int, seed: int) -> int:
+    """Write files small files and large big ones; return total bytes."""
+    rng = random.Random(seed)
+    total = 0
+    for index in range(files):
+        directory = root / f"d{index % 40:02d}" / f"s{index % 7}"
+        directory.mkdir(parents=True, exist_ok=True)
+        size = rng.choice((512, 2048, 8192, 32768, 65536))
+        (directory / f"f{index:05d}.dat").write_bytes(rng.randbytes(size))
+        total += size
+    assets = root / "assets"
+    assets.mkdir(exist_ok=True)
+    for index in range(large):
+        (assets / f"asset{index}.bin").write_bytes(rng.randbytes(large_size))
+        total += large_size
+    return total
+
+
+def best_of(repeat: int, run: Callable[[], str]) -> tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def job_counts(limit: int) -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 <= limit:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--large", type=int, default=8, help="Large assets.")
+    parser.add_argument(
+        "--large-size", type=int, default=16, help="Size of each asset in MiB."
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Highest --jobs to try (default: CPU count).",
+    )
+    parser.add_argument(
+        "--algorithms",
+        default=None,
+        help="Comma-separated digests to time (default: every supported one).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print JSON.")
+    args = parser.parse_args()
+
+    metadata = load_metadata_module()
+    algorithms = (
+        args.algorithms.split(",") if args.algorithms else list(metadata.ALGORITHMS)
+    )
+    unknown = sorted(set(algorithms) - set(metadata.ALGORITHMS))
+    if unknown:
+        parser.error(f"unsupported algorithms: {', '.join(unknown)}")
+    with tempfile.TemporaryDirectory(prefix="bench-hashing-") as tmp:
+        root = Path(tmp)
+        total = build_tree(
+            root, args.files, args.large, args.large_size << 20, args.seed
+        )
+        legacy_signature(root)  # warm the page cache
+        baseline, expected = best_of(args.repeat, lambda: legacy_signature(root))
+        rows = [{"impl": "legacy", "algorithm": "sha1", "jobs": 1, "seconds": baseline}]
+        for algorithm in algorithms:
+            reference = legacy_signature(root, algorithm)
+            for jobs in job_counts(args.max_jobs):
+                seconds, signature = best_of(
+                    args.repeat,
+                    lambda a=algorithm, j=jobs: metadata.compute_signature(
+                        root, None, j, a
+                    ),
+                )
+                if signature != reference:
+                    print(
+                        f"{algorithm} signature mismatch at --jobs {jobs}",
+                        file=sys.stderr,
+                    )
+                    return 1
+                rows.append(
+                    {
+                        "impl": "current",
+                        "algorithm": algorithm,
+                        "jobs": jobs,
+                        "seconds": seconds,
+                    }
+                )
+
+    for row in rows:
+        row["mib_per_second"] = round(total / row["seconds"] / (1 << 20), 1)
+        row["speedup"] = round(baseline / row["seconds"], 2)
+        row["seconds"] = round(row["seconds"], 4)
+    if args.json:
+        summary = {
+            "files": args.files + args.large,
+            "bytes": total,
+            "cpus": os.cpu_count(),
+            "legacy_signature": expected,
+            "results": rows,
+        }
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(
+        f"{args.files + args.large} files, {total / (1 << 20):.0f} MiB, "
+        f"{os.cpu_count()} CPUs"
+    )
+    print(
+        f"{'impl':<8} {'algorithm':<9} {'jobs':>4} {'seconds':>9} "
+        f"{'MiB/s':>8} {'speedup':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['impl']:<8} {row['algorithm']:<9} {row['jobs']:>4} "
+            f"{row['seconds']:>9.4f} "
+            f"{row['mib_per_second']:>8.1f} {row['speedup']:>7.2f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,383 @@
 #!/usr/bin/env python3
 """
 Show differences between .devcontainer/ and the source template under devcontainers/<stack>.
+
+Both trees are listed with devcontainer_tree.walk_files(), so editor swap
+files, Python caches and paths matched by .devcontainerignore/.gitignore
+are not reported.
+
+Files present on both sides are compared by size, then by digests from the
+per-file cache shared with devcontainer-metadata.py, and only then by
+reading both in chunks up to the first difference. Each file is read at
+most once; the bytes read are reused for the unified diff, and the digests
+of files found equal are cached, so re-checking a clean tree costs one
+stat() per file.
+
+Binary files (a NUL byte or invalid UTF-8 near the start) and files over
+MAX_TEXT_SIZE are never diffed line by line: both are streamed once in
+chunks and summarised as sizes, digests and the differing byte ranges,
+with --binary-diff adding a hex dump of the first differing blocks.
+Memory stays bounded by the chunk size however large the files are.
+
+The two trees are walked in step and merge-joined, so added, missing and
+differing files are reported in path order as they are found, holding
+only the directories on the current path rather than both file lists.
+Pairs that need reading are compared in-process until POOL_MIN_BYTES
+have been read, then diffed on a process pool (--jobs) a few batches at a
+time; the output is identical to a --jobs 1 run.
+
+Text diffs come from devcontainer_diffengine.py: difflib by default, git's
+histogram diff or Myers with --diff-engine, all in unified format.
+
+Where devcontainers/<stack> is not on disk (consumer repos that do not
+vendor the templates), or with --manifest, the target is checked against
+the manifest recorded in its metadata instead: added, missing, modified
+and mode-changed files are listed, with no content diff.
+
+--watch keeps running: both trees are indexed in memory once, then only
+the paths inotify (or, without it, a stat() poll) reports are re-stat()ed,
+re-hashed and re-diffed. Each settled burst of edits is reported as JSON
+lines on stdout, for editors and status bars.
 """
 
 from __future__ import annotations
 
 import argparse
-import difflib
+import codecs
+import hashlib
+import io
 import json
+import os
+import re
+import signal
 import sys
+import time
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from devcontainer_diffengine import (
+    DEFAULT_ENGINE,
+    ENGINES,
+    unified_diff,
+)
+from devcontainer_tree import (
+    RACY_WINDOW_NS,
+    SignatureCache,
+    default_cache_file,
+    default_jobs,
+    manifest_changes,
+    merge_walk,
+    path_key,
+    read_manifest,
+)
+from devcontainer_watch import TreeIndex, debounce, open_watcher
 
 IGNORED_TARGET_FILES = {
-    Path(".template-metadata.json"),
+    ".template-metadata.json",
 }
 
+# Digest recorded in the shared cache; devcontainer-metadata.py's default, so
+# template files it has already hashed are compared without being read.
+DIGEST_ALGORITHM = "sha1"
+CHUNK_SIZE = 1 << 20
+
+# Files larger than this, or with a NUL byte or invalid UTF-8 in their first
+# BINARY_SNIFF bytes, are compared as binary: streamed, never held whole.
+MAX_TEXT_SIZE = 8 << 20
+BINARY_SNIFF = 8000
+# Differing bytes fewer than RANGE_GAP apart are reported as one range.
+RANGE_GAP = 8
+DIFFERING_RUN = re.compile(rb"[^\x00](?:\x00{0,%d}[^\x00])*" % (RANGE_GAP - 1))
+MAX_RANGES = 20
+# --binary-diff dumps differing blocks of this many bytes (a multiple of 16
+# that divides CHUNK_SIZE, so blocks never straddle chunks).
+HEX_BLOCK = 256
+# File pairs sent to a worker process at a time.
+TASK_BATCH = 8
+# Pairs are compared in-process until this many bytes have been read; only
+# past that does starting a process pool pay for itself.
+POOL_MIN_BYTES = 8 << 20
+
 
 def load_metadata(metadata_path: Path) -> dict:
     with metadata_path.open("r", encoding="utf-8") as fh:
         return json.load(fh)
 
 
-def list_files(root: Path) -> set[Path]:
-    return {p for p in root.rglob("*") if p.is_file()}
-
-
-def read_text(path: Path) -> str:
+def looks_like_text(head: bytes) -> bool:
+    """No NUL and valid UTF-8 (a split trailing character allowed) in head."""
+    sample = head[:BINARY_SNIFF]
+    if b"\0" in sample:
+        return False
     try:
-        return path.read_text(encoding="utf-8")
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
     except UnicodeDecodeError:
-        return path.read_bytes().hex()
+        return False
+    return True
+
+
+@dataclass
+class BinaryDiff:
+    sizes: tuple[int, int]
+    digests: tuple[str, str]
+    # The first MAX_RANGES differing [start, end) byte ranges; the counts
+    # cover all of them.
+    ranges: list[tuple[int, int]]
+    range_count: int
+    differing_bytes: int
+    # --binary-diff rows: (offset, source bytes, target bytes) per hex line.
+    rows: list[tuple[int, bytes, bytes]]
+
+    @property
+    def equal(self) -> bool:
+        return self.range_count == 0
+
+
+def differing_spans(left: bytes, right: bytes) -> list[tuple[int, int]]:
+    """[start, end) spans where equal-length left and right differ."""
+    if left == right:
+        return []
+    # XOR as big integers leaves a zero byte wherever the inputs agree, so
+    # the regex scans the mask at C speed instead of a Python byte loop.
+    mask = (int.from_bytes(left, "big") ^ int.from_bytes(right, "big")).to_bytes(
+        len(left), "big"
+    )
+    return [match.span() for match in DIFFERING_RUN.finditer(mask)]
+
+
+def compare_binary(
+    src: BinaryIO,
+    tgt: BinaryIO,
+    first: tuple[bytes, bytes] | None = None,
+    hex_blocks: int = 0,
+) -> BinaryDiff:
+    """Stream both files once, in CHUNK_SIZE pieces, summarising differences.
+
+    Memory stays at a chunk per side plus at most MAX_RANGES ranges and
+    hex_blocks blocks of HEX_BLOCK bytes, whatever the file sizes.
+    """
+    if first is None:
+        first = (src.read(CHUNK_SIZE), tgt.read(CHUNK_SIZE))
+    left, right = first
+    hashes = (hashlib.new(DIGEST_ALGORITHM), hashlib.new(DIGEST_ALGORITHM))
+    sizes = [0, 0]
+    ranges: list[tuple[int, int]] = []
+    range_count = differing_bytes = 0
+    current: list[int] | None = None
+    blocks: set[int] = set()
+    rows: list[tuple[int, bytes, bytes]] = []
+    offset = 0
+    while left or right:
+        hashes[0].update(left)
+        hashes[1].update(right)
+        sizes[0] += len(left)
+        sizes[1] += len(right)
+        common = min(len(left), len(right))
+        spans = differing_spans(left[:common], right[:common])
+        if len(left) != len(right):
+            # Bytes past the end of the shorter file.
+            spans.append((common, max(len(left), len(right))))
+        for start, end in spans:
+            start, end = start + offset, end + offset
+            if current is not None and start - current[1] < RANGE_GAP:
+                current[1] = end
+                continue
+            if current is not None:
+                range_count += 1
+                differing_bytes += current[1] - current[0]
+                if len(ranges) < MAX_RANGES:
+                    ranges.append((current[0], current[1]))
+            current = [start, end]
+        for start, end in spans:
+            block = start - start % HEX_BLOCK
+            while block < end and len(blocks) < hex_blocks:
+                if offset + block not in blocks:
+                    blocks.add(offset + block)
+                    rows.extend(
+                        hex_rows(
+                            offset + block,
+                            left[block : block + HEX_BLOCK],
+                            right[block : block + HEX_BLOCK],
+                        )
+                    )
+                block += HEX_BLOCK
+        offset += max(len(left), len(right))
+        left, right = src.read(CHUNK_SIZE), tgt.read(CHUNK_SIZE)
+    if current is not None:
+        range_count += 1
+        differing_bytes += current[1] - current[0]
+        if len(ranges) < MAX_RANGES:
+            ranges.append((current[0], current[1]))
+    return BinaryDiff(
+        (sizes[0], sizes[1]),
+        (hashes[0].hexdigest(), hashes[1].hexdigest()),
+        ranges,
+        range_count,
+        differing_bytes,
+        rows,
+    )
 
 
-def diff_files(source: Path, target: Path) -> str:
-    source_text = read_text(source)
-    target_text = read_text(target)
-    source_lines = source_text.splitlines(keepends=True)
-    target_lines = target_text.splitlines(keepends=True)
+def hex_rows(offset: int, left: bytes, right: bytes) -> list[tuple[int, bytes, bytes]]:
+    """The 16-byte rows of one block that differ between left and right."""
+    rows = []
+    for start in range(0, max(len(left), len(right)), 16):
+        a, b = left[start : start + 16], right[start : start + 16]
+        if a != b:
+            rows.append((offset + start, a, b))
+    return rows
+
+
+def hex_line(offset: int, data: bytes) -> str:
+    printable = "".join(chr(c) if 32 <= c < 127 else "." for c in data)
+    return f"{offset:08x}  {data.hex(' '):<47}  |{printable}|"
+
+
+def format_binary_diff(source: Path, target: Path, result: BinaryDiff) -> str:
+    lines = [
+        f"Binary files {source} and {target} differ",
+        f"  size: {result.sizes[0]} -> {result.sizes[1]} bytes",
+        f"  {DIGEST_ALGORITHM}: {result.digests[0]} -> {result.digests[1]}",
+        f"  {result.range_count} differing range(s), {result.differing_bytes} bytes:",
+    ]
+    for start, end in result.ranges:
+        lines.append(f"    0x{start:08x}-0x{end - 1:08x} ({end - start} bytes)")
+    if result.range_count > len(result.ranges):
+        lines.append(f"    ... {result.range_count - len(result.ranges)} more")
+    for offset, a, b in result.rows:
+        if a:
+            lines.append("-" + hex_line(offset, a))
+        if b:
+            lines.append("+" + hex_line(offset, b))
+    return "\n".join(lines) + "\n"
+
+
+def diff_files(
+    source: Path,
+    target: Path,
+    source_data: bytes | None = None,
+    target_data: bytes | None = None,
+    hex_blocks: int = 0,
+    engine: str = DEFAULT_ENGINE,
+) -> str:
+    if source_data is None:
+        source_data = source.read_bytes()
+    if target_data is None:
+        target_data = target.read_bytes()
+    try:
+        source_lines = source_data.decode("utf-8").splitlines(keepends=True)
+        target_lines = target_data.decode("utf-8").splitlines(keepends=True)
+    except UnicodeDecodeError:
+        # Invalid UTF-8 past the sniffed head: summarise it as binary.
+        result = compare_binary(
+            io.BytesIO(source_data), io.BytesIO(target_data), None, hex_blocks
+        )
+        return format_binary_diff(source, target, result)
     return "".join(
-        difflib.unified_diff(
+        unified_diff(
             source_lines,
             target_lines,
             fromfile=str(source),
             tofile=str(target),
+            engine=engine,
         )
     )
 
 
+@dataclass
+class Comparison:
+    equal: bool
+    # Contents of differing text files, for the unified diff.
+    source_data: bytes | None = None
+    target_data: bytes | None = None
+    # Digests, when both files were read to the end.
+    source_digest: str | None = None
+    target_digest: str | None = None
+    # Summary of differing binary (or oversized) files.
+    binary: BinaryDiff | None = None
+
+
+def compare_files(
+    source: Path,
+    target: Path,
+    sizes: tuple[int, int],
+    digests: tuple[str | None, str | None] = (None, None),
+    hex_blocks: int = 0,
+) -> Comparison:
+    """Size, then cached digests, then a chunked compare; one read per file.
+
+    Text files up to MAX_TEXT_SIZE keep their chunks while they agree, so a
+    late difference can be diffed without reading either file again. Binary
+    and larger files are streamed through compare_binary() instead.
+    """
+    if sizes[0] == sizes[1] and None not in digests and digests[0] == digests[1]:
+        return Comparison(True)
+    with source.open("rb") as src, target.open("rb") as tgt:
+        left, right = src.read(CHUNK_SIZE), tgt.read(CHUNK_SIZE)
+        if (
+            max(sizes) > MAX_TEXT_SIZE
+            or not looks_like_text(left)
+            or not looks_like_text(right)
+        ):
+            result = compare_binary(src, tgt, (left, right), hex_blocks)
+            return Comparison(result.equal, None, None, *result.digests, result)
+        if sizes[0] != sizes[1] or None not in digests:
+            return Comparison(False, left + src.read(), right + tgt.read())
+        # Equal bytes hash the same, so one digest serves both files.
+        digest = hashlib.new(DIGEST_ALGORITHM)
+        seen: list[bytes] = []
+        while left == right:
+            if not left:
+                value = digest.hexdigest()
+                return Comparison(True, None, None, value, value)
+            seen.append(left)
+            digest.update(left)
+            left, right = src.read(CHUNK_SIZE), tgt.read(CHUNK_SIZE)
+        head = b"".join(seen)
+        return Comparison(False, head + left + src.read(), head + right + tgt.read())
+
+
+def file_state(
+    rel: str,
+    entry: os.DirEntry[str] | None,
+    known: dict[str, list],
+    seen: dict[str, list] | None,
+) -> tuple[int, dict[str, str]] | None:
+    """(size, digests the cache still trusts) for one walked file, or None.
+
+    With a cache, the file's fresh entry is recorded in seen; the digests
+    dict is shared with it, so digests added later are stored too.
+    """
+    if entry is None:
+        return None
+    try:
+        st = entry.stat()
+    except OSError:
+        return None
+    fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+    cached = known.get(rel)
+    digests = dict(cached[3]) if cached and cached[:3] == fingerprint else {}
+    if seen is not None:
+        seen[rel] = [*fingerprint, digests]
+    return st.st_size, digests
+
+
+def store_digests(cache: SignatureCache, root: Path, seen: dict[str, list]) -> None:
+    settled = time.time_ns() - RACY_WINDOW_NS
+    cache.update(
+        root,
+        {rel: entry for rel, entry in seen.items() if entry[3] and entry[1] < settled},
+    )
+
+
 def resolve_target(target_arg: str) -> Path:
     target = Path(target_arg).resolve()
     if not target.exists():
@@ -87,42 +418,367 @@ def resolve_source(templates_arg: str, stack: str) -> Path:
     return source
 
 
-def report_differences(target: Path, source: Path) -> bool:
-    target_files = list_files(target)
-    source_files = list_files(source)
+@dataclass(frozen=True)
+class DiffTask:
+    source: Path
+    target: Path
+    sizes: tuple[int, int]
+    digests: tuple[str | None, str | None]
+    hex_blocks: int
+    engine: str
+
 
-    target_rel = {
-        p.relative_to(target)
-        for p in target_files
-        if p.relative_to(target) not in IGNORED_TARGET_FILES
+def diff_pair(task: DiffTask) -> tuple[str, str | None, str | None]:
+    """Compare one file pair: (diff output, "" if equal; the two digests).
+
+    Runs in a worker process, so it takes and returns only picklable data.
+    """
+    result = compare_files(
+        task.source, task.target, task.sizes, task.digests, task.hex_blocks
+    )
+    if result.equal:
+        output = ""
+    elif result.binary is not None:
+        output = format_binary_diff(task.source, task.target, result.binary)
+    else:
+        output = diff_files(
+            task.source,
+            task.target,
+            result.source_data,
+            result.target_data,
+            task.hex_blocks,
+            task.engine,
+        )
+    return output, result.source_digest, result.target_digest
+
+
+def diff_batch(tasks: list[DiffTask]) -> list[tuple[str, str | None, str | None]]:
+    return [diff_pair(task) for task in tasks]
+
+
+def run_tasks[T](
+    items: Iterable[tuple[T, DiffTask | None]], jobs: int
+) -> Iterator[tuple[T, tuple[str, str | None, str | None] | None]]:
+    """(item, diff_pair(task) or None) for each (item, task), in input order.
+
+    Tasks run in-process until POOL_MIN_BYTES have been compared, so small
+    trees never start a pool. Past that, with jobs > 1, the rest are diffed
+    in batches on a process pool. At most a few batches per worker are in
+    flight, and items without a task pass through as soon as everything
+    before them is done, so memory stays bounded and output starts while
+    the trees are still being walked.
+    """
+    items = iter(items)
+    compared = 0
+    for item, task in items:
+        yield item, None if task is None else diff_pair(task)
+        if task is not None:
+            compared += sum(task.sizes)
+            if jobs > 1 and compared >= POOL_MIN_BYTES:
+                break
+    else:
+        return
+
+    window: deque[tuple[list[T], Future | None]] = deque()
+
+    def ready(limit: int) -> Iterator[tuple[T, tuple | None]]:
+        while window and (
+            len(window) > limit or window[0][1] is None or window[0][1].done()
+        ):
+            batch_items, future = window.popleft()
+            if future is None:
+                yield batch_items[0], None
+            else:
+                yield from zip(batch_items, future.result(), strict=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        batch_items: list[T] = []
+        batch: list[DiffTask] = []
+        for item, task in items:
+            if task is not None:
+                batch_items.append(item)
+                batch.append(task)
+                if len(batch) < TASK_BATCH:
+                    continue
+            if batch:
+                window.append((batch_items, pool.submit(diff_batch, batch)))
+                batch_items, batch = [], []
+            if task is None:
+                window.append(([item], None))
+            yield from ready(jobs * 4)
+        if batch:
+            window.append((batch_items, pool.submit(diff_batch, batch)))
+        yield from ready(0)
+
+
+def report_differences(
+    target: Path,
+    source: Path,
+    cache: SignatureCache | None = None,
+    hex_blocks: int = 0,
+    jobs: int = 1,
+    engine: str = DEFAULT_ENGINE,
+) -> bool:
+    """Print how target differs from source; True if it does.
+
+    Both trees are walked once, in step (devcontainer_tree.merge_walk), and
+    every added, missing or differing file is reported in path order as
+    soon as it is known.
+    """
+    known = {
+        root: cache.roots.get(str(root), {}) if cache is not None else {}
+        for root in (source, target)
+    }
+    seen: dict[Path, dict[str, list] | None] = {
+        root: {} if cache is not None else None for root in (source, target)
     }
-    source_rel = {p.relative_to(source) for p in source_files}
 
-    additions = target_rel - source_rel
-    deletions = source_rel - target_rel
+    def pairs() -> Iterator[tuple[tuple, DiffTask | None]]:
+        for rel, source_entry, target_entry in merge_walk(source, target):
+            if rel in IGNORED_TARGET_FILES:
+                target_entry = None
+            left = file_state(rel, source_entry, known[source], seen[source])
+            right = file_state(rel, target_entry, known[target], seen[target])
+            if left is None and right is None:
+                continue
+            if left is None:
+                yield (f"+++ Added file: {rel}", None, None), None
+                continue
+            if right is None:
+                yield (f"--- Missing file from template: {rel}", None, None), None
+                continue
+            sizes = (left[0], right[0])
+            digests = (left[1].get(DIGEST_ALGORITHM), right[1].get(DIGEST_ALGORITHM))
+            # Settled by size and cache alone: not worth a trip to a worker.
+            if (
+                sizes[0] == sizes[1]
+                and None not in digests
+                and digests[0] == digests[1]
+            ):
+                continue
+            task = DiffTask(
+                source / rel, target / rel, sizes, digests, hex_blocks, engine
+            )
+            yield (None, left[1], right[1]), task
 
     changed = False
+    for (line, source_digests, target_digests), result in run_tasks(pairs(), jobs):
+        if result is None:
+            print(line, flush=True)
+            changed = True
+            continue
+        output, source_digest, target_digest = result
+        if source_digest:
+            source_digests[DIGEST_ALGORITHM] = source_digest
+            target_digests[DIGEST_ALGORITHM] = target_digest
+        if output:
+            print(output, flush=True)
+            changed = True
+
+    if cache is not None:
+        store_digests(cache, source, seen[source])
+        store_digests(cache, target, seen[target])
+        cache.save()
+
+    return changed
 
-    for addition in sorted(additions):
-        print(f"+++ Added file: {addition}")
-        changed = True
 
-    for deletion in sorted(deletions):
-        print(f"--- Missing file from template: {deletion}")
-        changed = True
+MANIFEST_LINES = {
+    "added": "+++ Added file: {}",
+    "removed": "--- Missing file from template: {}",
+    "modified": "*** Modified file: {}",
+    "mode": "*** Mode changed: {}",
+}
+
 
-    for src_file in sorted(source_files):
-        rel = src_file.relative_to(source)
-        tgt_file = target / rel
-        if not tgt_file.exists():
+def report_manifest_drift(
+    target: Path, metadata: dict, cache: SignatureCache | None = None
+) -> bool:
+    """Print target's differences from the manifest in metadata.
+
+    Raises ValueError (TypeError for a manifest that is not a list) when the
+    metadata has no usable manifest.
+    """
+    if "manifest" not in metadata:
+        raise ValueError("metadata has no manifest; provision again to record one")
+    algorithm = metadata.get("algorithm", DIGEST_ALGORITHM)
+    try:
+        length = hashlib.new(algorithm).digest_size * 2
+    except (TypeError, ValueError):
+        raise ValueError(f"unsupported algorithm {algorithm!r}") from None
+    manifest = read_manifest(metadata["manifest"], length)
+
+    def digest(path: Path) -> str:
+        with path.open("rb") as fh:
+            return hashlib.file_digest(fh, algorithm).hexdigest()
+
+    changes = manifest_changes(
+        target, manifest, algorithm, digest, cache, IGNORED_TARGET_FILES
+    )
+    for status, path in changes:
+        print(MANIFEST_LINES[status].format(path))
+    return bool(changes)
+
+
+def emit(event: str, **fields: object) -> None:
+    """Print one --watch event as a JSON line."""
+    record = {"event": event, "time": round(time.time(), 3), **fields}
+    print(json.dumps(record), flush=True)
+
+
+def pair_status(source: TreeIndex, target: TreeIndex, rel: str) -> str:
+    """ "added", "missing", "modified" or "clean" for rel in the two indexes."""
+    left, right = source.entries.get(rel), target.entries.get(rel)
+    if left is None:
+        return "clean" if right is None else "added"
+    if right is None:
+        return "missing"
+    if left[0] != right[0]:
+        return "modified"
+    left_digest, right_digest = source.digest(rel), target.digest(rel)
+    if left_digest is None or right_digest is None:
+        # A side vanished since it was indexed and was dropped from it.
+        return pair_status(source, target, rel)
+    return "modified" if left_digest != right_digest else "clean"
+
+
+def index_signature(index: TreeIndex) -> str:
+    """The flat signature of the indexed tree, as devcontainer-metadata.py
+    computes it: SHA-256 over the per-file digests in walk order."""
+    digests = [index.digest(rel) for rel in sorted(index.entries, key=path_key)]
+    joined = "".join(digest for digest in digests if digest is not None)
+    return hashlib.sha256(joined.encode()).hexdigest()
+
+
+def store_index(
+    cache: SignatureCache, index: TreeIndex, known: dict[str, list]
+) -> None:
+    """Write the digests index holds back, keeping other algorithms' ones."""
+    settled = time.time_ns() - RACY_WINDOW_NS
+    entries = {}
+    for rel, (size, mtime_ns, inode, digest) in index.entries.items():
+        if mtime_ns >= settled:
             continue
-        if src_file.read_bytes() != tgt_file.read_bytes():
-            diff = diff_files(src_file, tgt_file)
-            if diff:
-                print(diff)
-                changed = True
+        cached = known.get(rel)
+        digests = (
+            dict(cached[3]) if cached and cached[:3] == [size, mtime_ns, inode] else {}
+        )
+        if digest is not None:
+            digests[index.algorithm] = digest
+        if digests:
+            entries[rel] = [size, mtime_ns, inode, digests]
+    cache.update(index.root, entries)
+
+
+def watch_differences(
+    target: Path,
+    source: Path,
+    metadata: dict,
+    cache: SignatureCache | None = None,
+    hex_blocks: int = 0,
+    engine: str = DEFAULT_ENGINE,
+    delay: float = 0.2,
+    poll: bool = False,
+    interval: float = 1.0,
+) -> int:
+    """Report drift between the trees as JSON lines until interrupted.
+
+    Events: "ready" (the watcher in use and the initial drift), "change"
+    (a path whose status changed, or a modified file edited again, with its
+    diff) and "summary" (after each batch of changes: counts and the
+    target's signature against the recorded one).
+    """
+    algorithm = metadata.get("algorithm", DIGEST_ALGORITHM)
+    recorded = metadata.get("signature")
+    watcher = open_watcher([source, target], poll, interval)
+    known = {
+        root: cache.roots.get(str(root), {}) if cache is not None else {}
+        for root in (source, target)
+    }
+    source_index = TreeIndex(source, algorithm, known[source])
+    target_index = TreeIndex(target, algorithm, known[target], IGNORED_TARGET_FILES)
+    indexes = (source_index, target_index)
+
+    status: dict[str, str] = {}
+    for rel in sorted(source_index.entries.keys() | target_index.entries.keys()):
+        current = pair_status(source_index, target_index, rel)
+        if current != "clean":
+            status[rel] = current
+
+    def summary(event: str, **fields: object) -> None:
+        signature = index_signature(target_index)
+        emit(
+            event,
+            **fields,
+            clean=not status,
+            counts=dict(Counter(status.values())),
+            signature=signature,
+            matches_recorded=signature == recorded,
+        )
 
-    return changed
+    summary(
+        "ready",
+        watcher=watcher.name,
+        source=str(source),
+        target=str(target),
+        changes=[
+            {"path": rel, "status": status[rel]} for rel in sorted(status, key=path_key)
+        ],
+    )
+    if cache is not None:
+        for index in indexes:
+            store_index(cache, index, known[index.root])
+        cache.save()
+
+    try:
+        for batch in debounce(watcher, delay):
+            affected: set[str] = set()
+            for root_index, rel in batch:
+                affected |= indexes[root_index].refresh(rel)
+            reported = False
+            for rel in sorted(affected, key=path_key):
+                previous = status.get(rel, "clean")
+                current = pair_status(source_index, target_index, rel)
+                event: dict[str, object] = {
+                    "path": rel,
+                    "status": current,
+                    "previous": previous,
+                }
+                if current == "modified":
+                    left, right = source_index.entries[rel], target_index.entries[rel]
+                    task = DiffTask(
+                        source / rel,
+                        target / rel,
+                        (left[0], right[0]),
+                        (left[3], right[3]),
+                        hex_blocks,
+                        engine,
+                    )
+                    try:
+                        event["diff"] = diff_pair(task)[0]
+                    except OSError:
+                        # Deleted or replaced since it was indexed: the
+                        # watcher reports that next, and rel is redone then.
+                        continue
+                if current == "clean":
+                    status.pop(rel, None)
+                else:
+                    status[rel] = current
+                if current == previous and current != "modified":
+                    continue
+                emit("change", **event)
+                reported = True
+            if reported:
+                summary("summary")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if cache is not None:
+            for index in indexes:
+                store_index(cache, index, known[index.root])
+            cache.save()
+    return 0
 
 
 def main() -> int:
@@ -144,18 +800,128 @@ def main() -> int:
         "--metadata",
         help="Explicit metadata path (defaults to <target>/.template-metadata.json).",
     )
+    parser.add_argument(
+        "--cache-file",
+        type=Path,
+        default=default_cache_file(),
+        help="Per-file hash cache shared with devcontainer-metadata.py "
+        "(default: $XDG_CACHE_HOME/devcontainer-metadata/signatures.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Compare file contents without reading or writing the cache.",
+    )
+    parser.add_argument(
+        "--binary-diff",
+        type=int,
+        nargs="?",
+        const=8,
+        default=0,
+        metavar="BLOCKS",
+        help=f"Hex-dump up to BLOCKS differing {HEX_BLOCK}-byte blocks of each "
+        "binary file (default when given: 8).",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="File pairs compared and diffed in parallel worker processes "
+        "once 8 MiB have been read (default: CPU count, at most 32; 1 diffs "
+        "in-process).",
+    )
+    parser.add_argument(
+        "--diff-engine",
+        choices=ENGINES,
+        default=DEFAULT_ENGINE,
+        help="Line matcher behind the unified diffs (default: %(default)s; "
+        "histogram and myers stay fast on long, repetitive files).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and print drift as JSON lines whenever either tree "
+        "changes (inotify, or polling where it is unavailable).",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        metavar="SECONDS",
+        help="With --watch, report once edits pause this long (default: 0.2).",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        nargs="?",
+        const=1.0,
+        default=None,
+        metavar="SECONDS",
+        help="With --watch, poll every SECONDS (default when given: 1) "
+        "instead of using inotify.",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="Compare against the manifest in the metadata, not the template "
+        "(the default when the template stack is not on disk).",
+    )
     args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.watch and args.manifest:
+        parser.error("--watch needs the template on disk, not --manifest")
 
     try:
         target = resolve_target(args.target)
         metadata_path = resolve_metadata_path(target, args.metadata)
         metadata = load_metadata(metadata_path)
         stack = resolve_stack(metadata, args.stack)
-        source = resolve_source(args.templates, stack)
     except (FileNotFoundError, ValueError):
         return 1
 
-    changed = report_differences(target, source)
+    cache = None if args.no_cache else SignatureCache(args.cache_file)
+    use_manifest = args.manifest or (
+        "manifest" in metadata and not (Path(args.templates).resolve() / stack).exists()
+    )
+    if args.watch:
+        try:
+            source = resolve_source(args.templates, stack)
+        except FileNotFoundError:
+            return 1
+        # Leave through the finally blocks, so the cache is saved.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        return watch_differences(
+            target,
+            source,
+            metadata,
+            cache,
+            args.binary_diff,
+            args.diff_engine,
+            args.debounce,
+            args.poll is not None,
+            args.poll or 1.0,
+        )
+    if use_manifest:
+        if not args.manifest:
+            print(
+                f"Template stack '{stack}' not found; comparing against the "
+                "recorded manifest.",
+                file=sys.stderr,
+            )
+        try:
+            changed = report_manifest_drift(target, metadata, cache)
+        except (TypeError, ValueError) as exc:
+            print(f"Cannot use the manifest: {exc}", file=sys.stderr)
+            return 1
+    else:
+        try:
+            source = resolve_source(args.templates, stack)
+        except FileNotFoundError:
+            return 1
+        changed = report_differences(
+            target, source, cache, args.binary_diff, args.jobs, args.diff_engine
+        )
     if not changed:
         print("No differences detected between .devcontainer/ and template.")
         return 0
@@ -2,6 +2,33 @@
 """
 Inspect the .devcontainer/.template-metadata.json file and verify it matches
 the current template contents.
+
+Each file is digested with the metadata's "algorithm" (sha1, sha256 or
+blake2b; sha1 when the field is absent, as in every workspace provisioned
+before it existed), and the signature is the SHA-256 of those digests. The
+per-file digests are cached across runs, keyed by path and validated against
+size, mtime_ns and inode, so an unchanged template is verified with one
+stat() per file instead of reading every byte. The signature is identical
+with or without the cache.
+
+Metadata written with --write (format 2) also stores a Merkle tree of the
+template: file digests nested by directory, each directory digested over its
+entries. Verification then descends only into subtrees whose digest
+differs and lists the changed paths. Metadata holding only the flat
+format-1 signature is still verified as before.
+
+Files that do need hashing are hashed on a thread pool (hashlib releases
+the GIL), large ones through mmap; the signature still concatenates the
+per-file digests in sorted path order.
+
+Files are listed by devcontainer_tree.walk_files(), which skips editor swap
+files and Python caches plus anything matched by a .devcontainerignore or
+.gitignore inside the template.
+
+--write also records a manifest (path, size, mode and digest per file).
+--drift checks the target against it alone, so it works where the
+templates are not vendored: one stat() per target file, and a read only
+for files whose size still matches.
 """
 
 from __future__ import annotations
@@ -9,27 +36,257 @@
 import argparse
 import hashlib
 import json
+import mmap
+import os
+import stat
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
+SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from devcontainer_tree import (
+    RACY_WINDOW_NS,
+    SignatureCache,
+    build_manifest,
+    default_cache_file,
+    default_jobs,
+    manifest_changes,
+    read_manifest,
+    walk_files,
+)
+
+# Format 2 adds a Merkle "tree" next to the flat format-1 "signature".
+SIGNATURE_VERSION = 2
+
+# Per-file digest algorithms a signature may use. sha1 is the original
+# scheme and still what an "algorithm"-less metadata file means; sha256
+# is fastest where the CPU has SHA extensions, blake2b where it has not.
+ALGORITHMS = ("sha1", "sha256", "blake2b")
+DEFAULT_ALGORITHM = "sha1"
+
+# Files at least this large are hashed straight from a memory map; smaller
+# ones go through hashlib.file_digest(), which reads into one reused buffer.
+MMAP_THRESHOLD = 4 << 20
+
 
-def sha1_file(path: Path) -> str:
-    h = hashlib.sha1()
+def digest_size(algorithm: str) -> int:
+    """Length in hex characters of one file digest."""
+    return hashlib.new(algorithm).digest_size * 2
+
+
+def digest_file(path: Path, algorithm: str = DEFAULT_ALGORITHM) -> str:
     with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.new(algorithm, mapped).hexdigest()
+            except (OSError, ValueError):
+                # Not mappable (special filesystem): fall back to reads.
+                f.seek(0)
+        return hashlib.file_digest(f, algorithm).hexdigest()
+
+
+def scan_files(template_root: Path) -> list[tuple[str, Path, list[int]]]:
+    """(relative posix path, path, [size, mtime_ns, inode]) per file, sorted."""
+    root = template_root.absolute()
+    files = []
+    for rel, entry in walk_files(root):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+        files.append((rel, Path(entry.path), fingerprint))
+    return files
+
+
+def file_digests(
+    template_root: Path,
+    cache: SignatureCache | None = None,
+    jobs: int | None = None,
+    algorithm: str = DEFAULT_ALGORITHM,
+    scanned: list[tuple[str, Path, list[int]]] | None = None,
+) -> list[tuple[str, str]]:
+    """(posix path relative to template_root, digest) per file, in sorted order."""
+    root = template_root.absolute()
+    if scanned is None:
+        scanned = scan_files(root)
+    known = cache.roots.get(str(root), {}) if cache is not None else {}
+    files: list[tuple[str, Path, list[int], dict[str, str]]] = []
+    digests: list[str | None] = []
+    for rel, file_path, fingerprint in scanned:
+        entry = known.get(rel)
+        # Digests under other algorithms stay valid while the stat data does.
+        cached = dict(entry[3]) if entry and entry[:3] == fingerprint else {}
+        files.append((rel, file_path, fingerprint, cached))
+        digests.append(cached.get(algorithm))
+
+    def digest(path: Path) -> str:
+        return digest_file(path, algorithm)
+
+    missing = [index for index, value in enumerate(digests) if value is None]
+    workers = min(jobs or default_jobs(), len(missing))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            paths = [files[index][1] for index in missing]
+            # map() yields in submission order, so results line up with paths.
+            for index, value in zip(missing, pool.map(digest, paths), strict=True):
+                digests[index] = value
+    else:
+        for index in missing:
+            digests[index] = digest(files[index][1])
+
+    if cache is not None:
+        # A file modified moments ago could change again without its mtime
+        # moving, so it is hashed again next time rather than trusted.
+        settled = time.time_ns() - RACY_WINDOW_NS
+        cache.update(
+            root,
+            {
+                rel: [*fingerprint, {**cached, algorithm: value}]
+                for (rel, _path, fingerprint, cached), value in zip(
+                    files, digests, strict=True
+                )
+                if fingerprint[1] < settled
+            },
+        )
+        cache.save()
+    return [(rel, value) for (rel, *_rest), value in zip(files, digests, strict=True)]
 
 
-def compute_signature(template_root: Path) -> str:
-    checksums = []
-    for file_path in sorted(template_root.rglob("*")):
-        if file_path.is_file():
-            checksums.append(sha1_file(file_path))
-    joined = "".join(checksums).encode()
+def flat_signature(digests: list[tuple[str, str]]) -> str:
+    """Format 1: SHA-256 over the concatenated per-file digests."""
+    joined = "".join(digest for _rel, digest in digests).encode()
     return hashlib.sha256(joined).hexdigest()
 
 
+def compute_signature(
+    template_root: Path,
+    cache: SignatureCache | None = None,
+    jobs: int | None = None,
+    algorithm: str = DEFAULT_ALGORITHM,
+) -> str:
+    return flat_signature(file_digests(template_root, cache, jobs, algorithm))
+
+
+def directory_digest(children: dict) -> str:
+    """SHA-256 over one "<kind> <digest> <name>" line per child, by name."""
+    lines = []
+    for name in sorted(children):
+        node = children[name]
+        if isinstance(node, str):
+            lines.append(f"f {node} {name}\n")
+        else:
+            lines.append(f"d {node['digest']} {name}\n")
+    return hashlib.sha256("".join(lines).encode()).hexdigest()
+
+
+def merkle_tree(digests: list[tuple[str, str]]) -> dict:
+    """Format 2: nest file digests by directory, each directory digested.
+
+    A file is its digest's hex string; a directory is
+    {"digest": <sha256 of its entries>, "children": {name: node}}.
+    """
+    root: dict = {}
+    for rel, digest in digests:
+        *parents, name = rel.split("/")
+        children = root
+        for part in parents:
+            children = children.setdefault(part, {"children": {}})["children"]
+        children[name] = digest
+
+    def seal(children: dict) -> dict:
+        for node in children.values():
+            if not isinstance(node, str):
+                seal(node["children"])
+                node["digest"] = directory_digest(node["children"])
+        return children
+
+    children = seal(root)
+    return {"digest": directory_digest(children), "children": children}
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path}/{name}" if path else name
+
+
+def _files_under(node: dict | str, path: str) -> list[str]:
+    if isinstance(node, str):
+        return [path]
+    found = []
+    for name in sorted(node["children"]):
+        found.extend(_files_under(node["children"][name], _join(path, name)))
+    return found
+
+
+def changed_paths(
+    recorded: dict | str | None, current: dict | str | None, path: str = ""
+) -> list[tuple[str, str]]:
+    """(status, path) for every file that differs, skipping equal subtrees."""
+    if recorded is None:
+        return [("added", p) for p in _files_under(current, path)]
+    if current is None:
+        return [("removed", p) for p in _files_under(recorded, path)]
+    if isinstance(recorded, str) and isinstance(current, str):
+        return [] if recorded == current else [("modified", path)]
+    if isinstance(recorded, str) or isinstance(current, str):
+        return [("removed", p) for p in _files_under(recorded, path)] + [
+            ("added", p) for p in _files_under(current, path)
+        ]
+    if recorded["digest"] == current["digest"]:
+        return []
+    changes = []
+    names = set(recorded["children"]) | set(current["children"])
+    for name in sorted(names):
+        changes.extend(
+            changed_paths(
+                recorded["children"].get(name),
+                current["children"].get(name),
+                _join(path, name),
+            )
+        )
+    return changes
+
+
+def valid_tree(node: object, length: int) -> bool:
+    if isinstance(node, str):
+        return len(node) == length
+    return (
+        isinstance(node, dict)
+        and isinstance(node.get("digest"), str)
+        and isinstance(node.get("children"), dict)
+        and all(valid_tree(child, length) for child in node["children"].values())
+    )
+
+
+def build_metadata(
+    stack: str,
+    source: str,
+    digests: list[tuple[str, str]],
+    algorithm: str = DEFAULT_ALGORITHM,
+    manifest: list[dict] | None = None,
+) -> dict:
+    metadata = {
+        "stack": stack,
+        "source": source,
+        "signature": flat_signature(digests),
+        "signature_version": SIGNATURE_VERSION,
+        "algorithm": algorithm,
+        "tree": merkle_tree(digests),
+    }
+    if manifest is not None:
+        metadata["manifest"] = manifest
+    return metadata
+
+
 def load_metadata(metadata_path: Path) -> dict:
     if not metadata_path.exists():
         raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
@@ -37,64 +294,441 @@ def load_metadata(metadata_path: Path) -> dict:
         return json.load(fh)
 
 
+class MetadataError(Exception):
+    """The metadata or its template cannot be verified (exit status 1)."""
+
+
+@dataclass
+class Recorded:
+    """What a target's .template-metadata.json says was provisioned."""
+
+    target: Path
+    stack: str
+    source: str
+    template: Path
+    version: int
+    algorithm: str
+    signature: str | None
+    tree: dict | None
+
+
+def read_recorded(target_dir: Path, templates_dir: Path) -> Recorded:
+    metadata_path = target_dir / ".template-metadata.json"
+    try:
+        metadata = load_metadata(metadata_path)
+    except FileNotFoundError as exc:
+        raise MetadataError(str(exc)) from None
+    except (OSError, ValueError) as exc:
+        raise MetadataError(f"Cannot read {metadata_path}: {exc}") from None
+
+    stack = metadata.get("stack")
+    if not stack:
+        raise MetadataError("Metadata missing 'stack' field.")
+
+    source_path = metadata.get("source")
+    if not source_path:
+        raise MetadataError("Metadata missing 'source' field.")
+
+    current_template = templates_dir / stack
+    if not current_template.exists():
+        raise MetadataError(
+            f"Template directory for stack '{stack}' not found at {current_template}"
+        )
+
+    version = metadata.get("signature_version", 1)
+    recorded_tree = metadata.get("tree")
+    # Metadata from before the field existed is the original SHA-1 scheme.
+    algorithm = metadata.get("algorithm", DEFAULT_ALGORITHM)
+    if algorithm not in ALGORITHMS:
+        raise MetadataError(f"Metadata has an unsupported algorithm: {algorithm!r}")
+    if version not in (1, SIGNATURE_VERSION) or (
+        version == SIGNATURE_VERSION
+        and not valid_tree(recorded_tree, digest_size(algorithm))
+    ):
+        raise MetadataError(
+            f"Metadata has an unsupported or malformed signature (format {version})."
+        )
+    return Recorded(
+        target=target_dir,
+        stack=stack,
+        source=source_path,
+        template=current_template,
+        version=version,
+        algorithm=algorithm,
+        signature=metadata.get("signature"),
+        tree=recorded_tree if version == SIGNATURE_VERSION else None,
+    )
+
+
+@dataclass
+class TemplateDigest:
+    signature: str
+    tree: dict
+    # "index" when reused from a persisted index, else "computed".
+    origin: str
+
+
+class TemplateIndex:
+    """Signature and Merkle tree per (template, algorithm), computed once.
+
+    Many targets provisioned from the same stack share one entry. With a
+    path, entries persist across runs and are reused while a stat() walk of
+    the template (size, mtime_ns and inode of every file) is unchanged.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        cache: SignatureCache | None = None,
+        jobs: int | None = None,
+    ) -> None:
+        self.path = path
+        self.cache = cache
+        self.jobs = jobs
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == self.VERSION:
+                self.entries = dict(data["entries"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def get(self, template: Path, algorithm: str) -> TemplateDigest:
+        root = template.absolute()
+        key = f"{algorithm}:{root}"
+        scanned = scan_files(root)
+        fingerprint = hashlib.sha256(
+            json.dumps([[rel, *fp] for rel, _path, fp in scanned]).encode()
+        ).hexdigest()
+        entry = self.entries.get(key)
+        if entry and entry["fingerprint"] == fingerprint:
+            return TemplateDigest(entry["signature"], entry["tree"], "index")
+        digests = file_digests(root, self.cache, self.jobs, algorithm, scanned)
+        signature, tree = flat_signature(digests), merkle_tree(digests)
+        settled = time.time_ns() - RACY_WINDOW_NS
+        if all(fp[1] < settled for _rel, _path, fp in scanned):
+            self.entries[key] = {
+                "fingerprint": fingerprint,
+                "signature": signature,
+                "tree": tree,
+            }
+            self.dirty = True
+        return TemplateDigest(signature, tree, "computed")
+
+    def save(self) -> None:
+        if self.path is None or not self.dirty:
+            return
+        entries = {
+            key: entry
+            for key, entry in self.entries.items()
+            if Path(key.partition(":")[2]).is_dir()
+        }
+        payload = json.dumps({"version": self.VERSION, "entries": entries})
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".index.")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+def compare(
+    recorded: Recorded, current: TemplateDigest
+) -> list[tuple[str, str]] | None:
+    """Changed paths ([] when matching), or None for an opaque flat mismatch."""
+    if recorded.tree is not None:
+        return changed_paths(recorded.tree, current.tree)
+    return [] if current.signature == recorded.signature else None
+
+
+def check_drift(target_dir: Path, cache: SignatureCache | None) -> int:
+    """Compare target_dir with the manifest it was provisioned with."""
+    metadata_path = target_dir / ".template-metadata.json"
+    try:
+        metadata = load_metadata(metadata_path)
+    except FileNotFoundError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as exc:
+        print(f"Cannot read {metadata_path}: {exc}", file=sys.stderr)
+        return 1
+    algorithm = metadata.get("algorithm", DEFAULT_ALGORITHM)
+    if algorithm not in ALGORITHMS:
+        print(f"Metadata has an unsupported algorithm: {algorithm!r}", file=sys.stderr)
+        return 1
+    if "manifest" not in metadata:
+        print(
+            "Metadata has no manifest; provision again to record one.",
+            file=sys.stderr,
+        )
+        return 1
+    try:
+        manifest = read_manifest(metadata["manifest"], digest_size(algorithm))
+    except (TypeError, ValueError) as exc:
+        print(f"Metadata has a malformed manifest: {exc}", file=sys.stderr)
+        return 1
+
+    changes = manifest_changes(
+        target_dir,
+        manifest,
+        algorithm,
+        lambda path: digest_file(path, algorithm),
+        cache,
+        skip=[metadata_path.name],
+    )
+    print(f"Stack:            {metadata.get('stack')}")
+    print(f"Recorded source:  {metadata.get('source')}")
+    print(f"Manifest:         {len(manifest)} files ({algorithm})")
+    if changes:
+        print(
+            "Status: drift (target differs from the provisioned template).",
+            file=sys.stderr,
+        )
+        for status, path in changes:
+            print(f"  {status:<9} {path}", file=sys.stderr)
+        return 2
+    print("Status: OK (target matches the provisioned manifest).")
+    return 0
+
+
+def read_target_list(path: str) -> list[str]:
+    fh = sys.stdin if path == "-" else open(path, encoding="utf-8")  # noqa: SIM115
+    with fh:
+        lines = [line.strip() for line in fh]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def verify_batch(
+    targets: list[Path], templates_dir: Path, index: TemplateIndex, jobs: int
+) -> tuple[int, dict]:
+    """Verify every target, hashing each (template, algorithm) only once.
+
+    Metadata files are read concurrently; the distinct templates they name
+    are then digested once each (through the index), and every target is
+    compared against its template's digest. Returns (exit status, report).
+    """
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+
+        def read(target: Path) -> Recorded | MetadataError:
+            try:
+                return read_recorded(target, templates_dir)
+            except MetadataError as exc:
+                return exc
+
+        recorded = list(pool.map(read, targets))
+
+    templates: dict[tuple[Path, str], TemplateDigest] = {}
+    template_report: dict[str, dict] = {}
+    for item in recorded:
+        if isinstance(item, MetadataError):
+            continue
+        key = (item.template, item.algorithm)
+        if key in templates:
+            continue
+        hashed_at = time.monotonic()
+        templates[key] = index.get(item.template, item.algorithm)
+        template_report[f"{item.stack}:{item.algorithm}"] = {
+            "template": str(item.template),
+            "signature": templates[key].signature,
+            "origin": templates[key].origin,
+            "seconds": round(time.monotonic() - hashed_at, 4),
+        }
+    index.save()
+
+    results = []
+    for target, item in zip(targets, recorded, strict=True):
+        if isinstance(item, MetadataError):
+            results.append(
+                {"target": str(target), "status": "error", "error": str(item)}
+            )
+            continue
+        current = templates[(item.template, item.algorithm)]
+        changes = compare(item, current)
+        result = {
+            "target": str(target),
+            "stack": item.stack,
+            "status": "ok" if changes == [] else "mismatch",
+            "signature_format": item.version,
+            "algorithm": item.algorithm,
+            "recorded": item.signature,
+            "computed": current.signature,
+        }
+        if changes:
+            result["changes"] = [
+                {"status": status, "path": path} for status, path in changes
+            ]
+        results.append(result)
+
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    if counts.get("error"):
+        status = 1
+    elif counts.get("mismatch"):
+        status = 2
+    else:
+        status = 0
+    report = {
+        "ok": status == 0,
+        "seconds": round(time.monotonic() - started, 4),
+        "targets": len(targets),
+        "counts": counts,
+        "templates": template_report,
+        "results": results,
+    }
+    return status, report
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Verify Dev Container template metadata."
     )
     parser.add_argument(
         "--target",
-        default=".devcontainer",
-        help="Path to the .devcontainer directory (default: .devcontainer)",
+        dest="targets",
+        action="append",
+        help="Path to the .devcontainer directory (default: .devcontainer). "
+        "Repeat to verify several targets in one batch.",
+    )
+    parser.add_argument(
+        "--targets-from",
+        metavar="FILE",
+        help="Read more target directories from FILE, one per line ('-' for "
+        "stdin). Implies batch mode.",
     )
     parser.add_argument(
         "--templates",
         default="devcontainers",
         help="Path to the devcontainers/ directory (default: devcontainers)",
     )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="Persist per-template digests here and reuse them while the "
+        "template's stat data is unchanged.",
+    )
+    parser.add_argument(
+        "--cache-file",
+        type=Path,
+        default=default_cache_file(),
+        help="Per-file hash cache "
+        "(default: $XDG_CACHE_HOME/devcontainer-metadata/signatures.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Hash every file, reading and writing no cache.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Files hashed, or metadata files read, in parallel "
+        "(default: CPU count, at most 32).",
+    )
+    parser.add_argument(
+        "--write",
+        metavar="STACK",
+        help="Record metadata for STACK in the target instead of verifying.",
+    )
+    parser.add_argument(
+        "--source",
+        help="Source path to record with --write (default: the template path)",
+    )
+    parser.add_argument(
+        "--algorithm",
+        choices=ALGORITHMS,
+        default=DEFAULT_ALGORITHM,
+        help="Per-file digest to record with --write (default: sha1). "
+        "Verification always uses the algorithm recorded in the metadata.",
+    )
+    parser.add_argument(
+        "--drift",
+        action="store_true",
+        help="Check the target against the manifest recorded by --write "
+        "instead of the template, which need not exist.",
+    )
     args = parser.parse_args()
 
-    target_dir = Path(args.target).resolve()
-    templates_dir = Path(args.templates).resolve()
-    metadata_path = target_dir / ".template-metadata.json"
+    targets = list(args.targets or [])
+    if args.targets_from:
+        targets.extend(read_target_list(args.targets_from))
+    batch = bool(args.targets_from) or len(targets) > 1
+    if not targets and not args.targets_from:
+        targets = [".devcontainer"]
+    if batch and args.write:
+        parser.error("--write takes a single --target")
+    if args.drift and (batch or args.write):
+        parser.error("--drift takes a single --target and no --write")
 
-    try:
-        metadata = load_metadata(metadata_path)
-    except FileNotFoundError as exc:
-        print(exc, file=sys.stderr)
-        return 1
+    templates_dir = Path(args.templates).resolve()
+    cache = None if args.no_cache else SignatureCache(args.cache_file)
+    index = TemplateIndex(args.index, cache, args.jobs)
 
-    stack = metadata.get("stack")
-    if not stack:
-        print("Metadata missing 'stack' field.", file=sys.stderr)
-        return 1
+    if batch:
+        resolved = [Path(target).resolve() for target in targets]
+        status, report = verify_batch(resolved, templates_dir, index, args.jobs)
+        print(json.dumps(report, indent=2))
+        return status
 
-    source_path = metadata.get("source")
-    if not source_path:
-        print("Metadata missing 'source' field.", file=sys.stderr)
-        return 1
+    target_dir = Path(targets[0]).resolve()
+    metadata_path = target_dir / ".template-metadata.json"
 
-    current_template = templates_dir / stack
-    if not current_template.exists():
-        print(
-            f"Template directory for stack '{stack}' not found at {current_template}",
-            file=sys.stderr,
+    if args.write:
+        template = templates_dir / args.write
+        if not template.is_dir():
+            print(f"Template directory not found: {template}", file=sys.stderr)
+            return 1
+        digests = file_digests(template, cache, args.jobs, args.algorithm)
+        metadata = build_metadata(
+            args.write,
+            args.source or str(template),
+            digests,
+            args.algorithm,
+            build_manifest(template, digests),
+        )
+        metadata_path.write_text(
+            json.dumps(metadata, indent=2) + "\n", encoding="utf-8"
         )
+        print(f"Recorded {args.write} template metadata in {metadata_path}")
+        return 0
+
+    if args.drift:
+        return check_drift(target_dir, cache)
+
+    try:
+        recorded = read_recorded(target_dir, templates_dir)
+    except MetadataError as exc:
+        print(exc, file=sys.stderr)
         return 1
 
-    expected_signature = compute_signature(current_template)
-    recorded_signature = metadata.get("signature")
+    current = index.get(recorded.template, recorded.algorithm)
+    index.save()
 
-    print(f"Stack:            {stack}")
-    print(f"Template source:  {current_template}")
-    print(f"Recorded source:  {source_path}")
-    print(f"Recorded sig:     {recorded_signature}")
-    print(f"Computed sig:     {expected_signature}")
+    print(f"Stack:            {recorded.stack}")
+    print(f"Template source:  {recorded.template}")
+    print(f"Recorded source:  {recorded.source}")
+    print(f"Signature format: {recorded.version} ({recorded.algorithm})")
+    print(f"Recorded sig:     {recorded.signature}")
+    print(f"Computed sig:     {current.signature}")
 
-    if expected_signature != recorded_signature:
+    changes = compare(recorded, current)
+    if changes is None or changes:
         print(
             "Status: mismatch (template has changed since last provisioning).",
             file=sys.stderr,
         )
+        for status, path in changes or []:
+            print(f"  {status:<9} {path}", file=sys.stderr)
         return 2
 
     print("Status: OK (metadata matches current template).")
@@ -0,0 +1,339 @@
+"""
+Line diff engines behind devcontainer-diff.py's unified output.
+
+difflib.SequenceMatcher looks for the longest matching block and recurses
+on both sides of it, which turns close to quadratic on long, repetitive
+inputs such as generated devcontainer.json variants and long Dockerfiles.
+Two engines here produce the same unified diff text from other matchers:
+
+- "myers": Myers' O((N+M)D) algorithm, bisecting on the middle snake so
+  memory stays O(N+M) whatever the edit distance D. Regions whose middle
+  snake is not found within MAX_COST rounds are split on their histogram
+  anchor instead, or replaced whole, so unrelated files stay fast.
+- "histogram": git's histogram diff. It anchors each region on the
+  rarest line both sides share and recurses around it, handing regions
+  whose shared lines are all common (more than MAX_CHAIN copies) to myers.
+  Its hunks tend to line up with the edit a person made.
+
+"difflib" is the default and emits exactly difflib.unified_diff().
+Lines are compared as small integers, one per distinct line, so the inner
+loops never compare strings.
+"""
+
+from __future__ import annotations
+
+import difflib
+from collections.abc import Iterator, Sequence
+
+ENGINES = ("histogram", "myers", "difflib")
+DEFAULT_ENGINE = "difflib"
+
+# Lines occurring more often than this in a histogram region are too common
+# to anchor on.
+MAX_CHAIN = 64
+
+# Myers stops looking for the middle snake of a region after this many
+# rounds, bounding the O((N+M)D) search; the region is split on its
+# histogram anchor instead, or left as one replace when it has none.
+MAX_COST = 256
+
+Block = tuple[int, int, int]
+Opcode = tuple[str, int, int, int, int]
+
+
+def _intern(a: Sequence[str], b: Sequence[str]) -> tuple[list[int], list[int]]:
+    ids: dict[str, int] = {}
+    return (
+        [ids.setdefault(line, len(ids)) for line in a],
+        [ids.setdefault(line, len(ids)) for line in b],
+    )
+
+
+def _trim(
+    a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, out: list[Block]
+) -> tuple[int, int, int, int]:
+    """Record the region's common prefix and suffix; return what is left."""
+    start = a0
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        a0 += 1
+        b0 += 1
+    if a0 > start:
+        out.append((start, b0 - (a0 - start), a0 - start))
+    end = a1
+    while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+    if a1 < end:
+        out.append((a1, b1, end - a1))
+    return a0, a1, b0, b1
+
+
+def _bisect(
+    a: list[int], a0: int, a1: int, b: list[int], b0: int, b1: int
+) -> tuple[int, int] | None:
+    """A split point on the middle snake of a[a0:a1] vs b[b0:b1].
+
+    Forward and reverse searches run in turn until their furthest-reaching
+    paths overlap; only two diagonal vectors are kept. None means the
+    regions share no line, or that no overlap turned up in MAX_COST rounds.
+    """
+    n, m = a1 - a0, b1 - b0
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    forward = [-1] * size
+    reverse = [-1] * size
+    forward[offset + 1] = 0
+    reverse[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(min(max_d, MAX_COST)):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (
+                k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]
+            ):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if (
+                    0 <= k2_offset < size
+                    and reverse[k2_offset] != -1
+                    and x1 >= n - reverse[k2_offset]
+                ):
+                    return a0 + x1, b0 + y1
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (
+                k2 != d and reverse[k2_offset - 1] < reverse[k2_offset + 1]
+            ):
+                x2 = reverse[k2_offset + 1]
+            else:
+                x2 = reverse[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a1 - 1 - x2] == b[b1 - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            reverse[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    if x1 >= n - x2:
+                        return a0 + x1, b0 + offset + x1 - k1_offset
+    return None
+
+
+def _myers(
+    a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, out: list[Block]
+) -> None:
+    stack = [(a0, a1, b0, b1)]
+    while stack:
+        a0, a1, b0, b1 = _trim(a, b, *stack.pop(), out)
+        if a0 == a1 or b0 == b1:
+            continue
+        split = _bisect(a, a0, a1, b, b0, b1)
+        if split is None:
+            anchor = _anchor(a, b, a0, a1, b0, b1)[0]
+            if anchor is None:
+                continue
+            i, j, size = anchor
+            out.append(anchor)
+            stack.append((i + size, a1, j + size, b1))
+            stack.append((a0, i, b0, j))
+            continue
+        if split in ((a0, b0), (a1, b1)):
+            continue
+        x, y = split
+        stack.append((x, a1, y, b1))
+        stack.append((a0, x, b0, y))
+
+
+def _anchor(
+    a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int
+) -> tuple[Block | None, bool]:
+    """The histogram anchor of a region, and whether the sides share a line.
+
+    The anchor is the longest run of common lines whose rarest line (by
+    count in a) is rarer than any other run's; runs made only of lines
+    seen more than MAX_CHAIN times are not considered.
+    """
+    where: dict[int, list[int]] = {}
+    for i in range(a0, a1):
+        where.setdefault(a[i], []).append(i)
+    best = None
+    best_count = MAX_CHAIN
+    best_length = 0
+    shared = False
+    j = b0
+    while j < b1:
+        positions = where.get(b[j])
+        if positions is None:
+            j += 1
+            continue
+        shared = True
+        if len(positions) > best_count:
+            j += 1
+            continue
+        next_j = j + 1
+        for i in positions:
+            si, sj = i, j
+            while si > a0 and sj > b0 and a[si - 1] == b[sj - 1]:
+                si -= 1
+                sj -= 1
+            ei, ej = i + 1, j + 1
+            while ei < a1 and ej < b1 and a[ei] == b[ej]:
+                ei += 1
+                ej += 1
+            count = min(len(where[a[k]]) for k in range(si, ei))
+            if count < best_count or (count == best_count and ei - si > best_length):
+                best = (si, sj, ei - si)
+                best_count = count
+                best_length = ei - si
+            next_j = max(next_j, ej)
+        j = next_j
+    return best, shared
+
+
+def _histogram(
+    a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, out: list[Block]
+) -> None:
+    stack = [(a0, a1, b0, b1)]
+    while stack:
+        a0, a1, b0, b1 = _trim(a, b, *stack.pop(), out)
+        if a0 == a1 or b0 == b1:
+            continue
+        anchor, shared = _anchor(a, b, a0, a1, b0, b1)
+        if anchor is None:
+            if shared:
+                _myers(a, b, a0, a1, b0, b1, out)
+            continue
+        i, j, size = anchor
+        out.append(anchor)
+        stack.append((i + size, a1, j + size, b1))
+        stack.append((a0, i, b0, j))
+
+
+def matching_blocks(
+    a: Sequence[str], b: Sequence[str], engine: str = DEFAULT_ENGINE
+) -> list[Block]:
+    """(i, j, size) runs with a[i:i+size] == b[j:j+size], increasing, merged."""
+    if engine == "difflib":
+        matcher = difflib.SequenceMatcher(None, a, b)
+        return [tuple(block) for block in matcher.get_matching_blocks()[:-1]]
+    if engine not in ENGINES:
+        raise ValueError(f"unknown diff engine {engine!r}")
+    x, y = _intern(a, b)
+    found: list[Block] = []
+    run = _histogram if engine == "histogram" else _myers
+    run(x, y, 0, len(x), 0, len(y), found)
+    blocks: list[Block] = []
+    for i, j, size in sorted(found):
+        if not size:
+            continue
+        if (
+            blocks
+            and blocks[-1][0] + blocks[-1][2] == i
+            and blocks[-1][1] + blocks[-1][2] == j
+        ):
+            blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + size)
+        else:
+            blocks.append((i, j, size))
+    return blocks
+
+
+def opcodes(blocks: list[Block], len_a: int, len_b: int) -> list[Opcode]:
+    """difflib-style (tag, i1, i2, j1, j2) edits between the matching blocks."""
+    codes: list[Opcode] = []
+    i = j = 0
+    for ai, bj, size in [*blocks, (len_a, len_b, 0)]:
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            codes.append(("equal", ai, i, bj, j))
+    return codes
+
+
+def grouped_opcodes(codes: list[Opcode], n: int = 3) -> Iterator[list[Opcode]]:
+    """Hunks with up to n lines of context, as SequenceMatcher groups them."""
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    codes = list(codes)
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group: list[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _range(start: int, stop: int) -> str:
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+
+def unified_diff(
+    a: Sequence[str],
+    b: Sequence[str],
+    fromfile: str = "",
+    tofile: str = "",
+    n: int = 3,
+    engine: str = DEFAULT_ENGINE,
+) -> Iterator[str]:
+    """difflib.unified_diff() output, with the matching done by engine."""
+    if engine == "difflib":
+        yield from difflib.unified_diff(a, b, fromfile, tofile, n=n)
+        return
+    codes = opcodes(matching_blocks(a, b, engine), len(a), len(b))
+    started = False
+    for group in grouped_opcodes(codes, n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}\n"
+            yield f"+++ {tofile}\n"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@\n"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            if tag in ("replace", "delete"):
+                for line in a[i1:i2]:
+                    yield "-" + line
+            if tag in ("replace", "insert"):
+                for line in b[j1:j2]:
+                    yield "+" + line
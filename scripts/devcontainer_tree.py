@@ -0,0 +1,454 @@
+"""
+Deterministic, ignore-aware walk of a template tree.
+
+Shared by devcontainer-metadata.py and devcontainer-diff.py. The walk is
+built on os.scandir, so file and directory types come from the DirEntry
+(d_type) instead of a stat() per path, and each directory is sorted by
+name before descending. That pre-order is the same as sorted(rglob("*")),
+which keeps signatures of trees without ignored files unchanged.
+
+Editor droppings and Python caches are always skipped (DEFAULT_IGNORES).
+A .gitignore or .devcontainerignore in any directory of the tree adds
+gitignore-style patterns for that directory and below: "#" comments,
+"!" negation, a trailing "/" for directories only, a leading or inner "/"
+to anchor the pattern, and "*", "?", "[...]" and "**" wildcards. As in git,
+a file inside an ignored directory cannot be re-included.
+
+SignatureCache, the per-file digest cache both scripts consult, lives here
+too, so a template hashed by one of them is not read again by the other.
+
+A manifest is the per-file record .template-metadata.json keeps of the
+template it was provisioned from: path, size, mode and digest of every
+file. manifest_changes() checks a target against it without the template,
+with one stat() per file and a read only where the size matches.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+IGNORE_FILES = (".gitignore", ".devcontainerignore")
+DEFAULT_IGNORES = (
+    "__pycache__/",
+    "*.py[cod]",
+    "*.swp",
+    "*.swo",
+    "*~",
+    ".#*",
+    ".DS_Store",
+)
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    pattern: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+    # Posix directory of the ignore file relative to the root, "" or "a/b/".
+    base: str
+
+
+def _translate(pattern: str) -> str:
+    """Regex source for one gitignore glob, matched against a posix path."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1 : j].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = j + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def parse_ignore_patterns(lines: Iterable[str], base: str = "") -> list[IgnoreRule]:
+    """IgnoreRules for gitignore-style lines read from the directory base."""
+    rules = []
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+        while line.endswith(" ") and not line.endswith("\\ "):
+            line = line[:-1]
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        source = _translate(line.removeprefix("/"))
+        if not anchored:
+            source = "(?:.*/)?" + source
+        rules.append(IgnoreRule(re.compile(source, re.DOTALL), negate, dir_only, base))
+    return rules
+
+
+def is_ignored(rules: Iterable[IgnoreRule], rel: str, is_dir: bool) -> bool:
+    """Whether the posix path rel is ignored; the last matching rule wins."""
+    ignored = False
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if not rel.startswith(rule.base):
+            continue
+        if rule.pattern.fullmatch(rel[len(rule.base) :]):
+            ignored = not rule.negate
+    return ignored
+
+
+DEFAULT_RULES = tuple(parse_ignore_patterns(DEFAULT_IGNORES))
+
+
+def _read_rules(directory: str, prefix: str, names: set[str]) -> list[IgnoreRule]:
+    rules = []
+    for name in IGNORE_FILES:
+        if name not in names:
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as fh:
+                rules.extend(parse_ignore_patterns(fh, prefix))
+        except (OSError, UnicodeDecodeError):
+            continue
+    return rules
+
+
+def _walk(
+    directory: str, prefix: str, rules: tuple[IgnoreRule, ...], read_ignores: bool
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return
+    if read_ignores:
+        local = _read_rules(directory, prefix, {entry.name for entry in entries})
+        if local:
+            rules = (*rules, *local)
+    for entry in entries:
+        rel = prefix + entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not is_ignored(rules, rel, True):
+                    yield from _walk(entry.path, rel + "/", rules, read_ignores)
+                continue
+            if not entry.is_file():
+                continue
+        except OSError:
+            continue
+        if not is_ignored(rules, rel, False):
+            yield rel, entry
+
+
+def walk_files(
+    root: str | os.PathLike[str], ignore: bool = True
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    """(relative posix path, DirEntry) per regular file under root, sorted.
+
+    Symlinks to files are yielded (DirEntry.stat() follows them); symlinked
+    directories are not descended into. With ignore=False every file is
+    yielded, as rglob("*") would list it.
+    """
+    rules = DEFAULT_RULES if ignore else ()
+    yield from _walk(os.fspath(root), "", rules, ignore)
+
+
+def _rules_in(
+    root: str | os.PathLike[str], rel_dir: str
+) -> tuple[IgnoreRule, ...] | None:
+    """Rules the walk applies to entries of rel_dir ("" for the root).
+
+    None when the walk never enters rel_dir: an ancestor (or rel_dir
+    itself) is ignored, a symlink or not a directory.
+    """
+    directory = os.fspath(root)
+    rules = DEFAULT_RULES
+    prefix = ""
+    for name in rel_dir.split("/") if rel_dir else ():
+        rules = (*rules, *_read_rules(directory, prefix, set(IGNORE_FILES)))
+        rel = prefix + name
+        directory = os.path.join(directory, name)
+        if os.path.islink(directory) or is_ignored(rules, rel, True):
+            return None
+        prefix = rel + "/"
+    if not os.path.isdir(directory):
+        return None
+    return (*rules, *_read_rules(directory, prefix, set(IGNORE_FILES)))
+
+
+def walk_subtree(
+    root: str | os.PathLike[str], rel_dir: str
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    """What walk_files(root) yields under rel_dir, without walking the rest."""
+    if not rel_dir:
+        yield from walk_files(root)
+        return
+    parent, _, _name = rel_dir.rpartition("/")
+    rules = _rules_in(root, parent)
+    if rules is None or is_ignored(rules, rel_dir, True):
+        return
+    directory = os.path.join(os.fspath(root), rel_dir)
+    if not os.path.islink(directory):
+        yield from _walk(directory, rel_dir + "/", rules, True)
+
+
+def is_walked(root: str | os.PathLike[str], rel: str) -> bool:
+    """Whether walk_files(root) would yield the file rel, if it existed."""
+    parent, _, _name = rel.rpartition("/")
+    rules = _rules_in(root, parent)
+    return rules is not None and not is_ignored(rules, rel, False)
+
+
+def path_key(rel: str) -> list[str]:
+    """Sort key ordering relative paths exactly as the walk yields them.
+
+    Comparing by component puts "a/x" before "a.txt"; plain string order
+    does not.
+    """
+    return rel.split("/")
+
+
+def merge_walk(
+    left: str | os.PathLike[str],
+    right: str | os.PathLike[str],
+    ignore: bool = True,
+) -> Iterator[tuple[str, os.DirEntry[str] | None, os.DirEntry[str] | None]]:
+    """Merge-join of walk_files(left) and walk_files(right), in one pass.
+
+    Yields (relative posix path, left entry, right entry) in walk order,
+    with None on the side that lacks the file. Both walks are consumed
+    lazily, so memory is bounded by the directories on the current path,
+    not by the number of files.
+    """
+    lefts, rights = walk_files(left, ignore), walk_files(right, ignore)
+    a, b = next(lefts, None), next(rights, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and path_key(a[0]) < path_key(b[0])):
+            yield a[0], a[1], None
+            a = next(lefts, None)
+        elif a is None or path_key(b[0]) < path_key(a[0]):
+            yield b[0], None, b[1]
+            b = next(rights, None)
+        else:
+            yield a[0], a[1], b[1]
+            a, b = next(lefts, None), next(rights, None)
+
+
+def list_files(root: str | os.PathLike[str], ignore: bool = True) -> list[Path]:
+    """Paths of the files walk_files() yields, in the same order."""
+    return [Path(entry.path) for _, entry in walk_files(root, ignore)]
+
+
+def default_jobs() -> int:
+    return min(32, os.cpu_count() or 1)
+
+
+# Files modified less than this long ago are not cached yet.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def default_cache_file() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "devcontainer-metadata" / "signatures.json"
+
+
+class SignatureCache:
+    """Persistent per-file digests, trusted while (size, mtime_ns, inode) hold.
+
+    Entries are grouped by template root and map each file's path relative
+    to it to [size, mtime_ns, inode, {algorithm: digest}]. Any mismatch in
+    the stat data means the file is read and hashed again. A missing,
+    corrupt or unwritable cache file only costs speed.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.roots: dict[str, dict[str, list]] = {}
+        self.dirty = False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == self.VERSION:
+                self.roots = dict(data["roots"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def update(self, root: Path, entries: dict[str, list]) -> None:
+        """Replace root's entries with the ones seen in its latest walk."""
+        key = str(root)
+        if self.roots.get(key) != entries:
+            self.roots[key] = entries
+            self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        # Roots of deleted trees (old checkouts, test dirs) are dropped.
+        roots = {
+            root: files for root, files in self.roots.items() if Path(root).is_dir()
+        }
+        payload = json.dumps({"version": self.VERSION, "roots": roots})
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".signatures.")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+def file_mode(st_mode: int) -> str:
+    """Permission bits as ansible.builtin.find reports them, e.g. "0644"."""
+    return f"{stat.S_IMODE(st_mode):04o}"
+
+
+def build_manifest(
+    root: str | os.PathLike[str], digests: Iterable[tuple[str, str]]
+) -> list[dict]:
+    """Manifest entries for root's files, given (relative path, digest) pairs."""
+    manifest = []
+    for rel, digest in digests:
+        st = os.stat(os.path.join(root, rel))
+        manifest.append(
+            {
+                "path": rel,
+                "size": st.st_size,
+                "mode": file_mode(st.st_mode),
+                "digest": digest,
+            }
+        )
+    return manifest
+
+
+def read_manifest(entries: object, length: int) -> dict[str, tuple[int, str, str]]:
+    """Relative path -> (size, mode, digest).
+
+    length is the hex length of one digest under the metadata's algorithm.
+    Raises TypeError when entries is not a list, ValueError when an entry
+    is malformed.
+    """
+    if not isinstance(entries, list):
+        raise TypeError("manifest is not a list")
+    manifest = {}
+    for entry in entries:
+        try:
+            path, size = entry["path"], entry["size"]
+            mode, digest = entry["mode"], entry["digest"]
+        except (TypeError, KeyError):
+            raise ValueError(f"malformed manifest entry: {entry!r}") from None
+        if not (
+            isinstance(path, str)
+            and isinstance(size, int)
+            and isinstance(mode, str)
+            and re.fullmatch("[0-7]{3,4}", mode)
+            and isinstance(digest, str)
+            and len(digest) == length
+        ):
+            raise ValueError(f"malformed manifest entry: {entry!r}")
+        manifest[path] = (size, mode, digest)
+    return manifest
+
+
+def manifest_changes(
+    root: str | os.PathLike[str],
+    manifest: dict[str, tuple[int, str, str]],
+    algorithm: str,
+    digest: Callable[[Path], str],
+    cache: SignatureCache | None = None,
+    skip: Iterable[str] = (),
+) -> list[tuple[str, str]]:
+    """(status, path) for root's files that differ from manifest, by path.
+
+    Statuses are "added", "removed", "modified" and "mode". Each file is
+    stat()ed once; it is read (through digest) only when its size matches
+    and the cache holds no digest for its current stat data. Only the
+    executable bits count as a mode change: git and umask decide the rest.
+    """
+    root = Path(root).absolute()
+    skip = set(skip)
+    known = cache.roots.get(str(root), {}) if cache is not None else {}
+    seen: dict[str, list] = {}
+    changes = []
+    for rel, entry in walk_files(root):
+        if rel in skip:
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+        cached = known.get(rel)
+        digests = dict(cached[3]) if cached and cached[:3] == fingerprint else {}
+        seen[rel] = [*fingerprint, digests]
+        recorded = manifest.get(rel)
+        if recorded is None:
+            changes.append(("added", rel))
+            continue
+        size, mode, expected = recorded
+        if st.st_size != size:
+            changes.append(("modified", rel))
+            continue
+        if algorithm not in digests:
+            digests[algorithm] = digest(Path(entry.path))
+        if digests[algorithm] != expected:
+            changes.append(("modified", rel))
+        elif (stat.S_IMODE(st.st_mode) ^ int(mode, 8)) & 0o111:
+            changes.append(("mode", rel))
+    changes.extend(
+        ("removed", rel) for rel in manifest if rel not in seen and rel not in skip
+    )
+
+    if cache is not None:
+        settled = time.time_ns() - RACY_WINDOW_NS
+        cache.update(
+            root,
+            {
+                rel: entry
+                for rel, entry in seen.items()
+                if entry[3] and entry[1] < settled
+            },
+        )
+        cache.save()
+    return sorted(changes, key=lambda change: path_key(change[1]))
@@ -0,0 +1,331 @@
+"""
+Change notification and in-memory tree indexes for devcontainer-diff.py --watch.
+
+A watcher reports which paths of the watched roots changed, as
+(root index, relative posix path) pairs. Inotify uses the Linux inotify API
+through ctypes, with one watch per directory; Poller re-walks the trees with
+one stat() per file and compares the results, wherever inotify is missing
+or out of watches. debounce() groups the bursts editors produce (write
+to a temporary file, rename, chmod) into one batch.
+
+TreeIndex holds the [size, mtime_ns, inode, digest] of every walked file of
+one root and brings single paths or subtrees up to date on demand, hashing
+a file only when its digest is asked for.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import hashlib
+import os
+import select
+import stat
+import struct
+import sys
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+
+from devcontainer_tree import IGNORE_FILES, is_walked, walk_subtree
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+# struct inotify_event without its trailing name.
+EVENT = struct.Struct("iIII")
+
+Change = tuple[int, str]
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+class Inotify:
+    """Watch every directory under the roots; raises OSError if unavailable."""
+
+    name = "inotify"
+
+    def __init__(self, roots: Sequence[Path]) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.roots = list(roots)
+        # Watch descriptor -> (root index, directory relative to the root).
+        self.watches: dict[int, Change] = {}
+        try:
+            for index in range(len(self.roots)):
+                self._watch_tree(index, "")
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, index: int, rel_dir: str) -> None:
+        path = os.path.join(self.roots[index], rel_dir)
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        self.watches[wd] = (index, rel_dir)
+
+    def _watch_tree(self, index: int, rel_dir: str) -> None:
+        self._watch(index, rel_dir)
+        top = os.path.join(self.roots[index], rel_dir)
+        for dirpath, dirnames, _files in os.walk(top):
+            base = Path(dirpath).relative_to(self.roots[index]).as_posix()
+            for name in dirnames:
+                if not os.path.islink(os.path.join(dirpath, name)):
+                    self._watch(index, _join("" if base == "." else base, name))
+
+    def _forget_tree(self, index: int, rel_dir: str) -> None:
+        """Drop the watches of a directory moved away; they keep old paths."""
+        prefix = rel_dir + "/"
+        for wd, (watched, rel) in list(self.watches.items()):
+            if watched == index and (rel == rel_dir or rel.startswith(prefix)):
+                self._rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read(self, timeout: float | None) -> set[Change]:
+        """Paths changed since the last call, waiting up to timeout for one."""
+        changed: set[Change] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = EVENT.unpack_from(data, offset)
+                raw = data[offset + EVENT.size : offset + EVENT.size + length]
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: every root has to be checked again.
+                    changed.update((index, "") for index in range(len(self.roots)))
+                    continue
+                if wd not in self.watches:
+                    continue
+                index, rel_dir = self.watches[wd]
+                if mask & IN_IGNORED:
+                    del self.watches[wd]
+                    continue
+                name = raw.split(b"\0", 1)[0]
+                if not name:
+                    changed.add((index, rel_dir))
+                    continue
+                rel = _join(rel_dir, os.fsdecode(name))
+                if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                    self._forget_tree(index, rel)
+                elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_tree(index, rel)
+                    except OSError:
+                        # Out of watches: the subtree is still rescanned now.
+                        pass
+                changed.add((index, rel))
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Poller:
+    """Re-walk the roots every interval seconds and report what changed."""
+
+    name = "poll"
+
+    def __init__(self, roots: Sequence[Path], interval: float = 1.0) -> None:
+        self.roots = list(roots)
+        self.interval = interval
+        self.snapshots = [self._scan(root) for root in self.roots]
+
+    @staticmethod
+    def _scan(root: Path) -> dict[str, tuple[int, int, int, int]]:
+        snapshot = {}
+        for rel, entry in walk_subtree(root, ""):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot[rel] = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_mode)
+        return snapshot
+
+    def read(self, timeout: float | None) -> set[Change]:
+        while True:
+            time.sleep(
+                self.interval if timeout is None else min(self.interval, timeout)
+            )
+            changed: set[Change] = set()
+            for index, root in enumerate(self.roots):
+                current, previous = self._scan(root), self.snapshots[index]
+                changed.update(
+                    (index, rel)
+                    for rel in current.keys() | previous.keys()
+                    if current.get(rel) != previous.get(rel)
+                )
+                self.snapshots[index] = current
+            if changed or timeout is not None:
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(
+    roots: Sequence[Path], poll: bool = False, interval: float = 1.0
+) -> Inotify | Poller:
+    """Inotify where it works, else a Poller."""
+    if not poll:
+        try:
+            return Inotify(roots)
+        except (OSError, AttributeError):
+            pass
+    return Poller(roots, interval)
+
+
+def debounce(
+    watcher: Inotify | Poller, delay: float, max_delay: float | None = None
+) -> Iterator[set[Change]]:
+    """Batches of changes, each closed after delay seconds without events.
+
+    A tree that never settles still yields a batch every max_delay seconds
+    (default: ten times delay).
+    """
+    max_delay = delay * 10 if max_delay is None else max_delay
+    while True:
+        changed = watcher.read(None)
+        if not changed:
+            continue
+        deadline = time.monotonic() + max_delay
+        while time.monotonic() < deadline:
+            more = watcher.read(delay)
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+class TreeIndex:
+    """[size, mtime_ns, inode, digest or None] per walked file of one root."""
+
+    def __init__(
+        self,
+        root: Path,
+        algorithm: str,
+        known: dict[str, list] | None = None,
+        skip: Iterable[str] = (),
+    ) -> None:
+        self.root = root
+        self.algorithm = algorithm
+        self.skip = set(skip)
+        self.entries: dict[str, list] = {}
+        known = known or {}
+        for rel, entry in walk_subtree(root, ""):
+            if rel in self.skip:
+                continue
+            try:
+                fingerprint = self._fingerprint(entry.stat())
+            except OSError:
+                continue
+            cached = known.get(rel)
+            digest = None
+            if cached and cached[:3] == fingerprint:
+                digest = cached[3].get(algorithm)
+            self.entries[rel] = [*fingerprint, digest]
+
+    @staticmethod
+    def _fingerprint(st: os.stat_result) -> list[int]:
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def digest(self, rel: str) -> str | None:
+        """The digest of rel, hashing it on first use.
+
+        None when the file can no longer be read (deleted or renamed since
+        it was indexed); rel is then dropped, and refreshing it adds it back.
+        """
+        entry = self.entries[rel]
+        if entry[3] is None:
+            try:
+                with open(os.path.join(self.root, rel), "rb") as fh:
+                    entry[3] = hashlib.file_digest(fh, self.algorithm).hexdigest()
+            except OSError:
+                del self.entries[rel]
+                return None
+        return entry[3]
+
+    def refresh(self, rel: str) -> set[str]:
+        """Bring rel (a file, or a whole directory) up to date.
+
+        Returns the files added, removed or changed. A changed ignore file
+        refreshes its directory, since it may include or exclude any of it.
+        """
+        parent, _, name = rel.rpartition("/")
+        if name in IGNORE_FILES:
+            rel = parent
+        path = os.path.join(self.root, rel)
+        subtree = (
+            not rel
+            or (os.path.isdir(path) and not os.path.islink(path))
+            or (rel not in self.entries and not os.path.lexists(path))
+        )
+        fresh: dict[str, list[int]] = {}
+        if subtree:
+            prefix = rel + "/" if rel else ""
+            stale = [r for r in self.entries if r == rel or r.startswith(prefix)]
+            for walked, entry in walk_subtree(self.root, rel):
+                try:
+                    fresh[walked] = self._fingerprint(entry.stat())
+                except OSError:
+                    continue
+        else:
+            stale = [rel] if rel in self.entries else []
+            try:
+                st = os.stat(path)
+                if stat.S_ISREG(st.st_mode) and is_walked(self.root, rel):
+                    fresh[rel] = self._fingerprint(st)
+            except OSError:
+                pass
+
+        changed = set()
+        for gone in stale:
+            if gone not in fresh:
+                del self.entries[gone]
+                changed.add(gone)
+        for current, fingerprint in fresh.items():
+            if current in self.skip:
+                continue
+            entry = self.entries.get(current)
+            if entry is None or entry[:3] != fingerprint:
+                self.entries[current] = [*fingerprint, None]
+                changed.add(current)
+        return changed
@@ -9,16 +9,43 @@
   - "type!:" subject or "BREAKING CHANGE" in body  -> major
   - feat                                           -> minor
   - fix / perf / security / revert                 -> patch
+
+The range is read with a single "git log -z" whose NUL-separated records
+are parsed as they stream in, one commit at a time; once a commit forces
+a major bump git is stopped, since nothing later can change the answer.
+
+Results persist in a cache (default: next-version-cache.json in the git
+directory): the bump of each classified commit by SHA, and the combined
+bump of the range up to the HEAD it was computed for. A later run only
+reads commits since that tip when it is still an ancestor of HEAD. The
+cache is dropped when the last tag is a different tag or points elsewhere,
+and after a history rewrite the range is walked again, reusing the
+classification of commits that kept their SHA.
 """
 
 from __future__ import annotations
 
+import argparse
+import json
+import os
 import re
 import subprocess
+import tempfile
+from collections.abc import Iterable, Iterator
+from itertools import chain
+from pathlib import Path
 
 PATCH_TYPES = ("fix", "perf", "security", "revert")
 SUBJECT_RE = re.compile(r"^(?P<type>[a-z]+)(?:\([^)]*\))?(?P<bang>!)?:")
 
+# Bump levels, lowest first; None means the commit warrants no release.
+BUMPS = ("patch", "minor", "major")
+
+# Hash, subject and body of a commit, separated by US (0x1f); git -z ends
+# each record with a NUL, which commit messages cannot contain.
+LOG_FORMAT = "%H%x1f%s%x1f%b"
+READ_SIZE = 1 << 16
+
 
 def git(*args: str) -> str:
     return subprocess.run(
@@ -26,50 +53,216 @@ def git(*args: str) -> str:
     ).stdout.strip()
 
 
-def main() -> None:
+def iter_commits(log_range: str) -> Iterator[tuple[str, str, str]]:
+    """(sha, subject, body) per commit in log_range, newest first, streamed.
+
+    Closing the iterator early stops git. A failing git log raises
+    CalledProcessError once its output is exhausted.
+    """
+    args = ["git", "log", "-z", f"--format={LOG_FORMAT}", log_range]
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        last_tag = git("describe", "--tags", "--abbrev=0", "--match", "v*")
-    except subprocess.CalledProcessError:
-        print("v1.0.0")
-        return
+        pending = b""
+        for chunk in iter(lambda: proc.stdout.read(READ_SIZE), b""):
+            *records, pending = (pending + chunk).split(b"\0")
+            for record in records:
+                yield parse_record(record)
+        if pending:
+            yield parse_record(pending)
+        stderr = proc.stderr.read()
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, args, stderr=stderr)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.stderr.close()
+        proc.wait()
 
-    log_range = f"{last_tag}..HEAD"
-    subjects = git("log", log_range, "--pretty=%s").splitlines()
-    bodies = git("log", log_range, "--pretty=%b")
 
-    if not subjects:
-        return
+def parse_record(record: bytes) -> tuple[str, str, str]:
+    sha, subject, body = record.decode("utf-8", "replace").split("\x1f", 2)
+    return sha, subject, body
 
+
+def classify(subject: str, body: str) -> str | None:
+    """The bump one commit warrants: "major", "minor", "patch" or None."""
+    if "BREAKING CHANGE" in body:
+        return "major"
     # Promotion squash merges land as "chore: promote develop to main"
     # with the real feat/fix subjects as body bullets — scan those too.
-    subjects += [
+    subjects = [subject] + [
         line.removeprefix("* ").strip()
-        for line in bodies.splitlines()
+        for line in body.splitlines()
         if line.startswith("* ")
     ]
-
-    major = minor = patch = False
-    if "BREAKING CHANGE" in bodies:
-        major = True
-    for subject in subjects:
-        match = SUBJECT_RE.match(subject)
+    bump = None
+    for line in subjects:
+        match = SUBJECT_RE.match(line)
         if not match:
             continue
         if match["bang"]:
-            major = True
-        elif match["type"] == "feat":
-            minor = True
-        elif match["type"] in PATCH_TYPES:
-            patch = True
+            return "major"
+        if match["type"] == "feat":
+            bump = "minor"
+        elif match["type"] in PATCH_TYPES and bump is None:
+            bump = "patch"
+    return bump
+
+
+def combine(bumps: Iterable[str | None]) -> str | None:
+    """The highest bump, consuming bumps only until a major one."""
+    highest = None
+    for bump in bumps:
+        if bump is None:
+            continue
+        if highest is None or BUMPS.index(bump) > BUMPS.index(highest):
+            highest = bump
+        if highest == "major":
+            break
+    return highest
+
+
+def is_ancestor(commit: str, head: str) -> bool:
+    """Whether commit exists and head descends from it."""
+    proc = subprocess.run(
+        ["git", "merge-base", "--is-ancestor", commit, head],
+        capture_output=True,
+        check=False,
+    )
+    return proc.returncode == 0
+
+
+def default_cache_file() -> Path:
+    return Path(git("rev-parse", "--git-common-dir")) / "next-version-cache.json"
+
+
+class BumpCache:
+    """Commit classifications since one tag, persisted between runs.
+
+    "commits" maps each classified SHA to its bump (null for none); "tip" is
+    the HEAD the range tag..tip was last combined for, into "bump". The file
+    is only trusted for the same tag name pointing at the same commit. A
+    missing, corrupt or unwritable cache file only costs speed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path | None, tag: str, tag_sha: str) -> None:
+        self.path = path
+        self.tag = tag
+        self.tag_sha = tag_sha
+        self.tip: str | None = None
+        self.bump: str | None = None
+        self.commits: dict[str, str | None] = {}
+        if path is None:
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if (
+                data.get("version") != self.VERSION
+                or data.get("tag") != tag
+                or data.get("tag_sha") != tag_sha
+            ):
+                return
+            commits = dict(data["commits"])
+            bump = data["bump"]
+            tip = data["tip"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return
+        if bump not in (None, *BUMPS) or not isinstance(tip, str):
+            return
+        self.tip, self.bump, self.commits = tip, bump, commits
+
+    def save(self, tip: str, bump: str | None, commits: dict[str, str | None]) -> None:
+        if self.path is None:
+            return
+        payload = json.dumps(
+            {
+                "version": self.VERSION,
+                "tag": self.tag,
+                "tag_sha": self.tag_sha,
+                "tip": tip,
+                "bump": bump,
+                "commits": commits,
+            }
+        )
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".next-version.")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+
+
+def next_bump(tag: str, cache_file: Path | None = None) -> str | None:
+    """The bump the commits in tag..HEAD warrant, reusing cache_file."""
+    head = git("rev-parse", "HEAD")
+    cache = BumpCache(cache_file, tag, git("rev-parse", f"{tag}^{{commit}}"))
+    if cache.tip == head:
+        return cache.bump
+
+    known = cache.commits
+    if cache.tip is not None and is_ancestor(cache.tip, head):
+        # Only commits since the cached tip are new; the tip's bump stands.
+        start, base, seen = cache.tip, cache.bump, dict(known)
+    else:
+        # First run, or history was rewritten: walk the range again.
+        start, base, seen = tag, None, {}
+
+    def bumps() -> Iterator[str | None]:
+        commits = iter_commits(f"{start}..{head}")
+        try:
+            for sha, subject, body in commits:
+                bump = known[sha] if sha in known else classify(subject, body)
+                seen[sha] = bump
+                yield bump
+        finally:
+            commits.close()
+
+    if base == "major":
+        bump = base
+    else:
+        bump = combine(chain([base], bumps()))
+    # A major bump ends the walk early, but no later commit can undo it,
+    # so it holds for this HEAD either way.
+    cache.save(head, bump, seen)
+    return bump
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cache-file",
+        type=Path,
+        help="Commit classification cache "
+        "(default: next-version-cache.json in the git directory).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Classify every commit, reading and writing no cache.",
+    )
+    args = parser.parse_args()
+
+    try:
+        last_tag = git("describe", "--tags", "--abbrev=0", "--match", "v*")
+    except subprocess.CalledProcessError:
+        print("v1.0.0")
+        return
 
-    if not (major or minor or patch):
+    cache_file = None if args.no_cache else args.cache_file or default_cache_file()
+    bump = next_bump(last_tag, cache_file)
+    if bump is None:
         return
 
     version = last_tag.lstrip("v").split("-")[0]
     major_n, minor_n, patch_n = (int(part) for part in version.split("."))
-    if major:
+    if bump == "major":
         major_n, minor_n, patch_n = major_n + 1, 0, 0
-    elif minor:
+    elif bump == "minor":
         minor_n, patch_n = minor_n + 1, 0
     else:
         patch_n += 1
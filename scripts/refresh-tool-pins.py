@@ -7,143 +7,1466 @@
 The renovate-postprocess workflow runs this after Renovate bumps one of
 their ARGs:
 
-    scripts/refresh-tool-pins.py --sync-hashes
+    scripts/refresh-tool-pins.py --sync-hashes [--jobs N] [--per-host N]
 
-It reads the version already in each Dockerfile and rewrites the matching
-hash. Idempotent; a no-op when the hashes already match.
+The tools are declared in tool-pins.json next to this script: the
+Dockerfile, the ARG holding the version, the variable holding each hash,
+the variable selecting the variant (usually the arch) and the download URL
+template. Each Dockerfile is scanned once for the version ARG and the hash
+assignments, and the matching hashes are rewritten. Downloads run
+concurrently (--jobs overall, --per-host per server); the rewrites are
+applied afterwards in a fixed order. Artifacts land in a download cache
+(--cache-dir), so a rerun at unchanged versions downloads nothing.
+--source redirects downloads to a local mirror directory or an internal
+proxy, falling back through the sources in order:
+
+    scripts/refresh-tool-pins.py --sync-hashes \\
+        --source mirror:/srv/mirror \\
+        --source proxy:https://artifacts.internal/remote \\
+        --source upstream
+
+Idempotent; a no-op when the hashes already match. Each artifact's line
+shows its source, cache use, bytes, time to first byte, throughput and
+retries; --report PATH writes the same per-artifact metrics, plus hashing
+time and per-host totals, as JSON (also when the run fails).
+
+    scripts/refresh-tool-pins.py --verify-all
+
+audits instead of rewriting: it finds every hash pin in the stack
+Dockerfiles (tool hashes, base image digests, checksum-manifest URLs),
+re-verifies them in parallel against the cache, the configured sources or
+the registry, and prints a JSON report. Exit status 1 on any mismatch.
 """
 
 from __future__ import annotations
 
+import argparse
+import contextlib
 import hashlib
+import http.client
+import json
+import os
 import re
+import ssl
 import sys
+import tempfile
+import threading
 import time
+import urllib.error
+import urllib.parse
 import urllib.request
-from dataclasses import dataclass
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, field
+from email.message import Message
 from pathlib import Path
+from typing import BinaryIO
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
-TF_DOCKERFILE = REPO_ROOT / "devcontainers/terraform/Dockerfile"
-LATEX_DOCKERFILE = REPO_ROOT / "devcontainers/latex/Dockerfile"
 
+# Artifacts are hashed as they arrive, never held whole in memory: the AWS
+# CLI zips are tens of MiB per arch and the post-process runner is small.
+CHUNK_SIZE = 1 << 20
+RETRIABLE_STATUSES = (403, 404, 408, 425, 429, 500, 502, 503, 504)
+RETRY_BACKOFF = 2.0
 
-def http_get(url: str, attempts: int = 4) -> bytes:
-    request = urllib.request.Request(url, headers={"User-Agent": "refresh-tool-pins"})
-    # CDNs (GitHub releases, AWS CloudFront) return sporadic 404/5xx at the
-    # edge; retry with backoff so a blip doesn't fail a hash sync.
-    for attempt in range(1, attempts + 1):
+
+def body_chunks(response: http.client.HTTPResponse) -> Iterator[bytes]:
+    # read(amt) reports a connection dropped mid-body as a clean EOF, so
+    # hold the response to its Content-Length or a torn download would
+    # hash as if it were complete.
+    expected = response.headers.get("Content-Length")
+    received = 0
+    for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+        received += len(chunk)
+        yield chunk
+    if expected is not None and received < int(expected):
+        raise http.client.IncompleteRead(b"", int(expected) - received)
+
+
+class NotModified(Exception):
+    """The server answered a conditional GET with 304."""
+
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by every download in a run.
+
+    Idle connections are parked per (scheme, host), so the second github.com
+    artifact, and every redirect hop to the release CDN, reuses an open
+    socket and TLS session instead of handshaking again. opened/reused count
+    what the pool did, for the run summary.
+    """
+
+    def __init__(self) -> None:
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._tls = ssl.create_default_context()
+        self.opened = 0
+        self.reused = 0
+
+    @staticmethod
+    def handles(url: str) -> bool:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        # Leave proxied hosts to urllib, which knows how to tunnel.
+        proxies = urllib.request.getproxies()
+        return parts.scheme not in proxies or bool(
+            urllib.request.proxy_bypass(parts.hostname or "")
+        )
+
+    def _connect(
+        self, key: tuple[str, str], timeout: float
+    ) -> http.client.HTTPConnection:
+        scheme, netloc = key
+        with self._lock:
+            self.opened += 1
+        if scheme == "https":
+            return http.client.HTTPSConnection(
+                netloc, timeout=timeout, context=self._tls
+            )
+        return http.client.HTTPConnection(netloc, timeout=timeout)
+
+    def _send(
+        self, key: tuple[str, str], target: str, headers: dict[str, str], timeout: float
+    ) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", target, headers=headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed it while it sat idle; open a fresh one.
+                conn.close()
+            else:
+                with self._lock:
+                    self.reused += 1
+                return conn, response
+        conn = self._connect(key, timeout)
         try:
-            with urllib.request.urlopen(request, timeout=120) as response:
-                return response.read()
-        except (urllib.error.HTTPError, urllib.error.URLError) as error:
-            status = getattr(error, "code", None)
-            retriable = (
-                status in (403, 404, 408, 425, 429, 500, 502, 503, 504)
-                or status is None
+            conn.request("GET", target, headers=headers)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def _release(
+        self,
+        key: tuple[str, str],
+        conn: http.client.HTTPConnection,
+        response: http.client.HTTPResponse,
+    ) -> None:
+        if response.will_close or not response.isclosed():
+            conn.close()
+            return
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    @contextmanager
+    def open(
+        self, url: str, headers: dict[str, str], timeout: float
+    ) -> Iterator[http.client.HTTPResponse]:
+        """GET url, following redirects, and yield the final 2xx response.
+
+        Other statuses raise urllib.error.HTTPError, as urlopen would.
+        """
+        for _hop in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            target = parts.path or "/"
+            if parts.query:
+                target += f"?{parts.query}"
+            conn, response = self._send(key, target, headers, timeout)
+            if 200 <= response.status < 300:
+                try:
+                    yield response
+                except BaseException:
+                    conn.close()
+                    raise
+                self._release(key, conn, response)
+                return
+            # Drain the (small) body so the connection can go back idle.
+            response.read()
+            self._release(key, conn, response)
+            location = response.headers.get("Location")
+            if response.status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            raise urllib.error.HTTPError(
+                url, response.status, response.reason, response.headers, None
             )
-            if attempt == attempts or not retriable:
-                raise
-            print(f"  retry {attempt}/{attempts} ({status or error}) {url}")
-            time.sleep(2 * attempt)
-    raise RuntimeError("unreachable")
+        raise urllib.error.HTTPError(url, 310, "Too many redirects", Message(), None)
 
 
-def sha256_of(url: str) -> str:
-    digest = hashlib.sha256()
-    digest.update(http_get(url))
-    return digest.hexdigest()
+POOL = ConnectionPool()
+
+
+def open_url(
+    url: str, headers: dict[str, str], timeout: float
+) -> AbstractContextManager[http.client.HTTPResponse]:
+    if POOL.handles(url):
+        return POOL.open(url, headers, timeout)
+    request = urllib.request.Request(url, headers=headers)
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+@dataclass
+class Download:
+    sha256: str
+    size: int
+    etag: str | None
+    last_modified: str | None
+    # Where the body was spooled, when it was kept for the cache.
+    spool: Path | None = None
 
 
 @dataclass
+class Transfer:
+    """What fetching one artifact cost, for the run report."""
+
+    url: str
+    source: str | None = None
+    cache: str = "miss"  # "hit" | "revalidated" | "miss"
+    # Body bytes received over the network, failed attempts included.
+    bytes: int = 0
+    resumed_from: int = 0
+    ttfb: float | None = None
+    # Time inside http_get, retries and backoff included.
+    seconds: float = 0.0
+    hash_seconds: float = 0.0
+    failures: list[dict] = field(default_factory=list)
+
+    def as_report(self) -> dict:
+        throughput = self.bytes / self.seconds if self.seconds else None
+        return {
+            "url": self.url,
+            "source": self.source,
+            "cache": self.cache,
+            "bytes": self.bytes,
+            "resumed_from": self.resumed_from,
+            "ttfb": None if self.ttfb is None else round(self.ttfb, 4),
+            "seconds": round(self.seconds, 4),
+            "bytes_per_second": None if throughput is None else round(throughput),
+            "hash_seconds": round(self.hash_seconds, 4),
+            "retries": len(self.failures),
+            "failures": self.failures,
+        }
+
+
+class Spool:
+    """Running SHA-256 of one download and, given a directory, its bytes.
+
+    The hash state survives a failed attempt, so the next one asks only for
+    the missing tail with a Range request. A spool file left behind by an
+    interrupted run is re-hashed from disk and resumed the same way; its
+    .json sidecar keeps the validator that makes If-Range safe.
+    """
+
+    def __init__(self, url: str, spool_dir: Path | None) -> None:
+        self.url = url
+        self.path: Path | None = None
+        self._meta: Path | None = None
+        self._fh: BinaryIO | None = None
+        self.hash_seconds = 0.0
+        if spool_dir is not None:
+            name = hashlib.sha256(url.encode()).hexdigest()[:32]
+            self.path = spool_dir / f"{name}.part"
+            self._meta = spool_dir / f"{name}.json"
+        if not self._resume_leftover():
+            self.restart()
+
+    def restart(self) -> None:
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.validator: str | None = None
+        self.headers = Message()
+        if self.path is not None:
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = self.path.open("wb")
+
+    def _resume_leftover(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            meta = json.loads(self._meta.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return False
+        if meta.get("url") != self.url or not meta.get("validator"):
+            return False
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.headers = Message()
+        with self.path.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                self._update(chunk)
+        self.validator = meta["validator"]
+        self._fh = self.path.open("ab")
+        return True
+
+    def range_headers(self) -> dict[str, str]:
+        if not self.size:
+            return {}
+        headers = {"Range": f"bytes={self.size}-"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        return headers
+
+    def accept(self, response: http.client.HTTPResponse) -> None:
+        """Line the spool up with response before its body is read."""
+        if self.size and getattr(response, "status", None) == 206:
+            content_range = response.headers.get("Content-Range", "")
+            match = re.match(r"bytes (\d+)-", content_range)
+            if match and int(match.group(1)) == self.size:
+                self.headers = response.headers
+                return
+            self.restart()
+            raise http.client.HTTPException(f"bad Content-Range {content_range!r}")
+        if self.size:
+            # The server ignored Range (or If-Range failed): start over.
+            self.restart()
+        self.headers = response.headers
+        self.validator = response.headers.get("ETag") or response.headers.get(
+            "Last-Modified"
+        )
+
+    def _update(self, chunk: bytes) -> None:
+        started = time.perf_counter()
+        self.digest.update(chunk)
+        self.hash_seconds += time.perf_counter() - started
+        self.size += len(chunk)
+
+    def write(self, chunk: bytes) -> None:
+        self._update(chunk)
+        if self._fh is not None:
+            self._fh.write(chunk)
+
+    def finish(self) -> Download:
+        self._close()
+        if self._meta is not None:
+            self._meta.unlink(missing_ok=True)
+        return Download(
+            sha256=self.digest.hexdigest(),
+            size=self.size,
+            etag=self.headers.get("ETag"),
+            last_modified=self.headers.get("Last-Modified"),
+            spool=self.path,
+        )
+
+    def abandon(self) -> None:
+        """Give up for this run, keeping the bytes if a later run can resume."""
+        self._close()
+        if self.path is None:
+            return
+        if self.size and self.validator:
+            payload = {"url": self.url, "validator": self.validator}
+            self._meta.write_text(json.dumps(payload), encoding="utf-8")
+            return
+        self._meta.unlink(missing_ok=True)
+        self.path.unlink(missing_ok=True)
+
+    def _close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def http_get(
+    url: str,
+    spool: Spool,
+    attempts: int = 4,
+    headers: dict[str, str] | None = None,
+    timeout: float = 120,
+    transfer: Transfer | None = None,
+) -> Download:
+    """Stream url's body through spool in CHUNK_SIZE pieces.
+
+    A failure part-way through resumes with a Range request from the last
+    byte received; servers that ignore Range get a clean full re-fetch.
+    Raises NotModified when conditional headers let the server answer 304.
+    Timings, byte counts and failed attempts are added to transfer.
+    """
+    transfer = transfer or Transfer(url)
+    started = time.monotonic()
+    hashed_before = spool.hash_seconds
+    base_headers = {"User-Agent": "refresh-tool-pins", **(headers or {})}
+    # CDNs (GitHub releases, AWS CloudFront) return sporadic 404/5xx at the
+    # edge, or drop the connection mid-body; retry with backoff so a blip
+    # doesn't fail a hash sync.
+    try:
+        for attempt in range(1, attempts + 1):
+            request_headers = base_headers
+            if spool.size:
+                # Validators asked "has it changed?"; a resume asks If-Range.
+                request_headers = {
+                    key: value
+                    for key, value in base_headers.items()
+                    if key not in ("If-None-Match", "If-Modified-Since")
+                }
+                request_headers.update(spool.range_headers())
+            sent = time.monotonic()
+            try:
+                with open_url(url, request_headers, timeout) as response:
+                    transfer.ttfb = time.monotonic() - sent
+                    spool.accept(response)
+                    transfer.resumed_from = spool.size
+                    for chunk in body_chunks(response):
+                        spool.write(chunk)
+                        transfer.bytes += len(chunk)
+                    return spool.finish()
+            except (OSError, http.client.HTTPException) as error:
+                status = getattr(error, "code", None)
+                if status == 304:
+                    raise NotModified(url) from None
+                transfer.failures.append(
+                    {
+                        "source": transfer.source,
+                        "attempt": attempt,
+                        "status": status,
+                        "error": str(error),
+                    }
+                )
+                if status == 416:
+                    spool.restart()
+                retriable = status in RETRIABLE_STATUSES or status in (None, 416)
+                if attempt == attempts or not retriable:
+                    raise
+                resume = f", resuming at {spool.size} bytes" if spool.size else ""
+                print(f"  retry {attempt}/{attempts} ({status or error}{resume}) {url}")
+                time.sleep(RETRY_BACKOFF * attempt)
+        raise RuntimeError("unreachable")
+    except BaseException:
+        spool.abandon()
+        raise
+    finally:
+        transfer.seconds += time.monotonic() - started
+        transfer.hash_seconds += spool.hash_seconds - hashed_before
+
+
+def sha256_of(url: str) -> str:
+    return http_get(url, Spool(url, None)).sha256
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "refresh-tool-pins"
+
+
+class DownloadCache:
+    """Content-addressed artifact cache keyed by URL and resolved version.
+
+    index.json records the digest, size, ETag and Last-Modified of every
+    artifact; blobs/<sha256> keeps its bytes. Entries younger than ttl are
+    trusted without touching the network, older ones are revalidated with a
+    conditional GET. save() evicts least-recently-used entries until the
+    blobs fit in max_bytes.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl: float) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.blobs = root / "blobs"
+        self.spool = root / "tmp"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.spool.mkdir(parents=True, exist_ok=True)
+        self._index_path = root / "index.json"
+        self._lock = threading.Lock()
+        try:
+            self._entries: dict[str, dict] = json.loads(
+                self._index_path.read_text(encoding="utf-8")
+            )["entries"]
+        except (FileNotFoundError, ValueError, KeyError):
+            self._entries = {}
+
+    @staticmethod
+    def key(url: str, version: str) -> str:
+        return f"{version} {url}"
+
+    def lookup(self, url: str, version: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(self.key(url, version))
+        if entry is None or not self.blob_path(entry["sha256"]).exists():
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["validated_at"] < self.ttl
+
+    def touch(self, url: str, version: str, *, revalidated: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries[self.key(url, version)]
+            entry["used_at"] = now
+            if revalidated:
+                entry["validated_at"] = now
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs / digest
+
+    def store(self, url: str, version: str, download: Download, source: str) -> None:
+        if download.spool is not None:
+            os.replace(download.spool, self.blob_path(download.sha256))
+        now = time.time()
+        with self._lock:
+            self._entries[self.key(url, version)] = {
+                "url": url,
+                "version": version,
+                "sha256": download.sha256,
+                "size": download.size,
+                "etag": download.etag,
+                "last_modified": download.last_modified,
+                "source": source,
+                "validated_at": now,
+                "used_at": now,
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            self._evict()
+            payload = json.dumps({"entries": self._entries}, indent=2, sort_keys=True)
+            atomic_write_text(self._index_path, payload + "\n")
+
+    def _evict(self) -> None:
+        total = sum(entry["size"] for entry in self._entries.values())
+        by_age = sorted(self._entries.items(), key=lambda item: item[1]["used_at"])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            del self._entries[key]
+            total -= entry["size"]
+        live = {entry["sha256"] for entry in self._entries.values()}
+        for blob in self.blobs.iterdir():
+            if blob.name not in live:
+                blob.unlink(missing_ok=True)
+
+
+@dataclass(frozen=True)
+class Source:
+    """Somewhere an upstream artifact URL can be fetched from.
+
+    upstream            the URL itself
+    mirror:<dir>        <dir>/<host>/<path>, read from disk
+    proxy:<base-url>    <base-url>/<host>/<path>, e.g. an internal
+                        Artifactory/Nexus remote repository
+    """
+
+    kind: str
+    location: str = ""
+
+    @classmethod
+    def parse(cls, spec: str) -> Source:
+        kind, _, location = spec.partition(":")
+        if kind == "upstream" and not location:
+            return cls(kind)
+        if kind == "mirror" and location:
+            return cls(kind, str(Path(location).expanduser().resolve()))
+        if kind == "proxy" and location.startswith(("http://", "https://")):
+            return cls(kind, location.rstrip("/"))
+        raise argparse.ArgumentTypeError(
+            f"invalid source {spec!r} (want upstream, mirror:<dir> or proxy:<url>)"
+        )
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.location}" if self.location else self.kind
+
+    def locate(self, url: str) -> str | None:
+        """Map an upstream URL into this source, or None if it can't serve it."""
+        if self.kind == "upstream":
+            return url
+        parts = urllib.parse.urlsplit(url)
+        if self.kind == "proxy":
+            return f"{self.location}/{parts.netloc}{parts.path}"
+        path = Path(self.location, parts.netloc, urllib.parse.unquote(parts.path[1:]))
+        # A mirror miss costs one stat, not a request: fall through at once.
+        return path.as_uri() if path.is_file() else None
+
+    @property
+    def attempts(self) -> int:
+        # Only upstream gets the CDN retry budget; a flaky mirror or proxy
+        # should hand over to the next source quickly.
+        return 4 if self.kind == "upstream" else 1
+
+    @property
+    def timeout(self) -> float:
+        return 120 if self.kind == "upstream" else 15
+
+
+UPSTREAM = Source("upstream")
+
+
+@dataclass(frozen=True)
+class Fetched:
+    sha256: str
+    # Which Source served the bytes, or "cache" when none was contacted.
+    source: str
+    transfer: Transfer
+
+
+def fetch_digest(
+    url: str,
+    version: str,
+    cache: DownloadCache | None,
+    sources: list[Source],
+    limiter: HostLimiter,
+    transfer: Transfer | None = None,
+) -> Fetched:
+    transfer = transfer or Transfer(url)
+    entry = cache.lookup(url, version) if cache else None
+    if cache and entry and cache.is_fresh(entry):
+        print(f"cached  {url}")
+        cache.touch(url, version)
+        transfer.source, transfer.cache = "cache", "hit"
+        return Fetched(entry["sha256"], "cache", transfer)
+    last_error: Exception | None = None
+    for source in sources:
+        located = source.locate(url)
+        if located is None:
+            continue
+        conditional = {}
+        # Validators are only meaningful to the source that issued them.
+        if entry and entry.get("source") == str(source):
+            if entry.get("etag"):
+                conditional["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                conditional["If-Modified-Since"] = entry["last_modified"]
+        print(f"hashing {located}")
+        transfer.source = str(source)
+        try:
+            with limiter(located):
+                download = http_get(
+                    located,
+                    Spool(located, cache.spool if cache else None),
+                    attempts=source.attempts,
+                    headers=conditional,
+                    timeout=source.timeout,
+                    transfer=transfer,
+                )
+        except NotModified:
+            print(f"  unchanged at {source}, reusing cached hash {url}")
+            cache.touch(url, version, revalidated=True)
+            transfer.cache = "revalidated"
+            return Fetched(entry["sha256"], "cache", transfer)
+        except (OSError, http.client.HTTPException) as error:
+            print(f"  {source} failed ({error}); trying next source")
+            last_error = error
+            continue
+        if cache:
+            cache.store(url, version, download, str(source))
+        return Fetched(download.sha256, str(source), transfer)
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError(f"no source could serve {url}")
+
+
+TOOLS_FILE = Path(__file__).with_name("tool-pins.json")
+TOOL_FIELDS = ("name", "dockerfile", "version_arg", "hash_var", "selector", "url")
+VAR_NAME_RE = re.compile(r"[A-Z][A-Z0-9_]*")
+# One pass over a Dockerfile finds every ARG default and every quoted
+# VAR="value" assignment, in file order, whatever the line continuations.
+ASSIGNMENT_RE = re.compile(
+    r'^[ \t]*ARG[ \t]+(?P<arg>[A-Z][A-Z0-9_]*)="?(?P<default>[^"\s]*)'
+    r'|(?<![\w$])(?P<var>[A-Z][A-Z0-9_]*)="(?P<value>[^"]*)"',
+    re.MULTILINE,
+)
+SHA256_RE = re.compile(r"[a-f0-9]{64}")
+
+
+@dataclass(frozen=True)
 class Tool:
+    """One checksum-less tool: where its version and per-arch hashes live.
+
+    Each hash is an assignment ``hash_var="<sha256>"`` preceded in the same
+    Dockerfile by ``selector="<variant>"``; the download URL is url with
+    {version} and {variant} filled in.
+    """
+
     name: str
-    version_pattern: tuple[Path, str]
-    # (file, regex whose group 1 is everything up to the hash, url template)
-    hash_patterns: list[tuple[Path, str, str]]
-
-
-TOOLS: list[Tool] = [
-    Tool(
-        name="age",
-        version_pattern=(TF_DOCKERFILE, r"ARG AGE_VERSION=([0-9.]+)"),
-        hash_patterns=[
-            (
-                TF_DOCKERFILE,
-                r'(ARCH="amd64"; AGE_SHA256=")([a-f0-9]{64})',
-                "https://github.com/FiloSottile/age/releases/download/v{v}/age-v{v}-linux-amd64.tar.gz",
-            ),
-            (
-                TF_DOCKERFILE,
-                r'(ARCH="arm64"; AGE_SHA256=")([a-f0-9]{64})',
-                "https://github.com/FiloSottile/age/releases/download/v{v}/age-v{v}-linux-arm64.tar.gz",
-            ),
-        ],
-    ),
-    Tool(
-        name="tectonic",
-        version_pattern=(LATEX_DOCKERFILE, r"ARG TECTONIC_VERSION=([0-9.]+)"),
-        hash_patterns=[
-            (
-                LATEX_DOCKERFILE,
-                r'(TECTONIC_ARCH="x86_64-unknown-linux-musl"; \\\n\s*TECTONIC_SHA256=")([a-f0-9]{64})',
-                "https://github.com/tectonic-typesetting/tectonic/releases/download/tectonic%40{v}/tectonic-{v}-x86_64-unknown-linux-musl.tar.gz",
-            ),
-            (
-                LATEX_DOCKERFILE,
-                r'(TECTONIC_ARCH="aarch64-unknown-linux-musl"; \\\n\s*TECTONIC_SHA256=")([a-f0-9]{64})',
-                "https://github.com/tectonic-typesetting/tectonic/releases/download/tectonic%40{v}/tectonic-{v}-aarch64-unknown-linux-musl.tar.gz",
-            ),
-        ],
-    ),
-    Tool(
-        name="aws-cli",
-        version_pattern=(TF_DOCKERFILE, r"ARG AWS_CLI_VERSION=([0-9.]+)"),
-        hash_patterns=[
-            (
-                TF_DOCKERFILE,
-                r'(AWS_ARCH="x86_64"; AWS_SHA256=")([a-f0-9]{64})',
-                "https://awscli.amazonaws.com/awscli-exe-linux-x86_64-{v}.zip",
-            ),
-            (
-                TF_DOCKERFILE,
-                r'(AWS_ARCH="aarch64"; AWS_SHA256=")([a-f0-9]{64})',
-                "https://awscli.amazonaws.com/awscli-exe-linux-aarch64-{v}.zip",
-            ),
-        ],
-    ),
-]
-
-
-def current_version(tool: Tool) -> str:
-    path, pattern = tool.version_pattern
-    match = re.search(pattern, path.read_text())
-    if not match:
-        raise RuntimeError(f"{tool.name}: version pattern not found in {path}")
-    return match.group(1)
-
-
-def sync_hashes() -> int:
-    for tool in TOOLS:
+    path: Path
+    version_arg: str
+    hash_var: str
+    selector: str
+    url: str
+    variants: tuple[str, ...]
+
+
+def load_tools(path: Path = TOOLS_FILE) -> list[Tool]:
+    """Read and validate the tool registry.
+
+    Raises TypeError when the registry or an entry is not the JSON type it
+    should be, and ValueError for any other bad entry.
+    """
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8"))["tools"]
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        raise ValueError(f"{path}: cannot read tool registry ({error})") from error
+    if not isinstance(entries, list):
+        raise TypeError(f"{path}: 'tools' must be a list")
+
+    tools: list[Tool] = []
+    seen: set[tuple[Path, str]] = set()
+    for index, entry in enumerate(entries):
+        where = f"{path.name}: tools[{index}]"
+        if not isinstance(entry, dict):
+            raise TypeError(f"{where}: must be an object")
+        for key in TOOL_FIELDS:
+            if not isinstance(entry.get(key), str) or not entry[key]:
+                raise ValueError(f"{where}: '{key}' must be a non-empty string")
+        for key in ("version_arg", "hash_var", "selector"):
+            if not VAR_NAME_RE.fullmatch(entry[key]):
+                raise ValueError(f"{where}: '{key}' is not a variable name")
+        variants = entry.get("variants")
+        if (
+            not isinstance(variants, list)
+            or not variants
+            or not all(isinstance(v, str) and v for v in variants)
+            or len(set(variants)) != len(variants)
+        ):
+            raise ValueError(f"{where}: 'variants' must list distinct strings")
         try:
-            version = current_version(tool)
+            entry["url"].format(version="", variant="")
+        except (KeyError, IndexError, ValueError) as error:
+            raise ValueError(f"{where}: bad url template ({error})") from error
+        if "{variant}" not in entry["url"]:
+            raise ValueError(f"{where}: url must contain {{variant}}")
+        dockerfile = REPO_ROOT / entry["dockerfile"]
+        if (dockerfile, entry["hash_var"]) in seen:
+            raise ValueError(
+                f"{where}: {entry['hash_var']} already claimed in {entry['dockerfile']}"
+            )
+        seen.add((dockerfile, entry["hash_var"]))
+        tools.append(
+            Tool(
+                name=entry["name"],
+                path=dockerfile,
+                version_arg=entry["version_arg"],
+                hash_var=entry["hash_var"],
+                selector=entry["selector"],
+                url=entry["url"],
+                variants=tuple(variants),
+            )
+        )
+    return tools
+
+
+TOOLS: list[Tool] = load_tools()
+
+
+@dataclass(frozen=True)
+class HashSite:
+    """A ``*_SHA256="<hex>"`` assignment and the selectors in effect there."""
+
+    var: str
+    digest: str
+    start: int
+    end: int
+    # Most recent value of every variable assigned before this point.
+    context: dict[str, str]
+
+
+@dataclass
+class Scan:
+    args: dict[str, str]
+    hashes: list[HashSite]
+
+
+def scan_dockerfile(text: str) -> Scan:
+    """Collect ARG defaults and hash assignments in a single pass."""
+    args: dict[str, str] = {}
+    latest: dict[str, str] = {}
+    hashes: list[HashSite] = []
+    for match in ASSIGNMENT_RE.finditer(text):
+        if match["arg"]:
+            # The first default wins; later bare re-declarations inherit it.
+            args.setdefault(match["arg"], match["default"])
+            continue
+        name, value = match["var"], match["value"]
+        if name.endswith("_SHA256") and SHA256_RE.fullmatch(value):
+            hashes.append(
+                HashSite(
+                    name, value, match.start("value"), match.end("value"), latest.copy()
+                )
+            )
+        latest[name] = value
+    return Scan(args, hashes)
+
+
+def current_version(tool: Tool, scan: Scan) -> str:
+    version = scan.args.get(tool.version_arg)
+    if not version:
+        raise RuntimeError(
+            f"{tool.name}: ARG {tool.version_arg} has no default in {tool.path}"
+        )
+    return version
+
+
+@dataclass(frozen=True)
+class Artifact:
+    tool: str
+    version: str
+    path: Path
+    hash_var: str
+    selector: str
+    variant: str
+    url: str
+
+    def matches(self, site: HashSite) -> bool:
+        return (
+            site.var == self.hash_var
+            and site.context.get(self.selector) == self.variant
+        )
+
+
+def tool_artifacts(tool: Tool, scan: Scan) -> list[Artifact]:
+    version = current_version(tool, scan)
+    return [
+        Artifact(
+            tool.name,
+            version,
+            tool.path,
+            tool.hash_var,
+            tool.selector,
+            variant,
+            tool.url.format(version=version, variant=variant),
+        )
+        for variant in tool.variants
+    ]
+
+
+def plan_artifacts(tools: list[Tool]) -> list[Artifact]:
+    scans: dict[Path, Scan] = {}
+    artifacts = []
+    for tool in tools:
+        try:
+            if tool.path not in scans:
+                scans[tool.path] = scan_dockerfile(tool.path.read_text())
+            artifacts.extend(tool_artifacts(tool, scans[tool.path]))
         except Exception as error:  # noqa: BLE001 - report and continue
             print(f"{tool.name}: SKIPPED ({error})")
+    return artifacts
+
+
+class HostLimiter:
+    """Cap in-flight downloads per host on top of the pool's global cap."""
+
+    def __init__(self, per_host: int) -> None:
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.Semaphore] = {}
+
+    def __call__(self, url: str) -> threading.Semaphore:
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch_digests(
+    artifacts: list[Artifact],
+    jobs: int,
+    per_host: int,
+    cache: DownloadCache | None = None,
+    sources: list[Source] | None = None,
+    transfers: dict[str, Transfer] | None = None,
+) -> dict[str, Fetched]:
+    """Hash every distinct artifact URL concurrently.
+
+    A full sync then costs roughly its slowest download, not the sum of all.
+    transfers, when given, is filled with one Transfer per URL up front, so
+    the metrics of a run that fails part-way are still available.
+    """
+    limiter = HostLimiter(per_host)
+    sources = sources or [UPSTREAM]
+    unique = {artifact.url: artifact for artifact in artifacts}
+    if transfers is None:
+        transfers = {}
+    for url in unique:
+        transfers[url] = Transfer(url)
+
+    def fetch(artifact: Artifact) -> Fetched:
+        return fetch_digest(
+            artifact.url,
+            artifact.version,
+            cache,
+            sources,
+            limiter,
+            transfers[artifact.url],
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {url: pool.submit(fetch, item) for url, item in unique.items()}
+        try:
+            return {url: future.result() for url, future in futures.items()}
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+        finally:
+            if cache:
+                cache.save()
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Replace path in one rename so an interrupted run never leaves it torn."""
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        if path.exists():
+            os.chmod(name, path.stat().st_mode & 0o7777)
+        os.replace(name, path)
+    except BaseException:
+        Path(name).unlink(missing_ok=True)
+        raise
+
+
+def display_path(path: Path) -> str:
+    try:
+        return str(path.relative_to(REPO_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def rewrite_pins(artifacts: list[Artifact], digests: dict[str, str]) -> list[str]:
+    """Apply every new hash, one read and one atomic write per file.
+
+    Each file is scanned once and rewritten in memory first, so a missing
+    hash aborts the run before anything on disk changes. Returns one line
+    per changed pin.
+    """
+    by_file: dict[Path, list[Artifact]] = {}
+    for artifact in artifacts:
+        by_file.setdefault(artifact.path, []).append(artifact)
+
+    changes: list[str] = []
+    rewritten: dict[Path, str] = {}
+    for path, items in by_file.items():
+        original = path.read_text()
+        sites = scan_dockerfile(original).hashes
+        edits: list[tuple[HashSite, str]] = []
+        for artifact in items:
+            new = digests[artifact.url]
+            matched = [site for site in sites if artifact.matches(site)]
+            if not matched:
+                raise RuntimeError(
+                    f"{artifact.tool}: no {artifact.hash_var} after "
+                    f'{artifact.selector}="{artifact.variant}" in {path}'
+                )
+            for site in matched:
+                edits.append((site, new))
+                if site.digest != new:
+                    changes.append(
+                        f"{artifact.tool} {artifact.version} ({display_path(path)}): "
+                        f"{site.digest[:12]}... -> {new[:12]}... [{artifact.url}]"
+                    )
+        # Splice back to front so earlier offsets stay valid.
+        text = original
+        for site, new in sorted(edits, key=lambda edit: edit[0].start, reverse=True):
+            text = text[: site.start] + new + text[site.end :]
+        if text != original:
+            rewritten[path] = text
+
+    for path, text in rewritten.items():
+        atomic_write_text(path, text)
+    return changes
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def describe_transfer(transfer: Transfer) -> str:
+    if transfer.cache == "hit":
+        return f"{'cache':<10} hit"
+    line = f"{transfer.source or '-':<10} {transfer.cache:<11}"
+    line += f" {format_bytes(transfer.bytes):>10}"
+    if transfer.ttfb is not None:
+        line += f"  ttfb {transfer.ttfb:.2f}s"
+    if transfer.seconds and transfer.bytes:
+        line += f"  {format_bytes(transfer.bytes / transfer.seconds)}/s"
+    if transfer.failures:
+        statuses = ",".join(str(f["status"] or "error") for f in transfer.failures)
+        line += f"  retries {len(transfer.failures)} ({statuses})"
+    return line
+
+
+def run_report(
+    artifacts: list[Artifact],
+    transfers: dict[str, Transfer],
+    started: float,
+    options: dict,
+    changes: list[str] | None,
+    error: BaseException | None,
+) -> dict:
+    """Everything a slow or failed sync needs explaining, as one document."""
+    rows = []
+    hosts: dict[str, dict] = {}
+    for artifact in artifacts:
+        transfer = transfers.get(artifact.url)
+        if transfer is None:
             continue
-        for path, pattern, url_template in tool.hash_patterns:
-            url = url_template.format(v=version)
-            print(f"{tool.name}: hashing {url}")
-            digest = sha256_of(url)
-            text = path.read_text()
-            updated, count = re.subn(pattern, rf"\g<1>{digest}", text)
-            if count == 0:
-                raise RuntimeError(f"{tool.name}: hash pattern missing in {path}")
-            path.write_text(updated)
+        rows.append(
+            {
+                "tool": artifact.tool,
+                "version": artifact.version,
+                "variant": artifact.variant,
+                "file": display_path(artifact.path),
+                **transfer.as_report(),
+            }
+        )
+    for transfer in transfers.values():
+        host = urllib.parse.urlsplit(transfer.url).netloc
+        totals = hosts.setdefault(
+            host, {"artifacts": 0, "bytes": 0, "seconds": 0.0, "retries": 0}
+        )
+        totals["artifacts"] += 1
+        totals["bytes"] += transfer.bytes
+        totals["seconds"] = round(totals["seconds"] + transfer.seconds, 4)
+        totals["retries"] += len(transfer.failures)
+    cache_counts: dict[str, int] = {}
+    for transfer in transfers.values():
+        cache_counts[transfer.cache] = cache_counts.get(transfer.cache, 0) + 1
+    return {
+        "ok": error is None,
+        "error": None if error is None else str(error) or type(error).__name__,
+        "seconds": round(time.monotonic() - started, 4),
+        **options,
+        "connections": {"opened": POOL.opened, "reused": POOL.reused},
+        "cache": cache_counts,
+        "bytes": sum(transfer.bytes for transfer in transfers.values()),
+        "hosts": hosts,
+        "changes": changes,
+        "artifacts": rows,
+    }
+
+
+def sync_hashes(
+    jobs: int = 6,
+    per_host: int = 4,
+    cache: DownloadCache | None = None,
+    sources: list[Source] | None = None,
+    report: Path | None = None,
+) -> int:
+    started = time.monotonic()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    artifacts = plan_artifacts(TOOLS)
+    transfers: dict[str, Transfer] = {}
+    changes: list[str] | None = None
+    error: BaseException | None = None
+    try:
+        fetched = fetch_digests(artifacts, jobs, per_host, cache, sources, transfers)
+        print("Sources:")
+        for url, result in fetched.items():
+            print(f"  {describe_transfer(result.transfer)}  {url}")
+        # Rewrites happen only once every download has succeeded, in registry
+        # order, so the result never depends on which download finished first.
+        digests = {url: result.sha256 for url, result in fetched.items()}
+        changes = rewrite_pins(artifacts, digests)
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        if report is not None:
+            options = {
+                "started": started_at,
+                "jobs": jobs,
+                "per_host": per_host,
+                "sources": [str(source) for source in sources or [UPSTREAM]],
+            }
+            document = run_report(
+                artifacts, transfers, started, options, changes, error
+            )
+            atomic_write_text(report, json.dumps(document, indent=2) + "\n")
+    if changes:
+        print(f"Updated {len(changes)} pin(s):")
+        for line in changes:
+            print(f"  {line}")
+    else:
+        print("All pinned hashes already match.")
+    print(f"Connections: {POOL.opened} opened, {POOL.reused} reused")
+    if report is not None:
+        print(f"Report: {report}")
     return 0
 
 
+STACKS_ROOT = REPO_ROOT / "devcontainers"
+IMAGE_PIN_RE = re.compile(
+    r"(?P<ref>[\w.\-/${}]+(?::[\w.\-/${}]+)*)@sha256:(?P<digest>[a-f0-9]{64})"
+)
+MANIFEST_URL_RE = re.compile(
+    r'https?://[^"\s]+?(?:SHA256SUMS|checksums\.txt|\.sha256)(?=["\s])'
+)
+VAR_REF_RE = re.compile(r"\$\{(?P<name>[A-Z][A-Z0-9_]*)\}")
+MANIFEST_MEDIA_TYPES = (
+    "application/vnd.oci.image.index.v1+json, "
+    "application/vnd.oci.image.manifest.v1+json, "
+    "application/vnd.docker.distribution.manifest.list.v2+json, "
+    "application/vnd.docker.distribution.manifest.v2+json"
+)
+
+
+@dataclass
+class Pin:
+    """One integrity pin found in a stack Dockerfile, and its audit result."""
+
+    kind: str  # "artifact" | "image" | "manifest"
+    path: Path
+    line: int
+    name: str
+    pinned: str | None
+    url: str | None = None
+    version: str = ""
+    status: str = "pending"
+    actual: str | None = None
+    source: str | None = None
+    seconds: float = 0.0
+    detail: str = ""
+
+    def as_report(self) -> dict:
+        return {
+            "kind": self.kind,
+            "file": display_path(self.path),
+            "line": self.line,
+            "name": self.name,
+            "pinned": self.pinned,
+            "actual": self.actual,
+            "url": self.url,
+            "status": self.status,
+            "source": self.source,
+            "seconds": round(self.seconds, 4),
+            "detail": self.detail,
+        }
+
+
+def line_of(text: str, offset: int) -> int:
+    return text.count("\n", 0, offset) + 1
+
+
+def expand_args(value: str, args: dict[str, str]) -> str:
+    return VAR_REF_RE.sub(lambda m: args.get(m["name"], m[0]), value)
+
+
+def discover_pins(dockerfiles: list[Path], tools: list[Tool]) -> list[Pin]:
+    """Find every hash pin in dockerfiles with one scan per file.
+
+    Hashes of known tools are tied to their download URL through tools;
+    image digests are tied to their registry manifest; curl'd checksum
+    manifests (SHA256SUMS and friends) are listed so their reachability at
+    the pinned version is checked too. Unknown *_SHA256 values are reported
+    so nothing pinned goes unaudited silently.
+    """
+    by_file: dict[Path, list[Tool]] = {}
+    for tool in tools:
+        by_file.setdefault(tool.path, []).append(tool)
+
+    pins: list[Pin] = []
+    for path in dockerfiles:
+        text = path.read_text()
+        scan = scan_dockerfile(text)
+        known: list[Artifact] = []
+        for tool in by_file.get(path, []):
+            try:
+                known.extend(tool_artifacts(tool, scan))
+            except RuntimeError as error:
+                print(f"{tool.name}: SKIPPED ({error})")
+        args = scan.args
+        for match in IMAGE_PIN_RE.finditer(text):
+            ref = expand_args(match["ref"], args)
+            pins.append(
+                Pin("image", path, line_of(text, match.start()), ref, match["digest"])
+            )
+        for site in scan.hashes:
+            pin = Pin(
+                "artifact", path, line_of(text, site.start), site.var, site.digest
+            )
+            artifact = next((a for a in known if a.matches(site)), None)
+            if artifact is not None:
+                pin.name = f"{artifact.tool} {site.var}"
+                pin.url = artifact.url
+                pin.version = artifact.version
+            pins.append(pin)
+        for match in MANIFEST_URL_RE.finditer(text):
+            url = expand_args(match[0], args)
+            pins.append(
+                Pin("manifest", path, line_of(text, match.start()), url, None, url)
+            )
+    return pins
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_small(url: str, headers: dict[str, str]) -> bytes:
+    headers = {"User-Agent": "refresh-tool-pins", **headers}
+    with open_url(url, headers, 30) as response:
+        return response.read()
+
+
+def registry_get(url: str, accept: str) -> bytes:
+    """GET from an OCI registry, answering its anonymous bearer challenge."""
+    headers = {"Accept": accept}
+    try:
+        return read_small(url, headers)
+    except urllib.error.HTTPError as error:
+        challenge = error.headers.get("WWW-Authenticate", "")
+        if error.code != 401 or not challenge.startswith("Bearer "):
+            raise
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop("realm")
+    token = json.loads(read_small(f"{realm}?{urllib.parse.urlencode(params)}", {}))
+    headers["Authorization"] = f"Bearer {token.get('token') or token['access_token']}"
+    return read_small(url, headers)
+
+
+def manifest_url(ref: str, digest: str) -> str:
+    name = ref
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = "registry-1.docker.io", name
+        if "/" not in repository:
+            repository = f"library/{repository}"
+    # Like docker, talk plain HTTP only to a registry on this machine.
+    local = registry.split(":")[0] in ("localhost", "127.0.0.1")
+    scheme = "http" if local else "https"
+    return f"{scheme}://{registry}/v2/{repository}/manifests/sha256:{digest}"
+
+
+def verify_pin(
+    pin: Pin,
+    cache: DownloadCache | None,
+    sources: list[Source],
+    limiter: HostLimiter,
+) -> Pin:
+    started = time.monotonic()
+    try:
+        if pin.kind == "artifact" and pin.url is None:
+            pin.status = "unknown"
+            pin.detail = "no registered download for this hash"
+        elif pin.kind == "artifact":
+            pin.actual, pin.source = verify_artifact(pin, cache, sources, limiter)
+            pin.status = "ok" if pin.actual == pin.pinned else "mismatch"
+        elif pin.kind == "image":
+            pin.url = manifest_url(pin.name, pin.pinned)
+            pin.actual, pin.source = verify_image(pin, cache, limiter)
+            pin.status = "ok" if pin.actual == pin.pinned else "mismatch"
+        elif VAR_REF_RE.search(pin.url):
+            pin.status = "unresolved"
+            pin.detail = "URL depends on a build-time variable"
+        else:
+            fetched = fetch_digest(pin.url, "manifest", cache, sources, limiter)
+            pin.actual, pin.source = fetched.sha256, fetched.source
+            pin.status = "ok"
+    except (OSError, http.client.HTTPException, RuntimeError, ValueError) as error:
+        pin.status = "error"
+        pin.detail = str(error)
+    pin.seconds = time.monotonic() - started
+    return pin
+
+
+def verify_artifact(
+    pin: Pin,
+    cache: DownloadCache | None,
+    sources: list[Source],
+    limiter: HostLimiter,
+) -> tuple[str, str]:
+    entry = cache.lookup(pin.url, pin.version) if cache else None
+    if entry is not None:
+        # Re-hash the cached bytes rather than trusting the index.
+        cache.touch(pin.url, pin.version)
+        return hash_file(cache.blob_path(entry["sha256"])), "cache"
+    fetched = fetch_digest(pin.url, pin.version, cache, sources, limiter)
+    return fetched.sha256, fetched.source
+
+
+def verify_image(
+    pin: Pin, cache: DownloadCache | None, limiter: HostLimiter
+) -> tuple[str, str]:
+    # Manifests are content-addressed: the pinned digest names the blob.
+    if cache is not None and cache.blob_path(pin.pinned).exists():
+        return hash_file(cache.blob_path(pin.pinned)), "cache"
+    with limiter(pin.url):
+        body = registry_get(pin.url, MANIFEST_MEDIA_TYPES)
+    digest = hashlib.sha256(body).hexdigest()
+    if cache is not None:
+        spool = Spool(pin.url, cache.spool)
+        spool.write(body)
+        cache.store(pin.url, pin.pinned, spool.finish(), "registry")
+    return digest, "registry"
+
+
+def verify_all(
+    jobs: int = 6,
+    per_host: int = 4,
+    cache: DownloadCache | None = None,
+    sources: list[Source] | None = None,
+    dockerfiles: list[Path] | None = None,
+) -> int:
+    """Audit every pin in the stack Dockerfiles; print a JSON report.
+
+    Read-only: nothing is rewritten. Exit status is 0 only when every pin
+    that can be checked is ok.
+    """
+    started = time.monotonic()
+    if dockerfiles is None:
+        dockerfiles = sorted(STACKS_ROOT.glob("*/Dockerfile*"))
+    limiter = HostLimiter(per_host)
+    sources = sources or [UPSTREAM]
+    # Progress chatter goes to stderr so stdout stays pure JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        pins = discover_pins(dockerfiles, TOOLS)
+        # The same digest is often pinned in several Dockerfiles (a shared
+        # base image); check each distinct pin once and share the result.
+        distinct: dict[tuple, Pin] = {}
+        keys = [(pin.kind, pin.name, pin.pinned, pin.url) for pin in pins]
+        for key, pin in zip(keys, pins, strict=True):
+            distinct.setdefault(key, pin)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            list(
+                pool.map(
+                    lambda pin: verify_pin(pin, cache, sources, limiter),
+                    distinct.values(),
+                )
+            )
+        for key, pin in zip(keys, pins, strict=True):
+            result = distinct[key]
+            if pin is not result:
+                pin.url, pin.actual, pin.source = (
+                    result.url,
+                    result.actual,
+                    result.source,
+                )
+                pin.status, pin.detail = result.status, result.detail
+        if cache:
+            cache.save()
+    failed = [pin for pin in pins if pin.status in ("mismatch", "error")]
+    counts: dict[str, int] = {}
+    for pin in pins:
+        counts[pin.status] = counts.get(pin.status, 0) + 1
+    report = {
+        "ok": not failed,
+        "seconds": round(time.monotonic() - started, 4),
+        "counts": counts,
+        "connections": {"opened": POOL.opened, "reused": POOL.reused},
+        "pins": [pin.as_report() for pin in pins],
+    }
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Recompute pinned SHA-256 hashes for checksum-less tools."
+    )
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
+        "--sync-hashes",
+        action="store_true",
+        help="Rewrite each pinned hash to match the pinned version.",
+    )
+    mode.add_argument(
+        "--verify-all",
+        action="store_true",
+        help="Audit every hash pin in devcontainers/*/Dockerfile* and print "
+        "a JSON report; rewrites nothing.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=6,
+        help="Maximum concurrent downloads overall (default: 6).",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=4,
+        help="Maximum concurrent downloads per host (default: 4).",
+    )
+    parser.add_argument(
+        "--source",
+        dest="sources",
+        action="append",
+        type=Source.parse,
+        metavar="SPEC",
+        help="Where to fetch artifacts, tried in the order given: upstream, "
+        "mirror:<dir> or proxy:<url> (default: upstream).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=default_cache_dir(),
+        help="Download cache location (default: $XDG_CACHE_HOME/refresh-tool-pins).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Evict least-recently-used artifacts past this many MiB (default: 1024).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=24.0,
+        help="Hours a cached hash is trusted before a conditional re-check "
+        "(default: 24; 0 always revalidates).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Download and hash everything, reading and writing no cache.",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Write a JSON run report (per-artifact bytes, time to first "
+        "byte, throughput, retries, cache use, hashing time) to this path.",
+    )
+    args = parser.parse_args(argv)
+    cache = None
+    if not args.no_cache:
+        cache = DownloadCache(
+            args.cache_dir,
+            max_bytes=args.cache_size << 20,
+            ttl=args.cache_ttl * 3600,
+        )
+    if args.verify_all:
+        if args.report is not None:
+            parser.error("--report applies to --sync-hashes; --verify-all prints JSON")
+        return verify_all(
+            jobs=args.jobs, per_host=args.per_host, cache=cache, sources=args.sources
+        )
+    return sync_hashes(
+        jobs=args.jobs,
+        per_host=args.per_host,
+        cache=cache,
+        sources=args.sources,
+        report=args.report,
+    )
+
+
 if __name__ == "__main__":
-    if "--sync-hashes" not in sys.argv[1:]:
-        print("usage: refresh-tool-pins.py --sync-hashes", file=sys.stderr)
-        sys.exit(2)
-    sys.exit(sync_hashes())
+    sys.exit(main())
@@ -15,8 +15,15 @@ function Get-TemplateSignature {
     $sha1 = [System.Security.Cryptography.SHA1]::Create()
     $sha256 = [System.Security.Cryptography.SHA256]::Create()
 
+    # Built-in ignores of scripts/devcontainer_tree.py (.devcontainerignore is not read here).
+    $ignored = @('*.pyc', '*.pyo', '*.pyd', '*.swp', '*.swo', '*~', '.#*', '.DS_Store')
+
     try {
-        $checksums = Get-ChildItem -Path $TemplateDir -Recurse -File | Sort-Object FullName | ForEach-Object {
+        $files = Get-ChildItem -Path $TemplateDir -Recurse -File | Where-Object {
+            $name = $_.Name
+            -not ($ignored | Where-Object { $name -like $_ })
+        }
+        $checksums = $files | Sort-Object FullName | ForEach-Object {
             $bytes = [System.IO.File]::ReadAllBytes($_.FullName)
             $hashBytes = $sha1.ComputeHash($bytes)
             [System.BitConverter]::ToString($hashBytes).Replace("-", "").ToLowerInvariant()
@@ -5,7 +5,6 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 REPO_ROOT="$(cd "${SCRIPT_DIR}/.." && pwd)"
 TEMPLATE_ROOT="${REPO_ROOT}/devcontainers"
 TARGET_DIR="${REPO_ROOT}/.devcontainer"
-METADATA_FILE="${TARGET_DIR}/.template-metadata.json"
 CONTAINER_CLI=""
 
 usage() {
@@ -23,50 +22,27 @@ Stacks available under devcontainers/:
   - terraform
 
 Copies the selected template into .devcontainer/.
+
+Environment:
+  DEVCONTAINER_SIGNATURE_ALGORITHM  Per-file digest recorded in the template
+                                    metadata: sha1 (default), sha256, blake2b.
 EOF
   return 0
 }
 
-compute_template_signature() {
-  local template_dir="$1"
-
-  python3 -c '
-import hashlib
-import sys
-from pathlib import Path
-
-template_root = Path(sys.argv[1])
-checksums = []
-for file_path in sorted(template_root.rglob("*")):
-    if file_path.is_file():
-        checksums.append(hashlib.sha1(file_path.read_bytes()).hexdigest())
-print(hashlib.sha256("".join(checksums).encode()).hexdigest())
-' "${template_dir}"
-}
-
 write_template_metadata() {
   local stack="$1"
   local template_dir="$2"
-  local signature
-
-  signature="$(compute_template_signature "${template_dir}")"
-
-  python3 -c '
-import json
-import sys
-from pathlib import Path
-
-stack = sys.argv[1]
-source = sys.argv[2]
-signature = sys.argv[3]
-metadata_path = Path(sys.argv[4])
-metadata = {
-    "stack": stack,
-    "source": source,
-    "signature": signature,
-}
-metadata_path.write_text(json.dumps(metadata, indent=2) + "\n", encoding="utf-8")
-' "${stack}" "${template_dir#"${REPO_ROOT}"/}" "${signature}" "${METADATA_FILE}"
+
+  # Records the flat signature, the Merkle tree that lets
+  # devcontainer-metadata.py name the drifted paths later, and the per-file
+  # manifest that --drift and devcontainer-diff.py check without the template.
+  python3 "${SCRIPT_DIR}/devcontainer-metadata.py" \
+    --target "${TARGET_DIR}" \
+    --templates "${TEMPLATE_ROOT}" \
+    --write "${stack}" \
+    --algorithm "${DEVCONTAINER_SIGNATURE_ALGORITHM:-sha1}" \
+    --source "${template_dir#"${REPO_ROOT}"/}" >/dev/null
 }
 
 STACK=""
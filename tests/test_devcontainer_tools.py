@@ -3,10 +3,17 @@
 Target: 95%+ code coverage
 """
 
+import difflib
 import hashlib
+import importlib.util
+import io
 import json
+import os
+import queue
+import random
 import subprocess
 import sys
+import threading
 from pathlib import Path
 
 import pytest
@@ -17,13 +24,13 @@
 # ========== Helper Functions ==========
 
 
-def _compute_signature(template_root: Path) -> str:
+def _compute_signature(template_root: Path, algorithm: str = "sha1") -> str:
     """Compute signature the same way as devcontainer-metadata.py."""
     checksums = []
     for file_path in sorted(template_root.rglob("*")):
         if file_path.is_file():
             data = file_path.read_bytes()
-            checksums.append(hashlib.sha1(data).hexdigest())
+            checksums.append(hashlib.new(algorithm, data).hexdigest())
     joined = "".join(checksums).encode()
     return hashlib.sha256(joined).hexdigest()
 
@@ -38,6 +45,30 @@ def _run_script(script: Path, *args: str) -> subprocess.CompletedProcess:
     )
 
 
+def _load_script(name: str):
+    """Import a hyphenated script from scripts/ as a module."""
+    path = Path(__file__).resolve().parents[1] / "scripts" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the signature cache of every script run out of the real home."""
+    home = tmp_path / "xdg-cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(home))
+    return home
+
+
+def _age(path: Path, seconds: int = 60) -> None:
+    """Backdate path so the signature cache treats it as settled."""
+    past = path.stat().st_mtime_ns - seconds * 1_000_000_000
+    os.utime(path, ns=(past, past))
+
+
 # ========== devcontainer-metadata.py Tests ==========
 
 
@@ -74,6 +105,33 @@ def test_metadata_matches(tmp_path: Path):
     assert "ansible" in proc.stdout
 
 
+def test_signature_cache_is_written_under_xdg_cache_home(
+    tmp_path: Path, cache_home: Path
+):
+    """Without --cache-file, the cache lives in $XDG_CACHE_HOME."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "ansible", {"Dockerfile": "FROM a\n"})
+    target = tmp_path / ".devcontainer"
+    _write_tree(target, {"Dockerfile": "FROM a\n"})
+    metadata = {
+        "stack": "ansible",
+        "source": str(templates / "ansible"),
+        "signature": _compute_signature(templates / "ansible"),
+    }
+    (target / ".template-metadata.json").write_text(json.dumps(metadata))
+
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+    )
+    assert proc.returncode == 0, proc.stderr
+    cache = cache_home / "devcontainer-metadata" / "signatures.json"
+    assert str(templates / "ansible") in json.loads(cache.read_text())["roots"]
+
+
 def test_metadata_mismatch(tmp_path: Path):
     """Test that metadata validation fails when signatures don't match."""
     devcontainers = tmp_path / "devcontainers" / "ansible"
@@ -238,6 +296,706 @@ def test_metadata_with_multiple_files(tmp_path: Path):
     assert "Status: OK" in proc.stdout
 
 
+def test_signature_cache_skips_unchanged_files(tmp_path: Path, monkeypatch):
+    """Cached signatures match the uncached scheme and skip rereads."""
+    metadata = _load_script("devcontainer-metadata")
+    template = tmp_path / "devcontainers" / "ansible"
+    (template / "nested").mkdir(parents=True)
+    files = [template / "devcontainer.json", template / "nested" / "Dockerfile"]
+    for index, path in enumerate(files):
+        path.write_text(f"content {index}\n", encoding="utf-8")
+        _age(path)
+    cache_file = tmp_path / "cache" / "signatures.json"
+
+    first = metadata.compute_signature(template, metadata.SignatureCache(cache_file))
+    assert first == _compute_signature(template)
+
+    hashed = []
+    real_digest = metadata.digest_file
+    monkeypatch.setattr(
+        metadata,
+        "digest_file",
+        lambda path, algorithm: hashed.append(path) or real_digest(path, algorithm),
+    )
+    second = metadata.compute_signature(template, metadata.SignatureCache(cache_file))
+    assert second == first
+    assert hashed == []
+
+    files[1].write_text("changed content\n", encoding="utf-8")
+    _age(files[1])
+    third = metadata.compute_signature(template, metadata.SignatureCache(cache_file))
+    assert third == _compute_signature(template)
+    assert hashed == [files[1].absolute()]
+
+
+def test_signature_cache_does_not_trust_fresh_mtimes(tmp_path: Path):
+    """Files touched just now are hashed again rather than cached."""
+    metadata = _load_script("devcontainer-metadata")
+    template = tmp_path / "template"
+    template.mkdir()
+    (template / "file.txt").write_text("fresh", encoding="utf-8")
+    cache = metadata.SignatureCache(tmp_path / "signatures.json")
+
+    metadata.compute_signature(template, cache)
+
+    assert cache.roots == {str(template.absolute()): {}}
+
+
+def test_signature_cache_drops_deleted_files(tmp_path: Path):
+    """Entries for files gone from the template are pruned."""
+    metadata = _load_script("devcontainer-metadata")
+    template = tmp_path / "template"
+    template.mkdir()
+    for name in ("keep.txt", "drop.txt"):
+        (template / name).write_text(name, encoding="utf-8")
+        _age(template / name)
+    cache_file = tmp_path / "signatures.json"
+    metadata.compute_signature(template, metadata.SignatureCache(cache_file))
+
+    (template / "drop.txt").unlink()
+    metadata.compute_signature(template, metadata.SignatureCache(cache_file))
+
+    roots = json.loads(cache_file.read_text(encoding="utf-8"))["roots"]
+    assert list(roots[str(template.absolute())]) == ["keep.txt"]
+
+
+def test_parallel_signature_matches_sequential(tmp_path: Path, monkeypatch):
+    """Thread-pool and mmap hashing keep the signature byte-identical."""
+    metadata = _load_script("devcontainer-metadata")
+    monkeypatch.setattr(metadata, "MMAP_THRESHOLD", 1024)
+    template = tmp_path / "template"
+    for index in range(40):
+        path = template / f"d{index % 3}" / f"f{index}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes([index]) * (index * 97))
+
+    expected = _compute_signature(template)
+    for jobs in (1, 4):
+        assert metadata.compute_signature(template, jobs=jobs) == expected
+
+
+@pytest.mark.slow
+def test_hashing_benchmark_reports_every_job_count():
+    """The benchmark runs end to end and checks signatures itself."""
+    proc = _run_script(
+        Path("scripts/benchmark-hashing.py"),
+        "--files",
+        "60",
+        "--large",
+        "1",
+        "--large-size",
+        "5",
+        "--repeat",
+        "1",
+        "--max-jobs",
+        "2",
+        "--algorithms",
+        "sha1,blake2b",
+        "--json",
+    )
+    assert proc.returncode == 0, proc.stderr
+    summary = json.loads(proc.stdout)
+    assert [(row["algorithm"], row["jobs"]) for row in summary["results"]] == [
+        ("sha1", 1),
+        ("sha1", 1),
+        ("sha1", 2),
+        ("blake2b", 1),
+        ("blake2b", 2),
+    ]
+
+
+def test_metadata_cli_with_cache_file(tmp_path: Path):
+    """A warm cache still reports OK; a corrupt cache is ignored."""
+    template = tmp_path / "devcontainers" / "ansible"
+    template.mkdir(parents=True)
+    (template / "devcontainer.json").write_text('{"name": "x"}', encoding="utf-8")
+    _age(template / "devcontainer.json")
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    (target / ".template-metadata.json").write_text(
+        json.dumps(
+            {
+                "stack": "ansible",
+                "source": str(template),
+                "signature": _compute_signature(template),
+            }
+        ),
+        encoding="utf-8",
+    )
+    cache_file = tmp_path / "signatures.json"
+    cache_file.write_text("not json", encoding="utf-8")
+
+    for _ in range(2):
+        proc = _run_script(
+            Path("scripts/devcontainer-metadata.py"),
+            "--target",
+            str(target),
+            "--templates",
+            str(tmp_path / "devcontainers"),
+            "--cache-file",
+            str(cache_file),
+        )
+        assert proc.returncode == 0, proc.stderr
+        assert "Status: OK" in proc.stdout
+    assert json.loads(cache_file.read_text(encoding="utf-8"))["roots"]
+
+
+def _write_tree(template: Path, files: dict[str, str]) -> None:
+    for rel, content in files.items():
+        path = template / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+
+def test_merkle_metadata_reports_changed_paths(tmp_path: Path):
+    """Format-2 metadata names each added, removed and modified file."""
+    templates = tmp_path / "devcontainers"
+    template = templates / "latex"
+    _write_tree(
+        template,
+        {
+            "devcontainer.json": "{}",
+            "fonts/a/one.otf": "one",
+            "fonts/a/two.otf": "two",
+            "fonts/b/three.otf": "three",
+            "scripts/init.sh": "echo",
+        },
+    )
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    common = ["--target", str(target), "--templates", str(templates), "--no-cache"]
+    script = Path("scripts/devcontainer-metadata.py")
+
+    proc = _run_script(script, *common, "--write", "latex")
+    assert proc.returncode == 0, proc.stderr
+    recorded = json.loads((target / ".template-metadata.json").read_text())
+    assert recorded["signature"] == _compute_signature(template)
+    assert recorded["signature_version"] == 2
+    assert _run_script(script, *common).returncode == 0
+
+    (template / "fonts" / "a" / "two.otf").write_text("TWO", encoding="utf-8")
+    (template / "scripts" / "init.sh").unlink()
+    _write_tree(template, {"scripts/setup.sh": "echo"})
+
+    proc = _run_script(script, *common)
+    assert proc.returncode == 2
+    listed = [line.split() for line in proc.stderr.splitlines()[1:]]
+    assert listed == [
+        ["modified", "fonts/a/two.otf"],
+        ["removed", "scripts/init.sh"],
+        ["added", "scripts/setup.sh"],
+    ]
+
+
+@pytest.mark.parametrize("algorithm", ["sha256", "blake2b"])
+def test_metadata_algorithm_is_recorded_and_detected(tmp_path: Path, algorithm):
+    """--write records the algorithm; verification picks it up by itself."""
+    templates = tmp_path / "devcontainers"
+    template = templates / "golang"
+    _write_tree(template, {"devcontainer.json": "{}", "lib/big.bin": "x" * 5000})
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    common = ["--target", str(target), "--templates", str(templates), "--no-cache"]
+    script = Path("scripts/devcontainer-metadata.py")
+
+    proc = _run_script(script, *common, "--write", "golang", "--algorithm", algorithm)
+    assert proc.returncode == 0, proc.stderr
+    recorded = json.loads((target / ".template-metadata.json").read_text())
+    assert recorded["algorithm"] == algorithm
+    assert recorded["signature"] == _compute_signature(template, algorithm)
+
+    proc = _run_script(script, *common)
+    assert proc.returncode == 0, proc.stderr
+    assert f"({algorithm})" in proc.stdout
+
+    (template / "lib" / "big.bin").write_text("y", encoding="utf-8")
+    proc = _run_script(script, *common)
+    assert proc.returncode == 2
+    assert "modified  lib/big.bin" in proc.stderr
+
+
+def test_metadata_rejects_unknown_algorithm(tmp_path: Path):
+    """An algorithm this verifier does not know is an error, not a mismatch."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "golang", {"devcontainer.json": "{}"})
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    (target / ".template-metadata.json").write_text(
+        json.dumps(
+            {"stack": "golang", "source": "x", "signature": "y", "algorithm": "md4"}
+        ),
+        encoding="utf-8",
+    )
+
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+    )
+    assert proc.returncode == 1
+    assert "unsupported algorithm" in proc.stderr
+
+
+def test_signature_cache_keeps_digests_per_algorithm(tmp_path: Path, monkeypatch):
+    """Switching algorithms does not evict the other algorithm's digests."""
+    metadata = _load_script("devcontainer-metadata")
+    template = tmp_path / "template"
+    _write_tree(template, {"a.txt": "a"})
+    _age(template / "a.txt")
+    cache_file = tmp_path / "signatures.json"
+    for algorithm in ("sha1", "blake2b"):
+        cache = metadata.SignatureCache(cache_file)
+        metadata.compute_signature(template, cache, algorithm=algorithm)
+
+    hashed = []
+    monkeypatch.setattr(
+        metadata, "digest_file", lambda path, algorithm: hashed.append(path)
+    )
+    for algorithm in ("sha1", "blake2b"):
+        cache = metadata.SignatureCache(cache_file)
+        assert metadata.compute_signature(
+            template, cache, algorithm=algorithm
+        ) == _compute_signature(template, algorithm)
+    assert hashed == []
+
+
+def test_merkle_diff_skips_matching_subtrees():
+    """Subtrees with equal digests are not descended into."""
+    metadata = _load_script("devcontainer-metadata")
+    recorded = metadata.merkle_tree([("a/x", "1" * 40), ("b/y", "2" * 40)])
+    current = metadata.merkle_tree([("a/x", "1" * 40), ("b/y", "3" * 40)])
+    # Corrupt the recorded children of "a": only its digest may be consulted.
+    recorded["children"]["a"]["children"] = {"bogus": "0" * 40}
+
+    assert metadata.changed_paths(recorded, current) == [("modified", "b/y")]
+
+
+def test_metadata_rejects_malformed_tree(tmp_path: Path):
+    """A format-2 file with a broken tree is reported, not trusted."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "golang", {"devcontainer.json": "{}"})
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    (target / ".template-metadata.json").write_text(
+        json.dumps(
+            {
+                "stack": "golang",
+                "source": "devcontainers/golang",
+                "signature": _compute_signature(templates / "golang"),
+                "signature_version": 2,
+                "tree": {"digest": "x"},
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+        "--no-cache",
+    )
+    assert proc.returncode == 1
+    assert "malformed" in proc.stderr
+
+
+def _provision(templates: Path, target: Path, stack: str) -> None:
+    target.mkdir(parents=True)
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+        "--no-cache",
+        "--write",
+        stack,
+    )
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_batch_verification_hashes_each_template_once(tmp_path: Path):
+    """Many targets share one template digest and one JSON report."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "ansible", {"devcontainer.json": "{}", "a/b.txt": "b"})
+    _write_tree(templates / "golang", {"devcontainer.json": "{}"})
+    repos = tmp_path / "repos"
+    for name in ("one", "two", "three"):
+        _provision(templates, repos / name / ".devcontainer", "ansible")
+    _provision(templates, repos / "four" / ".devcontainer", "golang")
+    # "three" has drifted: its recorded tree no longer matches the template.
+    metadata_path = repos / "three" / ".devcontainer" / ".template-metadata.json"
+    metadata = json.loads(metadata_path.read_text())
+    metadata["tree"]["children"]["a"]["children"]["b.txt"] = "0" * 40
+    metadata["tree"]["children"]["a"]["digest"] = "changed"
+    metadata["tree"]["digest"] = "changed"
+    metadata_path.write_text(json.dumps(metadata))
+    listing = tmp_path / "targets.txt"
+    listing.write_text(
+        "# build host checkouts\n"
+        + "".join(f"{repos / name / '.devcontainer'}\n" for name in ("two", "three"))
+        + f"{repos / 'missing'}\n"
+    )
+    index = tmp_path / "index.json"
+    args = [
+        "--templates",
+        str(templates),
+        "--no-cache",
+        "--index",
+        str(index),
+        "--target",
+        str(repos / "one" / ".devcontainer"),
+        "--target",
+        str(repos / "four" / ".devcontainer"),
+        "--targets-from",
+        str(listing),
+    ]
+
+    proc = _run_script(Path("scripts/devcontainer-metadata.py"), *args)
+
+    assert proc.returncode == 1, proc.stderr
+    report = json.loads(proc.stdout)
+    assert [r["status"] for r in report["results"]] == [
+        "ok",
+        "ok",
+        "ok",
+        "mismatch",
+        "error",
+    ]
+    assert report["counts"] == {"ok": 3, "mismatch": 1, "error": 1}
+    assert report["results"][3]["changes"] == [
+        {"status": "modified", "path": "a/b.txt"}
+    ]
+    assert sorted(report["templates"]) == ["ansible:sha1", "golang:sha1"]
+    assert {t["origin"] for t in report["templates"].values()} == {"computed"}
+
+    for path in templates.rglob("*"):
+        if path.is_file():
+            _age(path)
+    _run_script(Path("scripts/devcontainer-metadata.py"), *args)
+    proc = _run_script(Path("scripts/devcontainer-metadata.py"), *args)
+    report = json.loads(proc.stdout)
+    assert {t["origin"] for t in report["templates"].values()} == {"index"}
+
+
+def test_batch_exit_status_two_on_mismatch_only(tmp_path: Path):
+    """Without errors, any drift makes the batch exit 2."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "golang", {"devcontainer.json": "{}"})
+    targets = [tmp_path / name / ".devcontainer" for name in ("a", "b")]
+    for target in targets:
+        _provision(templates, target, "golang")
+    (templates / "golang" / "devcontainer.json").write_text("{ }")
+
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--templates",
+        str(templates),
+        "--no-cache",
+        *[arg for target in targets for arg in ("--target", str(target))],
+    )
+
+    assert proc.returncode == 2
+    assert json.loads(proc.stdout)["counts"] == {"mismatch": 2}
+
+
+def _provision_copy(tmp_path: Path, files: dict[str, str]) -> Path:
+    """A target provisioned from, and populated like, a "golang" template."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "golang", files)
+    target = tmp_path / "repo" / ".devcontainer"
+    _provision(templates, target, "golang")
+    _write_tree(target, files)
+    return target
+
+
+def test_manifest_drift_without_templates(tmp_path: Path):
+    """--drift and the diff classify changes from the manifest alone."""
+    files = {
+        "devcontainer.json": "{}",
+        "Dockerfile": "FROM debian\n",
+        "install.sh": "#!/bin/sh\n",
+        "a/b.txt": "b",
+    }
+    target = _provision_copy(tmp_path, files)
+    metadata = json.loads((target / ".template-metadata.json").read_text())
+    assert [entry["path"] for entry in metadata["manifest"]] == sorted(
+        files, key=lambda rel: rel.split("/")
+    )
+    assert {entry["size"] for entry in metadata["manifest"]} >= {2, 12}
+
+    args = ("--target", str(target), "--templates", str(tmp_path / "none"))
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"), *args, "--no-cache", "--drift"
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert "Status: OK" in proc.stdout
+
+    (target / "devcontainer.json").write_text("[]")  # same size
+    (target / "Dockerfile").write_text("FROM alpine\n")
+    (target / "a" / "b.txt").unlink()
+    (target / "extra.txt").write_text("x")
+    (target / "install.sh").chmod(0o755)
+
+    proc = _run_script(
+        Path("scripts/devcontainer-metadata.py"), *args, "--no-cache", "--drift"
+    )
+    assert proc.returncode == 2
+    assert proc.stderr.splitlines()[1:] == [
+        "  modified  Dockerfile",
+        "  removed   a/b.txt",
+        "  modified  devcontainer.json",
+        "  added     extra.txt",
+        "  mode      install.sh",
+    ]
+
+    proc = _run_script(Path("scripts/devcontainer-diff.py"), *args, "--no-cache")
+    assert proc.returncode == 2
+    assert "comparing against the recorded manifest" in proc.stderr
+    assert "--- Missing file from template: a/b.txt" in proc.stdout
+    assert "*** Modified file: devcontainer.json" in proc.stdout
+    assert "*** Modified file: Dockerfile" in proc.stdout
+    assert "+++ Added file: extra.txt" in proc.stdout
+    assert "*** Mode changed: install.sh" in proc.stdout
+    assert ".template-metadata.json" not in proc.stdout
+
+
+def test_manifest_changes_reads_only_files_it_must(tmp_path: Path):
+    """Size mismatches need no read; cached digests make re-checks stat-only."""
+    tree = _load_script("devcontainer_tree")
+    root = tmp_path / "tree"
+    _write_tree(root, {"same.txt": "same", "grown.txt": "grown"})
+    digests = [
+        (rel, hashlib.sha1((root / rel).read_bytes()).hexdigest())
+        for rel in ("grown.txt", "same.txt")
+    ]
+    manifest = tree.read_manifest(tree.build_manifest(root, digests), 40)
+    (root / "grown.txt").write_text("grown and then some")
+    for path in root.iterdir():
+        _age(path)
+
+    read = []
+
+    def digest(path: Path) -> str:
+        read.append(path.name)
+        return hashlib.sha1(path.read_bytes()).hexdigest()
+
+    cache = tree.SignatureCache(tmp_path / "cache" / "signatures.json")
+    changes = tree.manifest_changes(root, manifest, "sha1", digest, cache)
+    assert changes == [("modified", "grown.txt")]
+    assert read == ["same.txt"]
+
+    read.clear()
+    cache = tree.SignatureCache(tmp_path / "cache" / "signatures.json")
+    assert tree.manifest_changes(root, manifest, "sha1", digest, cache) == [
+        ("modified", "grown.txt")
+    ]
+    assert read == []
+
+
+def test_drift_requires_a_valid_manifest(tmp_path: Path):
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    metadata = {"stack": "golang", "source": "devcontainers/golang"}
+    metadata_path = target / ".template-metadata.json"
+    metadata_path.write_text(json.dumps(metadata))
+    args = ("--target", str(target), "--no-cache", "--drift")
+
+    proc = _run_script(Path("scripts/devcontainer-metadata.py"), *args)
+    assert proc.returncode == 1
+    assert "no manifest" in proc.stderr
+
+    for manifest in (
+        [{"path": "x", "size": 1, "mode": "0644", "digest": "z"}],
+        {"x": "not a list"},
+    ):
+        metadata["manifest"] = manifest
+        metadata_path.write_text(json.dumps(metadata))
+        proc = _run_script(Path("scripts/devcontainer-metadata.py"), *args)
+        assert proc.returncode == 1
+        assert "malformed manifest" in proc.stderr
+
+
+# ========== devcontainer_tree.py Tests ==========
+
+
+def test_walk_files_matches_sorted_rglob_order(tmp_path: Path):
+    """The scandir walk lists files in sorted(rglob()) order."""
+    tree = _load_script("devcontainer_tree")
+    _write_tree(
+        tmp_path,
+        {
+            "a/x": "1",
+            "a-b": "2",
+            "a.txt": "3",
+            "B/c/d": "4",
+            "a/y/z": "5",
+            "_": "6",
+        },
+    )
+    (tmp_path / "empty").mkdir()
+    expected = [
+        p.relative_to(tmp_path).as_posix()
+        for p in sorted(tmp_path.rglob("*"))
+        if p.is_file()
+    ]
+
+    walked = [rel for rel, _ in tree.walk_files(tmp_path)]
+
+    assert walked == expected
+    assert tree.list_files(tmp_path) == [tmp_path / rel for rel in expected]
+
+
+def test_merge_walk_joins_both_trees_in_walk_order(tmp_path: Path):
+    tree = _load_script("devcontainer_tree")
+    left, right = tmp_path / "left", tmp_path / "right"
+    _write_tree(left, {"a/x": "", "a.txt": "", "b/c/d": "", "z": "", "m": ""})
+    _write_tree(right, {"a/x": "", "a/y": "", "b": "", "z": "", "x.swp": ""})
+    (left / "m").unlink()
+
+    joined = [
+        (rel, lhs is not None, rhs is not None)
+        for rel, lhs, rhs in tree.merge_walk(left, right)
+    ]
+
+    assert joined == [
+        ("a/x", True, True),
+        ("a/y", False, True),
+        ("a.txt", True, False),
+        ("b", False, True),
+        ("b/c/d", True, False),
+        ("z", True, True),
+    ]
+
+
+def test_diff_reports_files_in_one_path_ordered_stream(tmp_path: Path, capsys):
+    """Added, missing and changed files come out interleaved by path."""
+    diff = _load_script("devcontainer-diff")
+    source, target = tmp_path / "source", tmp_path / "target"
+    _write_tree(source, {"a.txt": "a\n", "b.txt": "b\n", "d/e.txt": "e\n"})
+    _write_tree(target, {"a.txt": "A\n", "c.txt": "c\n", "d/e.txt": "e\n"})
+
+    assert diff.report_differences(target, source)
+
+    out = capsys.readouterr().out
+    positions = [
+        out.index(f"+++ {target / 'a.txt'}"),
+        out.index("--- Missing file from template: b.txt"),
+        out.index("+++ Added file: c.txt"),
+    ]
+    assert positions == sorted(positions)
+    assert "d/e.txt" not in out
+
+
+def test_walk_files_applies_ignore_patterns(tmp_path: Path):
+    """Built-in ignores plus nested .devcontainerignore/.gitignore rules."""
+    tree = _load_script("devcontainer_tree")
+    _write_tree(
+        tmp_path,
+        {
+            ".devcontainerignore": "# noise\n*.log\n!keep.log\n/scratch/\nbuild\n",
+            "Dockerfile": "FROM scratch\n",
+            ".Dockerfile.swp": "",
+            "notes~": "",
+            "__pycache__/setup.cpython-312.pyc": "",
+            "debug.log": "",
+            "keep.log": "",
+            "scratch/tmp": "",
+            "build/out": "",
+            "sub/scratch/tmp": "",
+            "sub/.gitignore": "local.json\n",
+            "sub/local.json": "",
+            "local.json": "",
+        },
+    )
+
+    walked = [rel for rel, _ in tree.walk_files(tmp_path)]
+
+    assert walked == [
+        ".devcontainerignore",
+        "Dockerfile",
+        "keep.log",
+        "local.json",
+        "sub/.gitignore",
+        "sub/scratch/tmp",
+    ]
+    assert len(list(tree.walk_files(tmp_path, ignore=False))) == 13
+
+
+@pytest.mark.parametrize(
+    ("pattern", "path", "is_dir", "ignored"),
+    [
+        ("*.json", "a/b.json", False, True),
+        ("/b.json", "a/b.json", False, False),
+        ("a/*.json", "a/b.json", False, True),
+        ("a/*.json", "a/c/b.json", False, False),
+        ("a/**/b.json", "a/c/d/b.json", False, True),
+        ("**/c", "a/c", True, True),
+        ("a/**", "a/c/d", False, True),
+        ("cache/", "cache", False, False),
+        ("cache/", "x/cache", True, True),
+        ("file[0-9]", "file7", False, True),
+        ("file[!0-9]", "file7", False, False),
+        ("\\#name", "#name", False, True),
+        ("?.txt", "ab.txt", False, False),
+    ],
+)
+def test_ignore_pattern_semantics(pattern: str, path: str, is_dir: bool, ignored: bool):
+    tree = _load_script("devcontainer_tree")
+    rules = tree.parse_ignore_patterns([pattern])
+    assert tree.is_ignored(rules, path, is_dir) is ignored
+
+
+def test_ignored_files_leave_signature_and_diff_unchanged(tmp_path: Path):
+    """Swap files and caches in the checkout are neither signed nor diffed."""
+    templates = tmp_path / "devcontainers"
+    template = templates / "ansible"
+    _write_tree(template, {"devcontainer.json": "{}\n", "scripts/init.sh": "true\n"})
+    target = tmp_path / ".devcontainer"
+    _provision(templates, target, "ansible")
+    _write_tree(target, {"devcontainer.json": "{}\n", "scripts/init.sh": "true\n"})
+    recorded = json.loads((target / ".template-metadata.json").read_text())
+    assert recorded["signature"] == _compute_signature(template)
+
+    noise = {".devcontainer.json.swp": "x", "scripts/__pycache__/m.pyc": "x"}
+    _write_tree(template, noise)
+    _write_tree(target, noise)
+
+    verify = _run_script(
+        Path("scripts/devcontainer-metadata.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+        "--no-cache",
+    )
+    assert verify.returncode == 0, verify.stderr
+    diff = _run_script(
+        Path("scripts/devcontainer-diff.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+    )
+    assert diff.returncode == 0, diff.stdout
+    assert (target / ".devcontainer.json.swp").exists()
+    (target / "notes~").write_text("x", encoding="utf-8")
+    (target / "extra.txt").write_text("x", encoding="utf-8")
+    diff = _run_script(
+        Path("scripts/devcontainer-diff.py"),
+        "--target",
+        str(target),
+        "--templates",
+        str(templates),
+    )
+    assert diff.returncode == 2
+    assert diff.stdout.splitlines() == ["+++ Added file: extra.txt"]
+
+
 # ========== devcontainer-diff.py Tests ==========
 
 
@@ -301,6 +1059,446 @@ def test_devcontainer_diff_no_changes(tmp_path: Path):
     assert "No differences" in proc.stdout
 
 
+def test_compare_files_fast_paths(tmp_path: Path, monkeypatch):
+    """Sizes and cached digests decide without reading; chunks are reused."""
+    diff = _load_script("devcontainer-diff")
+    missing = tmp_path / "never-read"
+
+    same = diff.compare_files(missing, missing, (5, 5), ("a" * 40, "a" * 40))
+    assert same.equal and same.source_data is None
+
+    left, right = tmp_path / "left", tmp_path / "right"
+    left.write_bytes(b"0123456789abcdef")
+    right.write_bytes(b"0123456789abcdeX")
+    monkeypatch.setattr(diff, "CHUNK_SIZE", 4)
+    late = diff.compare_files(left, right, (16, 16))
+    assert not late.equal
+    assert (late.source_data, late.target_data) == (
+        left.read_bytes(),
+        right.read_bytes(),
+    )
+
+    right.write_bytes(left.read_bytes())
+    equal = diff.compare_files(left, right, (16, 16))
+    expected = hashlib.sha1(left.read_bytes()).hexdigest()
+    assert equal.equal
+    assert equal.source_digest == equal.target_digest == expected
+
+
+def test_diff_reuses_cached_digests(tmp_path: Path, monkeypatch, capsys):
+    """A second diff of a clean tree compares cached digests, not contents."""
+    diff = _load_script("devcontainer-diff")
+    source = tmp_path / "devcontainers" / "ansible"
+    target = tmp_path / ".devcontainer"
+    files = {"devcontainer.json": "{}\n", "assets/font.otf": "x" * 5000}
+    for root in (source, target):
+        _write_tree(root, files)
+        for rel in files:
+            _age(root / rel)
+    cache_file = tmp_path / "signatures.json"
+
+    assert not diff.report_differences(target, source, diff.SignatureCache(cache_file))
+    cache = diff.SignatureCache(cache_file)
+    assert set(cache.roots) == {str(source), str(target)}
+
+    opened = []
+    monkeypatch.setattr(diff, "diff_pair", lambda task: opened.append(task))
+    assert not diff.report_differences(target, source, cache)
+    assert opened == []
+    monkeypatch.undo()
+
+    (target / "devcontainer.json").write_text('{"a": 1}\n', encoding="utf-8")
+    assert diff.report_differences(target, source, diff.SignatureCache(cache_file))
+    assert '+{"a": 1}' in capsys.readouterr().out
+
+
+def test_compare_binary_reports_ranges_across_chunks(monkeypatch):
+    """Differences are merged into ranges even where they straddle chunks."""
+    diff = _load_script("devcontainer-diff")
+    monkeypatch.setattr(diff, "CHUNK_SIZE", 32)
+    monkeypatch.setattr(diff, "HEX_BLOCK", 16)
+    source = bytes(range(100))
+    target = bytearray(source)
+    target[30:34] = b"\xff" * 4  # crosses the first chunk boundary
+    target[36] = 0xFF  # within RANGE_GAP of the first range
+    target[70] = 0xFF
+    target += b"tail"
+
+    result = diff.compare_binary(
+        io.BytesIO(source), io.BytesIO(bytes(target)), hex_blocks=2
+    )
+
+    assert result.sizes == (100, 104)
+    assert result.digests == (
+        hashlib.sha1(source).hexdigest(),
+        hashlib.sha1(target).hexdigest(),
+    )
+    assert result.ranges == [(30, 37), (70, 71), (100, 104)]
+    assert (result.range_count, result.differing_bytes) == (3, 12)
+    assert [offset for offset, _a, _b in result.rows] == [16, 32]
+
+    same = diff.compare_binary(io.BytesIO(source), io.BytesIO(source))
+    assert same.equal and same.ranges == []
+
+
+def test_diff_summarises_binary_files(tmp_path: Path):
+    """Binary files get a size/digest/range summary instead of a hex line diff."""
+    templates = tmp_path / "devcontainers"
+    (templates / "ansible").mkdir(parents=True)
+    target = tmp_path / ".devcontainer"
+    target.mkdir()
+    (target / ".template-metadata.json").write_text('{"stack": "ansible"}')
+    payload = b"\x89PNG\r\n\x1a\n\0" + bytes(range(256)) * 4
+    (templates / "ansible" / "logo.png").write_bytes(payload)
+    (target / "logo.png").write_bytes(payload[:600] + b"\0" + payload[601:])
+    args = ["--target", str(target), "--templates", str(templates), "--no-cache"]
+
+    proc = _run_script(Path("scripts/devcontainer-diff.py"), *args)
+
+    assert proc.returncode == 2
+    lines = proc.stdout.splitlines()
+    assert lines[0].startswith("Binary files ")
+    assert lines[1] == "  size: 1033 -> 1033 bytes"
+    assert lines[4] == "    0x00000258-0x00000258 (1 bytes)"
+    assert not any(line.startswith("-00000250") for line in lines)
+
+    proc = _run_script(Path("scripts/devcontainer-diff.py"), *args, "--binary-diff")
+
+    assert proc.returncode == 2
+    rows = [line for line in proc.stdout.splitlines() if line.startswith(("-", "+"))]
+    assert [row[:9] for row in rows] == ["-00000250", "+00000250"]
+
+
+def test_parallel_diff_output_matches_sequential(tmp_path: Path):
+    """--jobs N prints the same diffs, in the same order, as --jobs 1."""
+    templates = tmp_path / "devcontainers"
+    target = tmp_path / ".devcontainer"
+    source_files = {f"d{i % 3}/f{i:02d}.txt": f"line {i}\n" * 40 for i in range(24)}
+    target_files = {
+        rel: text + "changed\n" if i % 2 else text
+        for i, (rel, text) in enumerate(source_files.items())
+    }
+    target_files["d1/blob.bin"] = "\0 added"
+    # Read first and equal on both sides: enough bytes to start the pool.
+    source_files["a/big.txt"] = target_files["a/big.txt"] = "0" * (5 << 20)
+    _write_tree(templates / "ansible", source_files)
+    _write_tree(target, target_files)
+    (target / ".template-metadata.json").write_text('{"stack": "ansible"}')
+    args = ["--target", str(target), "--templates", str(templates), "--no-cache"]
+
+    sequential = _run_script(Path("scripts/devcontainer-diff.py"), *args, "--jobs", "1")
+    parallel = _run_script(Path("scripts/devcontainer-diff.py"), *args, "--jobs", "3")
+
+    assert sequential.returncode == parallel.returncode == 2
+    assert parallel.stdout == sequential.stdout
+    assert sequential.stdout.count(f"+++ {target}/") == 12
+    assert "+++ Added file: d1/blob.bin" in sequential.stdout
+    _write_tree(target, source_files)
+    (target / "d1" / "blob.bin").unlink()
+    clean = _run_script(Path("scripts/devcontainer-diff.py"), *args, "--jobs", "3")
+    assert clean.returncode == 0, clean.stdout
+
+
+def test_small_trees_are_diffed_without_a_pool(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+):
+    """Below POOL_MIN_BYTES, --jobs N never starts worker processes."""
+    diff = _load_script("devcontainer-diff")
+    _write_tree(tmp_path / "source", {"a.txt": "a\n", "b.txt": "b\n"})
+    _write_tree(tmp_path / "target", {"a.txt": "A\n", "b.txt": "b\n"})
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started")
+
+    monkeypatch.setattr(diff, "ProcessPoolExecutor", no_pool)
+    assert diff.report_differences(tmp_path / "target", tmp_path / "source", jobs=8)
+    assert "-a\n+A\n" in capsys.readouterr().out
+
+
+def _lcs_length(a: list[str], b: list[str]) -> int:
+    row = [0] * (len(b) + 1)
+    for item in a:
+        previous = 0
+        for j, other in enumerate(b):
+            previous, row[j + 1] = (
+                row[j + 1],
+                (previous + 1 if item == other else max(row[j + 1], row[j])),
+            )
+    return row[-1]
+
+
+def test_diff_engines_find_valid_matches():
+    """Engines return real, ordered matches; Myers' are a longest one."""
+    engines = _load_script("devcontainer_diffengine")
+    rng = random.Random(7)
+    for _ in range(300):
+        alphabet = rng.choice((2, 3, 8))
+        a = [str(rng.randrange(alphabet)) for _ in range(rng.randrange(30))]
+        b = list(a)
+        for _ in range(rng.randrange(6)):
+            index = rng.randrange(len(b) + 1)
+            b[index:index] = [str(rng.randrange(alphabet))]
+            if b and rng.random() < 0.5:
+                del b[rng.randrange(len(b))]
+        for engine in ("histogram", "myers"):
+            blocks = engines.matching_blocks(a, b, engine)
+            i_end = j_end = 0
+            for i, j, size in blocks:
+                assert i >= i_end and j >= j_end and size > 0
+                assert a[i : i + size] == b[j : j + size]
+                i_end, j_end = i + size, j + size
+            if engine == "myers":
+                assert sum(size for *_, size in blocks) == _lcs_length(a, b)
+
+
+def test_diff_engines_share_unified_format():
+    """Unambiguous edits give byte-identical output from every engine."""
+    engines = _load_script("devcontainer_diffengine")
+    a = [f"line {i}\n" for i in range(100)]
+    b = list(a)
+    b[50] = "changed\n"
+    b.insert(10, "new\n")
+    del b[80]
+    expected = list(difflib.unified_diff(a, b, "old", "new"))
+    for engine in engines.ENGINES:
+        assert list(engines.unified_diff(a, b, "old", "new", engine=engine)) == (
+            expected
+        )
+    assert list(engines.unified_diff(a, a, engine="histogram")) == []
+
+
+def test_histogram_diff_stays_tight_on_repetitive_input():
+    """Repeated JSON lines do not blow the diff up the way difflib does."""
+    engines = _load_script("devcontainer_diffengine")
+    block = ["    {\n", '      "enabled": true,\n', "    },\n"]
+    a = ["[\n", *block * 3000, "]\n"]
+    b = list(a)
+    b[4502] = '      "enabled": false,\n'
+    diff = list(engines.unified_diff(a, b, engine="histogram"))
+    assert [line for line in diff if line[0] in "-+"][2:] == [
+        '-      "enabled": true,\n',
+        '+      "enabled": false,\n',
+    ]
+
+
+def test_myers_gives_up_on_unrelated_files(monkeypatch: pytest.MonkeyPatch):
+    """Sharing only blank lines costs one capped search, not O((N+M)D)."""
+    engines = _load_script("devcontainer_diffengine")
+    a = ["\n" if i % 4 == 3 else f"a {i}\n" for i in range(3999)]
+    b = ["\n" if i % 4 == 3 else f"b {i}\n" for i in range(3999)]
+    calls = []
+    bisect = engines._bisect
+    monkeypatch.setattr(
+        engines, "_bisect", lambda *args: calls.append(args) or bisect(*args)
+    )
+    for engine in ("histogram", "myers"):
+        calls.clear()
+        assert engines.matching_blocks(a, b, engine) == []
+        assert len(calls) == 1
+
+
+def test_myers_splits_costly_regions_on_an_anchor():
+    """A move too long for the capped search still gives the minimal diff."""
+    engines = _load_script("devcontainer_diffengine")
+    a = [f"line {i}\n" for i in range(2000)]
+    b = a[600:] + a[:600]
+    diff = list(engines.unified_diff(a, b, engine="myers"))
+    assert sum(line[0] in "-+" for line in diff) == 2 + 2 * 600
+
+
+def test_histogram_skips_lines_above_max_chain():
+    """A line seen exactly MAX_CHAIN + 1 times is too common to anchor on."""
+    engines = _load_script("devcontainer_diffengine")
+    for copies, anchored in ((engines.MAX_CHAIN, True), (engines.MAX_CHAIN + 1, False)):
+        a = [0] * copies + [1]
+        b = [2] + [0] * copies
+        anchor, shared = engines._anchor(a, b, 0, len(a), 0, len(b))
+        assert shared and (anchor is not None) == anchored
+
+
+@pytest.mark.slow
+def test_diff_benchmark_checks_every_engine():
+    """The benchmark applies each engine's diff back and reports all rows."""
+    proc = _run_script(
+        Path("scripts/benchmark-diff.py"),
+        "--repeat",
+        "1",
+        "--cases",
+        "dockerfile,moved-block,common-lines",
+        "--json",
+    )
+    assert proc.returncode == 0, proc.stderr
+    summary = json.loads(proc.stdout)
+    assert [(row["case"], row["engine"]) for row in summary["results"]] == [
+        ("dockerfile", "histogram"),
+        ("dockerfile", "myers"),
+        ("dockerfile", "difflib"),
+        ("moved-block", "histogram"),
+        ("moved-block", "myers"),
+        ("moved-block", "difflib"),
+        ("common-lines", "histogram"),
+        ("common-lines", "myers"),
+        ("common-lines", "difflib"),
+    ]
+
+
+def test_diff_engine_flag_selects_matcher(tmp_path: Path):
+    """--diff-engine histogram and the default print the same simple diff."""
+    templates = tmp_path / "devcontainers"
+    _write_tree(templates / "ansible", {"Dockerfile": "FROM a\nRUN b\nRUN c\n"})
+    target = tmp_path / ".devcontainer"
+    _write_tree(target, {"Dockerfile": "FROM a\nRUN B\nRUN c\n"})
+    (target / ".template-metadata.json").write_text('{"stack": "ansible"}')
+    args = ["--target", str(target), "--templates", str(templates), "--no-cache"]
+
+    default = _run_script(Path("scripts/devcontainer-diff.py"), *args)
+    fallback = _run_script(
+        Path("scripts/devcontainer-diff.py"), *args, "--diff-engine", "histogram"
+    )
+
+    assert default.returncode == fallback.returncode == 2
+    assert default.stdout == fallback.stdout
+    assert "-RUN b\n+RUN B\n" in default.stdout
+
+
+def test_tree_index_refreshes_only_changed_paths(tmp_path: Path):
+    _load_script("devcontainer_tree")
+    watch = _load_script("devcontainer_watch")
+    _write_tree(tmp_path, {"a.txt": "a", "d/b.txt": "b", "d/e/c.txt": "c"})
+    index = watch.TreeIndex(tmp_path, "sha1")
+    assert sorted(index.entries) == ["a.txt", "d/b.txt", "d/e/c.txt"]
+    assert index.digest("a.txt") == hashlib.sha1(b"a").hexdigest()
+
+    assert index.refresh("a.txt") == set()
+    (tmp_path / "a.txt").write_text("longer")
+    assert index.refresh("a.txt") == {"a.txt"}
+    assert index.digest("a.txt") == hashlib.sha1(b"longer").hexdigest()
+
+    (tmp_path / "d" / "e" / "c.txt").unlink()
+    (tmp_path / "d" / "e").rmdir()
+    (tmp_path / "d" / "x.log").write_text("x")
+    (tmp_path / "d" / ".gitignore").write_text("*.log\n")
+    assert index.refresh("d/.gitignore") == {"d/.gitignore", "d/e/c.txt"}
+    assert sorted(index.entries) == ["a.txt", "d/.gitignore", "d/b.txt"]
+
+    (tmp_path / "d" / ".gitignore").unlink()
+    assert index.refresh("d/.gitignore") == {"d/.gitignore", "d/x.log"}
+    (tmp_path / "a.txt.swp").write_text("")
+    assert index.refresh("a.txt.swp") == set()
+
+
+def test_watch_status_survives_files_vanishing(tmp_path: Path):
+    """A file deleted between refresh and hashing is dropped, not fatal."""
+    diff = _load_script("devcontainer-diff")
+    watch = sys.modules["devcontainer_watch"]
+    _write_tree(tmp_path / "source", {"a.txt": "a", "b.txt": "b"})
+    _write_tree(tmp_path / "target", {"a.txt": "A", "b.txt": "b"})
+    source = watch.TreeIndex(tmp_path / "source", "sha1")
+    target = watch.TreeIndex(tmp_path / "target", "sha1")
+
+    (tmp_path / "target" / "a.txt").unlink()
+    (tmp_path / "source" / "b.txt").unlink()
+    assert diff.pair_status(source, target, "a.txt") == "missing"
+    assert diff.pair_status(source, target, "b.txt") == "added"
+    assert diff.index_signature(target) == diff.index_signature(
+        watch.TreeIndex(tmp_path / "target", "sha1")
+    )
+
+    (tmp_path / "target" / "a.txt").write_text("A")
+    assert target.refresh("a.txt") == {"a.txt"}
+    assert diff.pair_status(source, target, "a.txt") == "modified"
+
+
+def test_poller_debounces_bursts_of_changes(tmp_path: Path):
+    _load_script("devcontainer_tree")
+    watch = _load_script("devcontainer_watch")
+    _write_tree(tmp_path, {"a.txt": "a"})
+    poller = watch.Poller([tmp_path], interval=0.01)
+    (tmp_path / "a.txt").write_text("changed")
+    (tmp_path / "b.txt").write_text("b")
+
+    batch = next(watch.debounce(poller, 0.05))
+
+    assert batch == {(0, "a.txt"), (0, "b.txt")}
+
+
+def _event_reader(proc: subprocess.Popen) -> queue.Queue:
+    """Queue the JSON lines proc prints, read on a background thread."""
+    events: queue.Queue = queue.Queue()
+
+    def read() -> None:
+        for line in proc.stdout:
+            events.put(json.loads(line))
+
+    threading.Thread(target=read, daemon=True).start()
+    return events
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("mode", [[], ["--poll", "0.1"]], ids=["inotify", "poll"])
+def test_diff_watch_emits_json_lines(tmp_path: Path, mode: list[str]):
+    """--watch reports drift incrementally and saves the cache on SIGTERM."""
+    templates = tmp_path / "devcontainers"
+    target = tmp_path / ".devcontainer"
+    _write_tree(templates / "ansible", {"a.txt": "a\n", "b.txt": "b\n"})
+    _write_tree(target, {"a.txt": "a\n", "b.txt": "b\n"})
+    (target / ".template-metadata.json").write_text('{"stack": "ansible"}')
+    cache_file = tmp_path / "signatures.json"
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "scripts/devcontainer-diff.py",
+            "--target",
+            str(target),
+            "--templates",
+            str(templates),
+            "--cache-file",
+            str(cache_file),
+            "--debounce",
+            "0.1",
+            "--watch",
+            *mode,
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    lines = _event_reader(proc)
+
+    def next_event() -> dict:
+        return lines.get(timeout=20)
+
+    try:
+        ready = next_event()
+        assert ready["event"] == "ready"
+        assert ready["clean"] and ready["changes"] == []
+        if not mode:
+            assert ready["watcher"] in ("inotify", "poll")
+
+        (target / "a.txt").write_text("a\nchanged\n")
+        change = next_event()
+        assert (change["event"], change["path"]) == ("change", "a.txt")
+        assert (change["previous"], change["status"]) == ("clean", "modified")
+        assert "+changed" in change["diff"]
+        summary = next_event()
+        assert summary["event"] == "summary"
+        assert summary["counts"] == {"modified": 1}
+
+        (target / "b.txt").unlink()
+        (target / "c.txt").write_text("c\n")
+        # One batch or two, depending on timing; the last summary settles it.
+        changes = {}
+        while (event := next_event())["event"] == "change" or len(changes) < 2:
+            if event["event"] == "change":
+                changes[event["path"]] = event["status"]
+        assert changes == {"b.txt": "missing", "c.txt": "added"}
+        assert event["counts"] == {"modified": 1, "missing": 1, "added": 1}
+    finally:
+        proc.terminate()
+        assert proc.wait(timeout=20) == 0
+        proc.stdout.close()
+    assert str(templates / "ansible") in json.loads(cache_file.read_text())["roots"]
+
+
 def test_diff_target_not_found(tmp_path: Path):
     """Test error when target directory doesn't exist."""
     proc = _run_script(
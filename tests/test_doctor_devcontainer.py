@@ -52,6 +52,8 @@ def _run_doctor(
     )
 
     env = os.environ.copy()
+    # The metadata check's signature cache must not land in the real home.
+    env["XDG_CACHE_HOME"] = str(tmp_path / "xdg-cache")
     if fake_tools:
         fake_bin = tmp_path / "bin"
         fake_bin.mkdir()
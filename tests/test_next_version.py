@@ -0,0 +1,222 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.unit
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "next-version.py"
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "Test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+    "GIT_CONFIG_GLOBAL": os.devnull,
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def _load_module():
+    spec = importlib.util.spec_from_file_location("next_version", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _git(repo: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        env={**os.environ, **GIT_ENV},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def _commit(repo: Path, message: str) -> str:
+    _git(repo, "commit", "--allow-empty", "-q", "-m", message)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repo(tmp_path: Path, monkeypatch) -> Path:
+    _git(tmp_path, "init", "-q", "-b", "main")
+    _commit(tmp_path, "chore: initial commit")
+    for key, value in GIT_ENV.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _next_version(repo: Path, *args: str) -> str:
+    return subprocess.run(
+        [sys.executable, str(SCRIPT), *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def test_first_release_without_tags(repo: Path):
+    assert _next_version(repo) == "v1.0.0"
+
+
+@pytest.mark.parametrize(
+    ("messages", "expected"),
+    [
+        (["docs: readme", "ci: cache"], ""),
+        (["fix: crash", "docs: readme"], "v1.2.4"),
+        (["perf(walk): faster", "feat(diff): watch mode"], "v1.3.0"),
+        (["feat!: drop python 3.11", "fix: crash"], "v2.0.0"),
+        (["refactor: split\n\nBREAKING CHANGE: new layout"], "v2.0.0"),
+        (["chore: promote develop to main\n\n* feat: one\n* fix: two"], "v1.3.0"),
+        (["chore: promote develop to main\n\n* fix(ci)!: rework"], "v2.0.0"),
+    ],
+)
+def test_bump_from_commits_since_last_tag(
+    repo: Path, messages: list[str], expected: str
+):
+    _git(repo, "tag", "v1.2.3")
+    for message in messages:
+        _commit(repo, message)
+    assert _next_version(repo) == expected
+
+
+def test_no_commits_since_tag_prints_nothing(repo: Path):
+    _git(repo, "tag", "v1.2.3")
+    assert _next_version(repo) == ""
+
+
+def test_iter_commits_streams_one_record_per_commit(repo: Path):
+    module = _load_module()
+    _git(repo, "tag", "v0.1.0")
+    first = _commit(repo, "fix: one\n\nbody with\nlines\x1f and a US")
+    second = _commit(repo, "feat: two")
+
+    commits = list(module.iter_commits("v0.1.0..HEAD"))
+
+    assert [sha for sha, _subject, _body in commits] == [second, first]
+    assert commits[1][1] == "fix: one"
+    assert "body with\nlines" in commits[1][2]
+
+
+def test_major_bump_stops_reading_history(repo: Path, monkeypatch):
+    module = _load_module()
+    _git(repo, "tag", "v1.0.0")
+    for index in range(20):
+        _commit(repo, f"fix: change {index}")
+    _commit(repo, "feat!: breaking")
+    classified = _spy_classify(module, monkeypatch)
+
+    assert module.next_bump("v1.0.0") == "major"
+    assert classified == ["feat!: breaking"]
+
+
+def test_iter_commits_raises_on_git_errors(repo: Path):
+    module = _load_module()
+    with pytest.raises(subprocess.CalledProcessError):
+        list(module.iter_commits("no-such-tag..HEAD"))
+
+
+def _spy_classify(module, monkeypatch) -> list[str]:
+    classified = []
+    classify = module.classify
+
+    def spy(subject: str, body: str):
+        classified.append(subject)
+        return classify(subject, body)
+
+    monkeypatch.setattr(module, "classify", spy)
+    return classified
+
+
+def test_cache_classifies_only_commits_since_cached_tip(
+    repo: Path, tmp_path: Path, monkeypatch
+):
+    module = _load_module()
+    cache_file = tmp_path / "cache.json"
+    _git(repo, "tag", "v1.0.0")
+    for index in range(5):
+        _commit(repo, f"fix: change {index}")
+    classified = _spy_classify(module, monkeypatch)
+
+    assert module.next_bump("v1.0.0", cache_file) == "patch"
+    assert len(classified) == 5
+    cache = json.loads(cache_file.read_text())
+    assert cache["tip"] == _git(repo, "rev-parse", "HEAD")
+    assert len(cache["commits"]) == 5
+
+    classified.clear()
+    assert module.next_bump("v1.0.0", cache_file) == "patch"
+    assert classified == []
+
+    _commit(repo, "feat: new")
+    assert module.next_bump("v1.0.0", cache_file) == "minor"
+    assert classified == ["feat: new"]
+
+
+def test_cache_survives_history_rewrite(repo: Path, tmp_path: Path, monkeypatch):
+    """A bump from a commit dropped by a rewrite must not linger."""
+    module = _load_module()
+    cache_file = tmp_path / "cache.json"
+    _git(repo, "tag", "v1.0.0")
+    _commit(repo, "fix: kept")
+    _commit(repo, "feat: dropped later")
+    assert module.next_bump("v1.0.0", cache_file) == "minor"
+
+    _git(repo, "reset", "-q", "--hard", "HEAD~1")
+    _commit(repo, "docs: replacement")
+    classified = _spy_classify(module, monkeypatch)
+
+    assert module.next_bump("v1.0.0", cache_file) == "patch"
+    # "fix: kept" still has its SHA, so its classification is reused.
+    assert classified == ["docs: replacement"]
+    assert len(json.loads(cache_file.read_text())["commits"]) == 2
+
+
+def test_cache_is_dropped_when_the_tag_moves(repo: Path, tmp_path: Path, monkeypatch):
+    module = _load_module()
+    cache_file = tmp_path / "cache.json"
+    _git(repo, "tag", "v1.0.0")
+    _commit(repo, "feat: one")
+    assert module.next_bump("v1.0.0", cache_file) == "minor"
+
+    _git(repo, "tag", "-f", "v1.0.0")
+    classified = _spy_classify(module, monkeypatch)
+    assert module.next_bump("v1.0.0", cache_file) is None
+    _commit(repo, "fix: two")
+    assert module.next_bump("v1.0.0", cache_file) == "patch"
+    assert classified == ["fix: two"]
+
+
+def test_cached_major_bump_skips_git_log(repo: Path, tmp_path: Path, monkeypatch):
+    module = _load_module()
+    cache_file = tmp_path / "cache.json"
+    _git(repo, "tag", "v1.0.0")
+    _commit(repo, "feat!: breaking")
+    assert module.next_bump("v1.0.0", cache_file) == "major"
+    _commit(repo, "fix: later")
+
+    def fail(log_range: str):
+        raise AssertionError(f"git log {log_range} should not run")
+
+    monkeypatch.setattr(module, "iter_commits", fail)
+    assert module.next_bump("v1.0.0", cache_file) == "major"
+
+
+def test_corrupt_cache_is_ignored_and_replaced(repo: Path):
+    _git(repo, "tag", "v1.2.3")
+    _commit(repo, "feat: one")
+    cache_file = repo / ".git" / "next-version-cache.json"
+    cache_file.write_text("{not json")
+
+    assert _next_version(repo) == "v1.3.0"
+    assert json.loads(cache_file.read_text())["bump"] == "minor"
+    assert _next_version(repo, "--no-cache") == "v1.3.0"
@@ -0,0 +1,650 @@
+import hashlib
+import importlib.util
+import io
+import json
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import ClassVar
+
+import pytest
+
+pytestmark = pytest.mark.unit
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "refresh-tool-pins.py"
+
+
+def _load_module():
+    spec = importlib.util.spec_from_file_location("refresh_tool_pins", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    # dataclasses resolve annotations through sys.modules.
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def pins(monkeypatch):
+    module = _load_module()
+    monkeypatch.setattr(module, "RETRY_BACKOFF", 0.0)
+    return module
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    """Serve a directory; truncate the first N bodies to simulate CDN drops.
+
+    The artifact_server fixture serves through a subclass with its own
+    request lists and lock, so no state leaks between tests.
+    """
+
+    protocol_version = "HTTP/1.1"
+    honor_range = True
+    ranges: ClassVar[list[str]] = []
+    truncate_first = 0
+    delay = 0.0
+    requests: ClassVar[list[str]] = []
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):  # silence test output
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/v2/") and self.headers.get("Authorization") != (
+            "Bearer secret"
+        ):
+            realm = f"http://{self.headers['Host']}/token"
+            self.send_response(401)
+            self.send_header(
+                "WWW-Authenticate", f'Bearer realm="{realm}",service="test"'
+            )
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/redirect/"):
+            self.send_response(302)
+            self.send_header("Location", self.path.removeprefix("/redirect"))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        requested = self.headers.get("Range")
+        if requested:
+            type(self).ranges.append(requested)
+        if requested and type(self).honor_range:
+            data = Path(self.translate_path(self.path)).read_bytes()
+            start = int(requested.removeprefix("bytes=").rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            self.copyfile(io.BytesIO(data[start:]), self.wfile)
+            return
+        super().do_GET()
+
+    def copyfile(self, source, outputfile):
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(self.path)
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(cls.delay)
+            self._send_body(source, outputfile)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def _send_body(self, source, outputfile):
+        if type(self).truncate_first > 0:
+            type(self).truncate_first -= 1
+            outputfile.write(source.read(16))
+            self.close_connection = True
+            return
+        super().copyfile(source, outputfile)
+
+
+@pytest.fixture
+def artifact_server(tmp_path: Path):
+    root = tmp_path / "srv"
+    root.mkdir()
+    handler = type(
+        "Handler",
+        (_Handler,),
+        {"requests": [], "ranges": [], "lock": threading.Lock()},
+    )
+
+    def factory(*args, **kwargs):
+        return handler(*args, directory=str(root), **kwargs)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), factory)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield root, base, handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_sha256_of_streams_http_body(pins, artifact_server):
+    root, base, _handler = artifact_server
+    payload = bytes(range(256)) * 9000
+    (root / "tool.tar.gz").write_bytes(payload)
+
+    assert pins.sha256_of(f"{base}/tool.tar.gz") == hashlib.sha256(payload).hexdigest()
+
+
+def test_retry_after_truncated_body_restarts_hash(pins, artifact_server):
+    root, base, handler = artifact_server
+    payload = b"x" * (3 * 1024 * 1024 + 7)
+    (root / "awscli.zip").write_bytes(payload)
+    handler.truncate_first = 1
+    handler.honor_range = False
+
+    digest = pins.sha256_of(f"{base}/awscli.zip")
+
+    # The server ignored the Range request, so the hash restarted from zero.
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert len(handler.requests) == 2
+    assert handler.ranges == ["bytes=16-"]
+
+
+def test_non_retriable_status_raises(pins, artifact_server):
+    _root, base, _handler = artifact_server
+    with pytest.raises(pins.urllib.error.HTTPError):
+        url = f"{base}/missing"
+        pins.http_get(url, pins.Spool(url, None), attempts=1)
+
+
+def _peak_rss_kib(artifact: Path) -> int:
+    probe = (
+        "import importlib.util, resource, sys\n"
+        "spec = importlib.util.spec_from_file_location('pins', sys.argv[1])\n"
+        "pins = sys.modules['pins'] = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(pins)\n"
+        "pins.sha256_of(sys.argv[2])\n"
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", probe, str(SCRIPT), artifact.as_uri()],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(proc.stdout.strip())
+
+
+@pytest.mark.slow
+def test_peak_rss_is_flat_across_artifact_sizes(tmp_path: Path):
+    small = tmp_path / "small.bin"
+    large = tmp_path / "large.bin"
+    # Sparse files: cheap to create, still read back byte by byte.
+    with small.open("wb") as fh:
+        fh.truncate(4 * 1024 * 1024)
+    with large.open("wb") as fh:
+        fh.truncate(256 * 1024 * 1024)
+
+    growth_kib = _peak_rss_kib(large) - _peak_rss_kib(small)
+
+    assert growth_kib < 16 * 1024
+
+
+def _write_fixture(tmp_path: Path, base: str, pins, arches=("amd64", "arm64")):
+    dockerfile = tmp_path / "Dockerfile"
+    lines = ["ARG AGE_VERSION=1.2.3"]
+    for arch in arches:
+        lines.append(f'{arch}) ARCH="{arch}"; AGE_SHA256="{"0" * 64}" ;; \\')
+    dockerfile.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tool = pins.Tool(
+        name="age",
+        path=dockerfile,
+        version_arg="AGE_VERSION",
+        hash_var="AGE_SHA256",
+        selector="ARCH",
+        url=f"{base}/age-v{{version}}-linux-{{variant}}.tar.gz",
+        variants=tuple(arches),
+    )
+    return dockerfile, tool
+
+
+def test_sync_hashes_rewrites_every_pin(pins, artifact_server, tmp_path, monkeypatch):
+    root, base, _handler = artifact_server
+    dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    for arch in ("amd64", "arm64"):
+        (root / f"age-v1.2.3-linux-{arch}.tar.gz").write_bytes(arch.encode())
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+
+    assert pins.sync_hashes() == 0
+
+    text = dockerfile.read_text(encoding="utf-8")
+    for arch in ("amd64", "arm64"):
+        assert hashlib.sha256(arch.encode()).hexdigest() in text
+
+
+def _artifacts(pins, root: Path, base: str, count: int):
+    artifacts = []
+    for index in range(count):
+        (root / f"artifact-{index}").write_bytes(str(index).encode())
+        artifacts.append(
+            pins.Artifact(
+                "tool",
+                "1",
+                root / "Dockerfile",
+                "TOOL_SHA256",
+                "ARCH",
+                str(index),
+                f"{base}/artifact-{index}",
+            )
+        )
+    return artifacts
+
+
+def test_fetch_digests_runs_downloads_concurrently(pins, artifact_server):
+    root, base, handler = artifact_server
+    artifacts = _artifacts(pins, root, base, count=6)
+    handler.delay = 0.4
+
+    started = time.monotonic()
+    digests = pins.fetch_digests(artifacts, jobs=6, per_host=6)
+    elapsed = time.monotonic() - started
+
+    assert set(digests) == {artifact.url for artifact in artifacts}
+    assert handler.peak > 1
+    assert elapsed < 6 * handler.delay / 2
+
+
+def test_fetch_digests_respects_per_host_limit(pins, artifact_server):
+    root, base, handler = artifact_server
+    artifacts = _artifacts(pins, root, base, count=6)
+    handler.delay = 0.1
+
+    pins.fetch_digests(artifacts, jobs=6, per_host=2)
+
+    assert handler.peak == 2
+
+
+def _serve_age(root: Path, version: str = "1.2.3") -> None:
+    for arch in ("amd64", "arm64"):
+        (root / f"age-v{version}-linux-{arch}.tar.gz").write_bytes(
+            f"{version}-{arch}".encode()
+        )
+
+
+def test_unchanged_run_is_served_from_cache(
+    pins, artifact_server, tmp_path, monkeypatch
+):
+    root, base, handler = artifact_server
+    _dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    _serve_age(root)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+
+    cache = pins.DownloadCache(tmp_path / "cache", max_bytes=1 << 20, ttl=3600)
+    pins.sync_hashes(cache=cache)
+    assert len(handler.requests) == 2
+
+    handler.requests.clear()
+    cache = pins.DownloadCache(tmp_path / "cache", max_bytes=1 << 20, ttl=3600)
+    pins.sync_hashes(cache=cache)
+    assert handler.requests == []
+
+
+def test_stale_cache_revalidates_without_downloading(
+    pins, artifact_server, tmp_path, monkeypatch
+):
+    root, base, handler = artifact_server
+    dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    _serve_age(root)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+
+    pins.sync_hashes(cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=0))
+    first = dockerfile.read_text(encoding="utf-8")
+    handler.requests.clear()
+    pins.sync_hashes(cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=0))
+
+    # Both artifacts were revalidated with If-Modified-Since and answered
+    # 304, so no body was transferred and the pins are unchanged.
+    assert handler.requests == []
+    assert dockerfile.read_text(encoding="utf-8") == first
+
+
+def test_version_bump_misses_cache(pins, artifact_server, tmp_path, monkeypatch):
+    root, base, handler = artifact_server
+    dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    _serve_age(root)
+    _serve_age(root, "1.2.4")
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    pins.sync_hashes(cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600))
+
+    handler.requests.clear()
+    dockerfile.write_text(
+        dockerfile.read_text(encoding="utf-8").replace("1.2.3", "1.2.4"),
+        encoding="utf-8",
+    )
+    pins.sync_hashes(cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600))
+
+    assert len(handler.requests) == 2
+    assert hashlib.sha256(b"1.2.4-amd64").hexdigest() in dockerfile.read_text(
+        encoding="utf-8"
+    )
+
+
+def test_cache_evicts_least_recently_used(pins, tmp_path):
+    cache = pins.DownloadCache(tmp_path / "c", max_bytes=10, ttl=3600)
+    for name in ("old", "new"):
+        spool = cache.spool / f"{name}.part"
+        spool.write_bytes(name.encode() * 2)
+        digest = hashlib.sha256(spool.read_bytes()).hexdigest()
+        download = pins.Download(digest, 6, None, None, spool)
+        cache.store(f"https://example.invalid/{name}", "1", download, "upstream")
+    cache.touch("https://example.invalid/new", "1")
+    cache.save()
+
+    reloaded = pins.DownloadCache(tmp_path / "c", max_bytes=10, ttl=3600)
+    assert reloaded.lookup("https://example.invalid/old", "1") is None
+    assert reloaded.lookup("https://example.invalid/new", "1") is not None
+    assert len(list(reloaded.blobs.iterdir())) == 1
+
+
+def test_rewrite_pins_writes_each_file_once(pins, tmp_path, monkeypatch):
+    dockerfile, tool = _write_fixture(tmp_path, "http://example.invalid", pins)
+    dockerfile.chmod(0o640)
+    artifacts = pins.plan_artifacts([tool])
+    digests = {a.url: hashlib.sha256(a.url.encode()).hexdigest() for a in artifacts}
+    writes = []
+    real_write = pins.atomic_write_text
+    monkeypatch.setattr(
+        pins,
+        "atomic_write_text",
+        lambda path, text: (writes.append(path), real_write(path, text)),
+    )
+
+    changes = pins.rewrite_pins(artifacts, digests)
+
+    assert writes == [dockerfile]
+    assert len(changes) == 2
+    assert dockerfile.stat().st_mode & 0o777 == 0o640
+    assert pins.rewrite_pins(artifacts, digests) == []
+    assert writes == [dockerfile]
+
+
+def test_rewrite_pins_missing_pattern_leaves_file_untouched(pins, tmp_path):
+    dockerfile, tool = _write_fixture(tmp_path, "http://example.invalid", pins)
+    artifacts = pins.plan_artifacts([tool])
+    before = dockerfile.read_text(encoding="utf-8")
+    # Drop the arm64 pin after planning: amd64 must not be half-applied.
+    dockerfile.write_text(before.splitlines()[0] + "\n" + before.splitlines()[1])
+    partial = dockerfile.read_text(encoding="utf-8")
+    digests = {a.url: "f" * 64 for a in artifacts}
+
+    with pytest.raises(RuntimeError, match='no AGE_SHA256 after ARCH="arm64"'):
+        pins.rewrite_pins(artifacts, digests)
+
+    assert dockerfile.read_text(encoding="utf-8") == partial
+    assert list(tmp_path.glob(".Dockerfile.*")) == []
+
+
+def test_mirror_source_serves_sync_offline(pins, tmp_path, monkeypatch):
+    dockerfile, tool = _write_fixture(tmp_path, "https://downloads.invalid/age", pins)
+    mirror = tmp_path / "mirror" / "downloads.invalid" / "age"
+    mirror.mkdir(parents=True)
+    _serve_age(mirror)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    sources = [pins.Source.parse(f"mirror:{tmp_path / 'mirror'}")]
+
+    fetched = pins.fetch_digests(pins.plan_artifacts([tool]), 2, 2, sources=sources)
+
+    assert {result.source for result in fetched.values()} == {
+        f"mirror:{tmp_path / 'mirror'}"
+    }
+    assert pins.sync_hashes(sources=sources) == 0
+    assert hashlib.sha256(b"1.2.3-arm64").hexdigest() in dockerfile.read_text(
+        encoding="utf-8"
+    )
+
+
+def test_sources_fall_back_in_order(pins, artifact_server, tmp_path):
+    root, base, handler = artifact_server
+    _dockerfile, tool = _write_fixture(tmp_path, "https://downloads.invalid", pins)
+    # The mirror only has amd64; arm64 must come from the proxy.
+    mirror = tmp_path / "mirror" / "downloads.invalid"
+    mirror.mkdir(parents=True)
+    (mirror / "age-v1.2.3-linux-amd64.tar.gz").write_bytes(b"mirror")
+    proxied = root / "remote" / "downloads.invalid"
+    proxied.mkdir(parents=True)
+    (proxied / "age-v1.2.3-linux-arm64.tar.gz").write_bytes(b"proxy")
+    sources = [
+        pins.Source.parse(f"mirror:{tmp_path / 'mirror'}"),
+        pins.Source.parse(f"proxy:{base}/remote"),
+        pins.Source.parse("upstream"),
+    ]
+
+    fetched = pins.fetch_digests(pins.plan_artifacts([tool]), 2, 2, sources=sources)
+
+    by_arch = {url.rsplit("-", 1)[1]: result for url, result in fetched.items()}
+    assert by_arch["amd64.tar.gz"].source.startswith("mirror:")
+    assert by_arch["arm64.tar.gz"].source == f"proxy:{base}/remote"
+    assert by_arch["arm64.tar.gz"].sha256 == hashlib.sha256(b"proxy").hexdigest()
+    assert handler.requests == [
+        "/remote/downloads.invalid/age-v1.2.3-linux-arm64.tar.gz"
+    ]
+
+
+def test_source_parse_rejects_unknown_spec(pins):
+    with pytest.raises(pins.argparse.ArgumentTypeError):
+        pins.Source.parse("ftp:somewhere")
+
+
+def test_pool_reuses_one_connection_per_host(
+    pins, artifact_server, tmp_path, monkeypatch
+):
+    root, base, _handler = artifact_server
+    _dockerfile, tool = _write_fixture(tmp_path, f"{base}/redirect", pins)
+    _serve_age(root)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+
+    pins.sync_hashes(jobs=2, per_host=1)
+
+    # Two artifacts, each behind a redirect: four requests, one socket.
+    assert pins.POOL.opened == 1
+    assert pins.POOL.reused == 3
+
+
+def test_pool_replaces_connection_closed_by_server(pins, artifact_server):
+    root, base, handler = artifact_server
+    (root / "a").write_bytes(b"a" * 100)
+    handler.truncate_first = 1
+
+    assert pins.sha256_of(f"{base}/a") == hashlib.sha256(b"a" * 100).hexdigest()
+    assert pins.POOL.opened == 2
+
+
+def test_truncated_download_resumes_with_range(pins, artifact_server, tmp_path):
+    root, base, handler = artifact_server
+    payload = bytes(range(256)) * 4096
+    (root / "awscli.zip").write_bytes(payload)
+    handler.truncate_first = 1
+    url = f"{base}/awscli.zip"
+
+    download = pins.http_get(url, pins.Spool(url, tmp_path))
+
+    assert download.sha256 == hashlib.sha256(payload).hexdigest()
+    assert handler.ranges == ["bytes=16-"]
+    assert download.spool.read_bytes() == payload
+
+
+def test_interrupted_run_resumes_from_spool_file(pins, artifact_server, tmp_path):
+    root, base, handler = artifact_server
+    payload = b"0123456789" * 1000
+    (root / "age.tar.gz").write_bytes(payload)
+    handler.truncate_first = 1
+    url = f"{base}/age.tar.gz"
+
+    with pytest.raises(pins.http.client.IncompleteRead):
+        pins.http_get(url, pins.Spool(url, tmp_path), attempts=1)
+
+    download = pins.http_get(url, pins.Spool(url, tmp_path))
+    assert download.sha256 == hashlib.sha256(payload).hexdigest()
+    assert handler.ranges == ["bytes=16-"]
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_verify_all_reports_every_pin(
+    pins, artifact_server, tmp_path, monkeypatch, capsys
+):
+    root, base, _handler = artifact_server
+    dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    _serve_age(root)
+    (root / "age-v1.2.3-linux-arm64.tar.gz").write_bytes(b"tampered")
+    manifest = b'{"schemaVersion": 2}'
+    digest = hashlib.sha256(manifest).hexdigest()
+    (root / "v2/team/base/manifests").mkdir(parents=True)
+    (root / f"v2/team/base/manifests/sha256:{digest}").write_bytes(manifest)
+    (root / "token").write_text('{"token": "secret"}')
+    (root / "SHA256SUMS").write_text(f"{digest}  tool.zip\n")
+    registry = base.removeprefix("http://")
+    with dockerfile.open("a", encoding="utf-8") as fh:
+        fh.write(f"FROM {registry}/team/base:main@sha256:{digest}\n")
+        fh.write(f'RUN curl -fsSL "{base}/SHA256SUMS" -o sums\n')
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    cache = pins.DownloadCache(tmp_path / "cache", 1 << 20, ttl=3600)
+    # Pin amd64 correctly; arm64 keeps its all-zero placeholder.
+    amd64 = pins.plan_artifacts([tool])[0]
+    pins.rewrite_pins([amd64], {amd64.url: hashlib.sha256(b"1.2.3-amd64").hexdigest()})
+
+    status = pins.verify_all(cache=cache, dockerfiles=[dockerfile])
+
+    report = json.loads(capsys.readouterr().out)
+    by_kind = {(pin["kind"], pin["status"]) for pin in report["pins"]}
+    assert status == 1
+    assert report["ok"] is False
+    assert by_kind == {
+        ("artifact", "ok"),
+        ("artifact", "mismatch"),
+        ("image", "ok"),
+        ("manifest", "ok"),
+    }
+    assert all(pin["seconds"] >= 0 for pin in report["pins"])
+
+
+def test_verify_all_warm_cache_needs_no_network(
+    pins, artifact_server, tmp_path, monkeypatch, capsys
+):
+    root, base, handler = artifact_server
+    dockerfile, tool = _write_fixture(tmp_path, base, pins)
+    _serve_age(root)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    pins.sync_hashes(cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600))
+    handler.requests.clear()
+    capsys.readouterr()
+
+    status = pins.verify_all(
+        cache=pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600),
+        dockerfiles=[dockerfile],
+    )
+
+    report = json.loads(capsys.readouterr().out)
+    assert status == 0
+    assert report["counts"] == {"ok": 2}
+    assert {pin["source"] for pin in report["pins"]} == {"cache"}
+    assert handler.requests == []
+
+
+def test_verify_all_discovers_real_stack_pins(pins):
+    dockerfiles = sorted(pins.STACKS_ROOT.glob("*/Dockerfile*"))
+    found = pins.discover_pins(dockerfiles, pins.TOOLS)
+
+    kinds = {pin.kind for pin in found}
+    assert kinds == {"artifact", "image", "manifest"}
+    assert all(pin.url for pin in found if pin.kind == "artifact")
+
+
+def test_registry_locates_every_pinned_hash(pins):
+    # Includes tectonic, whose selector and hash sit on continued lines.
+    artifacts = pins.plan_artifacts(pins.TOOLS)
+    assert len(artifacts) == sum(len(tool.variants) for tool in pins.TOOLS)
+    for artifact in artifacts:
+        text = artifact.path.read_text()
+        sites = [s for s in pins.scan_dockerfile(text).hashes if artifact.matches(s)]
+        assert len(sites) == 1, artifact
+        assert artifact.version in artifact.url
+
+
+def test_load_tools_rejects_invalid_entries(pins, tmp_path):
+    registry = tmp_path / "tool-pins.json"
+    entry = json.loads(pins.TOOLS_FILE.read_text())["tools"][0]
+    registry.write_text(json.dumps({"tools": [entry, entry]}))
+    with pytest.raises(ValueError, match="already claimed"):
+        pins.load_tools(registry)
+
+    registry.write_text(json.dumps({"tools": [{**entry, "url": "https://x/{v}"}]}))
+    with pytest.raises(ValueError, match="bad url template"):
+        pins.load_tools(registry)
+
+    registry.write_text(json.dumps({"tools": [{**entry, "variants": []}]}))
+    with pytest.raises(ValueError, match="variants"):
+        pins.load_tools(registry)
+
+    registry.write_text(json.dumps({"tools": {"name": entry["name"]}}))
+    with pytest.raises(TypeError, match="'tools' must be a list"):
+        pins.load_tools(registry)
+
+    registry.write_text(json.dumps({"tools": [[entry]]}))
+    with pytest.raises(TypeError, match=r"tools\[0\]: must be an object"):
+        pins.load_tools(registry)
+
+
+def test_sync_report_records_per_artifact_metrics(
+    pins, artifact_server, tmp_path, monkeypatch
+):
+    root, base, handler = artifact_server
+    _dockerfile, tool = _write_fixture(tmp_path, base, pins, arches=("amd64",))
+    (root / "age-v1.2.3-linux-amd64.tar.gz").write_bytes(b"x" * 4096)
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    handler.truncate_first = 1
+    report = tmp_path / "report.json"
+    cache = pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600)
+
+    pins.sync_hashes(cache=cache, report=report)
+
+    run = json.loads(report.read_text())
+    assert run["ok"] is True
+    assert run["cache"] == {"miss": 1}
+    [row] = run["artifacts"]
+    assert row["variant"] == "amd64"
+    assert row["source"] == "upstream"
+    assert row["retries"] == 1
+    assert row["failures"][0]["status"] is None
+    # 16 bytes from the torn attempt, then the rest of the file.
+    assert row["bytes"] == 4096
+    assert row["resumed_from"] == 16
+    assert row["ttfb"] is not None
+    assert row["bytes_per_second"] > 0
+    assert run["hosts"][base.split("//")[1]]["artifacts"] == 1
+
+    cache = pins.DownloadCache(tmp_path / "c", 1 << 20, ttl=3600)
+    pins.sync_hashes(cache=cache, report=report)
+    assert json.loads(report.read_text())["cache"] == {"hit": 1}
+
+
+def test_sync_report_written_when_run_fails(
+    pins, artifact_server, tmp_path, monkeypatch
+):
+    _root, base, _handler = artifact_server
+    _dockerfile, tool = _write_fixture(tmp_path, base, pins, arches=("amd64",))
+    monkeypatch.setattr(pins, "TOOLS", [tool])
+    report = tmp_path / "report.json"
+
+    with pytest.raises(urllib.error.HTTPError):
+        pins.sync_hashes(report=report)
+
+    run = json.loads(report.read_text())
+    assert run["ok"] is False
+    assert run["changes"] is None
+    [row] = run["artifacts"]
+    assert [f["status"] for f in row["failures"]] == [404] * 4